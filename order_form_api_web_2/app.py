@@ -1,16 +1,91 @@
 import inspect
+import json
 import os
 import warnings
 import requests
 from Product_Catalog.templates import templates , country_dict
 from mapping_functions.customer_mapping import check_if_customer_exists , get_customers_from_bc
-from mapping_functions.mapping_pencils import map_items
-from mapping_functions.validation import get_access_token , get_credentials , extract_order_batch
-from flask import Flask , jsonify , request , Response
+from mapping_functions.customer_snapshot import get_customer_snapshot
+from mapping_functions.fuzzy_matching import FuzzyCustomerIndex , get_fuzzy_config , merge_matches
+from mapping_functions.mapping_pencils import map_items , create_order_data , get_order_key , preview_items
+from mapping_functions.mapping_cache import mapping_cache
+from mapping_functions.order_batch import map_and_submit_items , map_order
+from mapping_functions.order_entry import parse_order_entry , OrderEntryError
+from mapping_functions.order_queue import order_queue , start_order_submitter
+from mapping_functions.circuit_breaker import CircuitOpenError , get_breaker_states
+from mapping_functions.idempotency import OrderInProgressError
+from mapping_functions.bulk_orders import process_bulk
+from mapping_functions.instrumentation import init_app as init_instrumentation , stage_timer , logger
+from mapping_functions.json_fast import FastJSONProvider , customers_response_body
+from mapping_functions.catalog import get_catalog_bundle , get_cache_control
+from mapping_functions.product_catalog import start_catalog_watcher
+from mapping_functions.tenants import tenants , get_tenant , get_current_tenant , current_tenant_var , \
+    UnknownTenantError , TenantBusyError
+from mapping_functions.validation import get_access_token , get_credentials , extract_order_batch , get_token_cache
+from flask import Flask , jsonify , request , Response , stream_with_context , g
 
 
 # Initialize Flask app
 app=Flask(__name__)
+app.json=FastJSONProvider(app)
+init_instrumentation(app)
+
+
+# Business Central is failing, answer at once instead of tying up the worker
+@app.errorhandler(CircuitOpenError)
+def circuit_open_handler(error) :
+    return jsonify({ "error" : str(error) }) , 503 , { 'Retry-After' : str(error.retry_after) }
+
+
+# An earlier submission of the same order is still running, the retry gets its result once it finished
+@app.errorhandler(OrderInProgressError)
+def order_in_progress_handler(error) :
+    return jsonify({ "error" : str(error) }) , 409 , { 'Retry-After' : str(error.retry_after) }
+
+
+# The caller's company isn't configured on this deployment
+@app.errorhandler(UnknownTenantError)
+def unknown_tenant_handler(error) :
+    return jsonify({ "error" : str(error) }) , 404
+
+
+# The tenant has all its requests in flight, turn this one away instead of queueing it behind them
+@app.errorhandler(TenantBusyError)
+def tenant_busy_handler(error) :
+    return jsonify({ "error" : str(error) }) , 503 , { 'Retry-After' : str(error.retry_after) }
+
+
+# Routes that call Business Central, each request holds one of its tenant's slots.
+# The bulk route doesn't call it itself, its pool takes a slot per order.
+TENANT_LIMITED_ENDPOINTS=frozenset([
+    'get_access_token_route' , 'get_customers_route' , 'new_orders_route'
+])
+
+
+# Serve the request for the tenant named by the X-Tenant header or the 'tenant' field of the body
+@app.before_request
+def select_tenant() :
+    payload=request.get_json(silent=True) if request.is_json else None
+    name=request.headers.get('X-Tenant') or (payload.get('tenant') if isinstance(payload , dict) else None)
+    tenant=get_tenant(name)
+    if request.endpoint in TENANT_LIMITED_ENDPOINTS :
+        tenant.acquire()
+        g.tenant_slot=tenant
+    g.tenant_token=current_tenant_var.set(tenant)
+
+
+@app.teardown_request
+def release_tenant(exception) :
+    tenant=g.pop('tenant_slot' , None)
+    if tenant is not None :
+        tenant.release()
+    token=g.pop('tenant_token' , None)
+    if token is not None :
+        current_tenant_var.reset(token)
+
+
+# Loads CATALOG_FILE and hot-swaps it when the file changes
+catalog_watcher=start_catalog_watcher()
 
 
 # Route to return a test JSON response
@@ -29,66 +104,196 @@ def check_server() :
 @app.route('/retrieve_ac' , methods=['POST'])
 def get_access_token_route() :
     business_center_id=request.json.get('bc_id')
-    access_token=get_access_token(business_center_id)
+    with stage_timer('get_access_token') :
+        access_token=get_access_token(business_center_id)
     return jsonify({ 'ac' : access_token })
 
 
+# Route to inspect the worker's circuit breakers
+@app.route('/circuits' , methods=['GET'])
+def circuits_route() :
+    return jsonify(get_breaker_states())
+
+
+# Route to inspect the token cache counters of the request's tenant
+@app.route('/retrieve_ac/stats' , methods=['GET'])
+def token_cache_stats_route() :
+    return jsonify(get_token_cache().get_stats())
+
+
+# Route to list the tenants served by this deployment
+@app.route('/tenants' , methods=['GET'])
+def tenants_route() :
+    return jsonify({ 'default' : tenants.default.name ,
+                     'tenants' : { tenant.name : tenant.get_status() for tenant in tenants } })
+
+
+# Route to inspect the worker's mapping cache counters
+@app.route('/newOrders/preview/stats' , methods=['GET'])
+def mapping_cache_stats_route() :
+    return jsonify(mapping_cache.get_stats())
+
+
 # Route to get customer data
 @app.route('/get_customers' , methods=['POST'])
 def get_customers_route() :
     entry=request.json.get('entry')
     access_token=request.json.get('ac')
     customers=request.json.get('customers')
+    # Fuzzy matching also ranks near-duplicate names and differently formatted phone numbers
+    fuzzy=request.json.get('match' , os.getenv('CUSTOMER_MATCH_MODE' , 'exact')) == 'fuzzy'
 
-    # Filter out blocked customers
-    customers_not_blocked=[customer for customer in customers if not customer['Blocked'] == "All"]
+    with stage_timer('customer_match') :
+        if customers is not None :
+            # Filter out blocked customers
+            customers_not_blocked=[customer for customer in customers if not customer['Blocked'] == "All"]
 
-    # Check if customers exist
-    customers_found=check_if_customer_exists(entry['138'] , entry['88'] , entry['307'] , entry['86'] ,
-                                             customers_not_blocked)
+            # Check if customers exist
+            customers_found=check_if_customer_exists(entry['138'] , entry['88'] , entry['307'] , entry['86'] ,
+                                                     customers_not_blocked)
+            if fuzzy :
+                fuzzy_index=FuzzyCustomerIndex(customers_not_blocked)
+        else :
+            # Match against the server-side customer snapshot of the tenant
+            customer_snapshot=get_customer_snapshot()
+            customers_found=customer_snapshot.get_index(access_token).match(entry['138'] , entry['88'] ,
+                                                                            entry['307'] , entry['86'])
+            if fuzzy :
+                fuzzy_index=customer_snapshot.get_fuzzy_index(access_token)
 
-    return jsonify({
-                       'customer_mapping' : { 'no' : customers_found } , "ac" : access_token ,
-                       't_id' : os.getenv('TENANTID') , 'templates' : templates , 'countries' : country_dict
-                   })
+        if fuzzy :
+            customers_found=merge_matches(customers_found , fuzzy_index.match(entry['138'] , entry['307'] ,
+                                                                              entry['86'] , **get_fuzzy_config()))
+
+    # Callers that cache /catalog only need its version to know when to refetch it
+    catalog_version=get_catalog_bundle().version if request.json.get('catalog') == 'version' else None
+
+    with stage_timer('serialize') :
+        return Response(customers_response_body(customers_found , access_token , get_current_tenant().tenant_id ,
+                                                catalog_version) ,
+                        mimetype='application/json')
+
+
+# Route to get the static catalog: templates, countries, product hierarchy and variants
+@app.route('/catalog' , methods=['GET'])
+def get_catalog_route() :
+    bundle=get_catalog_bundle()
+    headers={ 'Cache-Control' : get_cache_control() , 'Vary' : 'Accept-Encoding' }
+
+    etag=bundle.matching_etag(request.headers.get('If-None-Match') , request.headers.get('Accept-Encoding'))
+    if etag is not None :
+        return Response(status=304 , headers={ **headers , 'ETag' : etag })
+
+    encoding=bundle.choose_encoding(request.headers.get('Accept-Encoding'))
+    headers['ETag']=bundle.etag(encoding)
+    headers['X-Catalog-Version']=bundle.version
+    if encoding != 'identity' :
+        headers['Content-Encoding']=encoding
+    return Response(bundle.encodings[encoding] , mimetype='application/json' , headers=headers)
 
 
 # Route to process new orders
 @app.route('/newOrders' , methods=['POST'])
 def new_orders_route() :
     try :
-        entry=request.json.get('entry')
+        # Reject a bad entry before anything is sent to Business Central
+        entry=parse_order_entry(request.json.get('entry'))
         access_token=request.json.get('ac')
         customer_number=request.json.get('customer_no')
 
-        # Get quantities of different types of pencils
-        graphite_quantity=int(entry.get('23' , 0)) if entry.get('23' , '') != '' else 0
-        color_quantity=int(entry.get('24' , 0)) if entry.get('24' , '') != '' else 0
-        multi_quantity=int(entry.get('152' , 0)) if entry.get('152' , '') != '' else 0
-        total_quantity=int(entry.get('25' , 0)) if entry.get('25' , '') != '' else 0
+        # Create data structure for order
+        order_data , quantity=create_order_data(entry , customer_number)
 
-        # Determine total quantity
-        quantity=total_quantity if total_quantity != 0 else color_quantity + graphite_quantity + multi_quantity
+        # Accept the order now and submit it in the background, the caller polls /orders/<ticket>
+        if request.json.get('accept' , os.getenv('ORDER_ACCEPT_MODE' , 'sync')) == 'async' :
+            if not get_current_tenant().bc_id or not start_order_submitter() :
+                return jsonify({ "error" : "Asynchronous acceptance needs the tenant's BCID to be set" }) , 500
+            order=map_order(entry , order_data , quantity)
+            ticket=order_queue.enqueue(get_order_key(order['header']) , order)
+            return jsonify({ "ticket" : ticket , "status" : "queued" }) , 202 , { 'Location' : f"/orders/{ticket}" }
 
-        # Create data structure for order
-        order_data={
-            "order" : { "Total Quantity" : quantity } ,
-            "lines" : { "requests" : [] } ,
-            "customer_number" : customer_number
-        }
+        # Map items and process order, optionally submitting the lines with the header in one $batch call
+        if request.json.get('submit_batch' , os.getenv('SUBMIT_BATCH') == '1') :
+            mapped_items=map_and_submit_items(entry , order_data , access_token , quantity)
+        else :
+            mapped_items=map_items(entry , order_data , access_token , quantity)
+
+        with stage_timer('serialize') :
+            return jsonify(mapped_items) , 200  # Return success response with status code 200
 
-        # Map items and process order
-        mapped_items=map_items(entry , order_data , access_token , quantity)
+    except OrderEntryError as e :
+        return jsonify({ "error" : str(e) , "field" : e.field }) , 400
 
-        return jsonify(mapped_items) , 200  # Return success response with status code 200
+    except OrderInProgressError as e :
+        return order_in_progress_handler(e)
+
+    except CircuitOpenError as e :
+        if not request.json.get('spool' , os.getenv('SPOOL_ON_OPEN_CIRCUIT') == '1') :
+            return circuit_open_handler(e)
+        # Without submitters a spooled order would wait for a manual replay, the caller retries instead
+        if not get_current_tenant().bc_id or not start_order_submitter() :
+            return circuit_open_handler(e)
+
+        # Keep the mapped order for replay once Business Central is back
+        order_data , quantity=create_order_data(entry , customer_number)
+        order=map_order(entry , order_data , quantity)
+        ticket=order_queue.enqueue(get_order_key(order['header']) , order)
+        logger.warning("Business Central unavailable, order spooled as %s" , ticket)
+        return jsonify({ "ticket" : ticket , "status" : "queued" , "error" : str(e) }) , 202
 
     except Exception as e :
         error_message={ "error" : str(e) }
-        print(error_message)
+        logger.exception("Order failed: %s" , error_message)
         return jsonify(error_message) , 500  # Return error message and HTTP status code 500 (Internal Server Error)
 
 
+# Route to map an order without creating it, the lines carry a placeholder document number
+@app.route('/newOrders/preview' , methods=['POST'])
+def preview_orders_route() :
+    try :
+        entry=parse_order_entry(request.json.get('entry'))
+        order_data , quantity=create_order_data(entry , request.json.get('customer_no'))
+        mapped_items=preview_items(entry , order_data , quantity)
+
+        with stage_timer('serialize') :
+            return jsonify(mapped_items) , 200
+
+    except OrderEntryError as e :
+        return jsonify({ "error" : str(e) , "field" : e.field }) , 400
+
+    except Exception as e :
+        error_message={ "error" : str(e) }
+        logger.exception("Order preview failed: %s" , error_message)
+        return jsonify(error_message) , 500
+
+
+# Route to get the status of an order accepted for background submission
+@app.route('/orders/<ticket>' , methods=['GET'])
+def order_status_route(ticket) :
+    order=order_queue.get(ticket)
+    if order is None :
+        return jsonify({ "error" : f"Unknown ticket {ticket}" }) , 404
+    return jsonify(order)
+
+
+# Route to replay many orders at once, streaming back one NDJSON result per order as it completes
+@app.route('/newOrders/bulk' , methods=['POST'])
+def new_orders_bulk_route() :
+    if request.mimetype == 'application/x-ndjson' :
+        # One order per line, read while earlier orders are being submitted
+        access_token=request.headers.get('Authorization' , '').removeprefix('Bearer ') or None
+        orders=(json.loads(line) for line in request.stream if line.strip())
+    else :
+        access_token=request.json.get('ac')
+        orders=request.json.get('orders' , [])
+
+    results=process_bulk(orders , access_token)
+    return Response(stream_with_context(json.dumps(result) + "\n" for result in results) ,
+                    mimetype='application/x-ndjson')
+
 
 # Run the Flask app
 if __name__ == '__main__' :
-    app.run(debug=True , host="0.0.0.0" , port=2237)
+    # Development server on the gunicorn bind, the same as python serve.py --dev
+    host , _ , port=os.getenv('GUNICORN_BIND' , "0.0.0.0:2235").rpartition(':')
+    app.run(debug=True , host=host , port=int(port))
@@ -0,0 +1,174 @@
+import asyncio
+import contextlib
+import os
+from asgiref.wsgi import WsgiToAsgi
+from app import app as flask_app
+from mapping_functions.async_orders import get_async_client , close_async_clients , map_items_async
+from mapping_functions.circuit_breaker import CircuitOpenError
+from mapping_functions.idempotency import OrderInProgressError
+from mapping_functions.instrumentation import logger
+from mapping_functions.json_fast import dumps , loads
+from mapping_functions.mapping_pencils import create_order_data
+from mapping_functions.order_entry import parse_order_entry , OrderEntryError
+from mapping_functions.tenants import get_tenant , use_tenant , UnknownTenantError , TenantBusyError
+
+# ASGI entry point: /newOrders runs on the event loop, every other route is served by the Flask app.
+# Orders submitted as a $batch, accepted asynchronously or spooled are handed to the Flask app as well.
+#   uvicorn asgi:app --host 0.0.0.0 --port 2235 --workers 4
+#   gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+wsgi_app=WsgiToAsgi(flask_app)
+
+
+async def read_body(receive) :
+    body=b''
+    more_body=True
+    while more_body :
+        message=await receive()
+        body+=message.get('body' , b'')
+        more_body=message.get('more_body' , False)
+    return body
+
+
+def replay_body(body) :
+    """
+    Build an ASGI receive callable that returns a body which was already read.
+
+    Parameters:
+    - body (bytes): Request body.
+
+    Returns:
+    - callable: The receive callable.
+    """
+    messages=[{ 'type' : 'http.request' , 'body' : body , 'more_body' : False }]
+
+    async def receive() :
+        return messages.pop(0) if messages else { 'type' : 'http.disconnect' }
+
+    return receive
+
+
+def needs_wsgi(payload) :
+    """
+    Check whether an order needs a feature only the Flask route implements.
+
+    Parameters:
+    - payload (dict): Request body of /newOrders.
+
+    Returns:
+    - bool: True for $batch submission, asynchronous acceptance or spooling on an open circuit.
+    """
+    return bool(payload.get('submit_batch' , os.getenv('SUBMIT_BATCH') == '1')) or \
+        payload.get('accept' , os.getenv('ORDER_ACCEPT_MODE' , 'sync')) == 'async' or \
+        bool(payload.get('spool' , os.getenv('SPOOL_ON_OPEN_CIRCUIT') == '1'))
+
+
+@contextlib.asynccontextmanager
+async def tenant_slot(tenant) :
+    """
+    Hold one of the tenant's request slots, shared with the Flask routes of this worker.
+
+    The slot is waited for on a thread, so the event loop keeps serving other tenants.
+
+    Parameters:
+    - tenant (Tenant): The tenant.
+
+    Raises:
+    - TenantBusyError: If no slot frees up within the tenant's queue_timeout.
+    """
+    acquiring=asyncio.ensure_future(asyncio.to_thread(tenant.acquire))
+    try :
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError :
+        # The thread may still get the slot after the request is gone, give it back then
+        acquiring.add_done_callback(lambda future : future.cancelled() or future.exception() or tenant.release())
+        raise
+    try :
+        yield tenant
+    finally :
+        tenant.release()
+
+
+async def send_json(send , status , payload , headers=()) :
+    body=dumps(payload)
+    await send({
+        'type' : 'http.response.start' ,
+        'status' : status ,
+        'headers' : [(b'content-type' , b'application/json') , (b'content-length' , str(len(body)).encode()) ,
+                     *headers]
+    })
+    await send({ 'type' : 'http.response.body' , 'body' : body })
+
+
+async def new_orders(scope , receive , send) :
+    body=await read_body(receive)
+    try :
+        payload=loads(body)
+    except ValueError :
+        payload=None
+    # The Flask route answers the orders this one doesn't handle, malformed bodies included
+    if not isinstance(payload , dict) or needs_wsgi(payload) :
+        await wsgi_app(scope , replay_body(body) , send)
+        return
+
+    try :
+        headers=dict(scope.get('headers' , []))
+        tenant_name=headers.get(b'x-tenant' , b'').decode() or payload.get('tenant')
+
+        # The tenant is current for this task only, concurrent orders of other tenants keep theirs
+        with use_tenant(get_tenant(tenant_name)) as tenant :
+            entry=parse_order_entry(payload.get('entry'))
+            access_token=payload.get('ac')
+            customer_number=payload.get('customer_no')
+
+            # Create data structure for order
+            order_data , quantity=create_order_data(entry , customer_number)
+
+            # Map items and process order, holding a tenant slot like the Flask route
+            async with tenant_slot(tenant) :
+                mapped_items=await map_items_async(get_async_client(tenant) , entry , order_data , access_token ,
+                                                   quantity)
+
+        await send_json(send , 200 , mapped_items)
+
+    except UnknownTenantError as e :
+        await send_json(send , 404 , { "error" : str(e) })
+
+    except TenantBusyError as e :
+        await send_json(send , 503 , { "error" : str(e) } , [(b'retry-after' , str(e.retry_after).encode())])
+
+    except OrderEntryError as e :
+        await send_json(send , 400 , { "error" : str(e) , "field" : e.field })
+
+    except CircuitOpenError as e :
+        # Spooling orders on an open circuit is handled by the Flask route, see needs_wsgi
+        await send_json(send , 503 , { "error" : str(e) } , [(b'retry-after' , str(e.retry_after).encode())])
+
+    except OrderInProgressError as e :
+        await send_json(send , 409 , { "error" : str(e) } , [(b'retry-after' , str(e.retry_after).encode())])
+
+    except Exception as e :
+        error_message={ "error" : str(e) }
+        logger.exception("Order failed: %s" , error_message)
+        await send_json(send , 500 , error_message)
+
+
+async def lifespan(scope , receive , send) :
+    while True :
+        message=await receive()
+        if message['type'] == 'lifespan.startup' :
+            # The tenants' clients are created on first use, on this event loop
+            await send({ 'type' : 'lifespan.startup.complete' })
+        elif message['type'] == 'lifespan.shutdown' :
+            await close_async_clients()
+            await send({ 'type' : 'lifespan.shutdown.complete' })
+            return
+
+
+async def app(scope , receive , send) :
+    if scope['type'] == 'lifespan' :
+        await lifespan(scope , receive , send)
+    elif scope['type'] == 'http' and scope['path'] == '/newOrders' and scope['method'] == 'POST' :
+        await new_orders(scope , receive , send)
+    else :
+        await wsgi_app(scope , receive , send)
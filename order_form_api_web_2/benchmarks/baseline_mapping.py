@@ -0,0 +1,224 @@
+import os
+
+# The order mapping of mapping_pencils before the order plan replaced it, kept as the reference the
+# plan is benchmarked and tested against. The catalog tables are passed in instead of imported, and
+# the document number is given instead of created in Business Central. The environment configuration
+# is read in every step, as it was.
+
+
+def get_environment_config() :
+    return {
+        "base_url" : os.getenv("BASEURL") ,
+        "tenant_id" : os.getenv("TENANTID") ,
+        "environment" : os.getenv('TESTENVIRONMENT') ,
+        "company" : os.getenv('COMPANYEU')
+    }
+
+
+def make_catalog_tables() :
+    """
+    Build synthetic catalog tables that cover every choice of the order form.
+
+    The production catalog is not part of this repository, these tables have the same
+    shape and resolve every product ID, packaging ID and language the form can produce.
+
+    Returns:
+    - dict: Catalog tables by name.
+    """
+    tables={
+        'initial_choice' : { } ,
+        'packaging_options' : { } ,
+        'state_of_pencils' : { "Sharpened" : "sh" , "Unsharpened" : "us" } ,
+        'personalized_vs_standard' : { True : "P" , False : "S" } ,
+        'graphite_seeds' : { '40' : "Basil" , '41' : "Mint" , '42' : "Thyme" } ,
+        'color_seeds' : { '50' : "Tomato" , '51' : "Chili" } ,
+        'multi_color_seeds' : { '60' : "Flower" } ,
+        'packaging_types' : { "Gift Box" : "GB" , "Mini Single Card" : "MC" , "Hanger Tag" : "HT" , "3-Pack" : "P3" ,
+                              "5-Pack" : "P5" } ,
+        'packaging' : { True : "c" , False : "n" } ,
+        'languages' : { "Danish" : "611" , "English" : "612" } ,
+        'country_codes' : { "Denmark" : "DK" , "Sweden" : "SE" } ,
+        'item_dict' : { } ,
+        'packaging_items' : { }
+    }
+
+    seeds=[*tables['graphite_seeds'].values() , *tables['color_seeds'].values() ,
+           *tables['multi_color_seeds'].values()]
+    for prefix in ("P" , "S") :
+        for state in ("sh" , "us" , "sp" , "up") :
+            for lang in ("Danish" , "English" , "Other") :
+                for seed in seeds :
+                    for size in ("normal" , "mini") :
+                        tables['item_dict'][f"{prefix} {state} {lang} {seed} {size}"]=str(10000 + len(tables['item_dict']))
+
+    # The 3- and 5-packs are the items sold per pack
+    pack_items={ "P3" : ("2100" , "5240") , "P5" : ("2300" , "5250") }
+    for type_code in tables['packaging_types'].values() :
+        for design in ("c" , "n" , "s") :
+            for lang in ("Danish" , "English" , "Other") :
+                item=pack_items[type_code][design == "c"] if type_code in pack_items else \
+                    str(20000 + len(tables['packaging_items']))
+                tables['packaging_items'][f"{type_code} {design} {lang}"]=item
+    return tables
+
+
+def map_items(entry , data , quantity , tables , document_no) :
+    """
+    Map the items from the order entry to the sales order data, as the original map_items did.
+
+    Parameters:
+    - entry (dict): Order entry as posted by the order form.
+    - data (dict): Sales order data.
+    - quantity (int): Total quantity of items.
+    - tables (dict): Catalog tables.
+    - document_no (str): Document number of the sales order.
+
+    Returns:
+    - dict: Updated sales order data.
+    """
+    config=get_environment_config()
+    product_dict={ }
+    data , product_dict , document_no=add_pencils(entry , product_dict , data , tables , document_no)
+
+    if entry['119'] not in ["Pencils only" , "" , " "] :
+        add_packaging(entry , product_dict , data , tables , document_no , quantity)
+    if entry['233'] != "No thanks not this time" :
+        add_sharpeners(entry , data , config , document_no)
+    handle_language(entry , data , tables , document_no)
+    if entry['7'] in ["Customized laser engraved" , "Customized color print"] :
+        add_fee(data , "Item" , 1 , "625" , "k1k1" , "PP" , config , document_no , 10.0)
+    if entry['111'] == "Customized packaging (Your own design)" :
+        add_fee(data , "Item" , 1 , "626" , "k1k2" , "PP" , config , document_no , 15.0)
+    if entry['7'] in ["Customized color print" , "Standard color print"] :
+        add_one_item(data , "Item" , quantity , "100" , "k1k3" , "PP" , config , document_no)
+    add_one_item(data , "Item" , 1 , "997" , "k1k5" , "PP" , config , document_no)
+
+    return data
+
+
+def add_one_item(data , item_type , quantity , item_no , item_id , location , config , document_no) :
+    data['lines']['requests'].append({
+        "method" : "POST" ,
+        "id" : item_id ,
+        "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
+        "headers" : {
+            "Content-Type" : "application/json"
+        } ,
+        "body" : {
+            "Document_No" : document_no ,
+            "Type" : item_type ,
+            "No" : item_no ,
+            "Location_Code" : location ,
+            "Quantity" : quantity
+        }
+    })
+
+
+def add_fee(data , item_type , quantity , item_no , item_id , location , config , document_no , price) :
+    data['lines']['requests'].append({
+        "method" : "POST" ,
+        "id" : item_id ,
+        "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
+        "headers" : {
+            "Content-Type" : "application/json"
+        } ,
+        "body" : {
+            "Document_No" : document_no ,
+            "Type" : item_type ,
+            "No" : item_no ,
+            "Location_Code" : location ,
+            "Quantity" : quantity ,
+            "Unit_Price" : price
+        }
+    })
+
+
+def handle_language(entries , data , tables , document_no) :
+    config=get_environment_config()
+    if entries['30'] not in ["Other" , ""] :
+        add_one_item(data , "Item" , 1 , tables['languages'][entries['30']] , "898989" , "PP" , config , document_no)
+    else :
+        data['lines']['requests'].append({
+            "method" : "POST" ,
+            "id" : "89898asd9" ,
+            "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
+            "headers" : {
+                "Content-Type" : "application/json"
+            } ,
+            "body" : {
+                "Document_No" : document_no ,
+                "Type" : "Item" ,
+                "No" : '604' ,
+                "Location_Code" : "PP" ,
+                "Quantity" : 1 ,
+                "Description" : entries['248']
+            }
+        })
+
+
+def add_pencils(entry , product_dict , data , tables , document_no) :
+    config=get_environment_config()
+    lang=entry['30']
+    size_and_state={
+        "size" : "normal" if entry['121'] not in ["Mini Single Card" , "Hanger Tag"] else "mini" ,
+        "state" : "up" if entry['121'] in ["Mini Single Card" , "Hanger Tag"] else (
+            "sp" if entry['121'] in ["5-Pack" , "3-Pack"] else (
+                "sp" if entry['28'] == "" else tables['state_of_pencils'][entry['28']]
+            )
+        )
+    }
+    personalized=entry['7'] in ["Customized laser engraved" , "Customized color print"]
+    prefix=tables['personalized_vs_standard'][personalized]
+    entry_lang='Other' if personalized or size_and_state['size'] == 'mini' else lang
+
+    if entry['23'] != "" :
+        product_dict["Pencil_ID_gh"]=f"{prefix} {size_and_state['state']} {entry_lang}"
+    if entry['24'] != "" :
+        product_dict["Pencil_ID_cl"]=f"{prefix} sp {entry_lang}"
+    if entry['152'] != "" :
+        product_dict["Pencil_ID_ml"]=f"{prefix} sp Other"
+
+    size=size_and_state['size']
+    for product_key , seed_table in (("Pencil_ID_gh" , 'graphite_seeds') , ("Pencil_ID_cl" , 'color_seeds') ,
+                                     ("Pencil_ID_ml" , 'multi_color_seeds')) :
+        if product_key in product_dict :
+            data=generate_pencil_batch(product_dict , tables[seed_table] , data , entry , size , product_key ,
+                                       tables , document_no)
+    return data , product_dict , document_no
+
+
+def add_packaging(entry , product_dict , data , tables , document_no , quantity) :
+    packaging_type=entry['121']
+    customized_packaging=entry['111'] == "Customized packaging (Your own design)"
+    lang="Other" if entry['153'] == "" else entry['153']
+    product_dict['packaging_id']=f"{tables['packaging_types'][packaging_type]} " \
+                                 f"{(tables['packaging'][customized_packaging] if packaging_type != 'Hanger Tag' else 's')} {lang}"
+    return generate_packaging_batch(product_dict , data , "packaging_id" , tables , document_no , quantity)
+
+
+def generate_pencil_batch(product_dict , seeds , data , entry , size , color_id , tables , document_no) :
+    config=get_environment_config()
+    for key in seeds.keys() :
+        if entry[key] != "" :
+            add_one_item(data , "Item" , int(entry[key]) ,
+                         tables['item_dict'][f"{product_dict[color_id]} {seeds[key]} {size}"] , str(key) , "PP" ,
+                         config , document_no)
+    return data
+
+
+def generate_packaging_batch(product_dict , data , packaging_id , tables , document_no , quantity) :
+    config=get_environment_config()
+    packaging_item=tables['packaging_items'][product_dict[packaging_id]]
+    if packaging_item in ["2100" , "5240"] :
+        quantity=quantity / 3
+    elif packaging_item in ["2300" , "5250"] :
+        quantity=quantity / 5
+    add_one_item(data , "Item" , quantity , packaging_item , str(1) , "PP" , config , document_no)
+    return data
+
+
+def add_sharpeners(entries , data , config , document_no) :
+    if entries['233'] == "Standard ( plain )" :
+        add_one_item(data , "Item" , int(entries['238']) , "720" , "sharp1" , "PP" , config , document_no)
+    elif entries['233'] == "Customized with color print" :
+        add_one_item(data , "Item" , int(entries['238']) , "722" , "sharp2" , "PP" , config , document_no)
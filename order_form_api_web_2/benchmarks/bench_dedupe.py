@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0 , os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from bench_fuzzy import make_named_customers , vary
+from mapping_functions.customer_dedupe import CUSTOMER_FIELDS , find_duplicates
+
+# Run time and recall of the whole-base duplicate report. Every planted duplicate
+# shares either the VAT number, the phone number, or a varied name and the mail domain
+# with a known customer.
+#   python benchmarks/bench_dedupe.py --customers 500000 --duplicates 10000
+
+
+def plant_duplicate(customer) :
+    duplicate={ **customer , 'No' : f"D{customer['No'][1:]}" , 'E_Mail' : f"d{customer['No']}@gmail.com" }
+    kind=random.choice(('vat' , 'phone' , 'name'))
+    if kind != 'vat' :
+        duplicate['VAT_Registration_No']=""
+    if kind != 'phone' :
+        duplicate['Phone_No']=f"+45 {random.randint(30000000 , 39999999)}"
+    if kind == 'name' :
+        duplicate['Name']=vary(customer['Name'])
+        duplicate['E_Mail']=customer['E_Mail']
+    else :
+        duplicate['Name']="Unrelated Name"
+    return duplicate
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark the customer deduplication job")
+    parser.add_argument('--customers' , type=int , default=500000)
+    parser.add_argument('--duplicates' , type=int , default=10000)
+    args=parser.parse_args()
+
+    random.seed(1)
+    customers=make_named_customers(args.customers)
+    for customer in customers :
+        customer['E_Mail']=f"info@{customer['Name'].split()[0].lower()}{customer['No']}.dk"
+    planted=[plant_duplicate(customers[position]) for position in
+             random.sample(range(len(customers)) , args.duplicates)]
+    frame=pd.DataFrame(customers + planted)[list(CUSTOMER_FIELDS)]
+
+    started=time.perf_counter()
+    duplicates , summary=find_duplicates(frame)
+    elapsed_s=time.perf_counter() - started
+
+    clusters=dict(zip(duplicates['No'] , duplicates['cluster']))
+    found=sum(1 for duplicate in planted if
+              clusters.get(duplicate['No']) is not None and
+              clusters.get(duplicate['No']) == clusters.get(f"C{duplicate['No'][1:]}"))
+    print({ **summary , 'elapsed_s' : round(elapsed_s , 1) , 'recall' : round(found / len(planted) , 3) })
@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0 , os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from mock_bc import make_customers
+from mapping_functions.fuzzy_matching import FuzzyCustomerIndex
+
+# Build time, lookup time and recall of the fuzzy customer index. Every query is the
+# name of a known customer with a different case, legal form suffix or punctuation.
+#   python benchmarks/bench_fuzzy.py --customers 100000 --queries 1000
+
+WORDS=("nordic" , "trading" , "consult" , "design" , "print" , "media" , "service" , "group" , "solutions" , "import")
+SUFFIXES=("ApS" , "A/S" , "GmbH" , "Ltd" , "")
+
+
+def make_named_customers(count) :
+    customers=make_customers(count)
+    for customer in customers :
+        stem=''.join(random.choices("abcdefghijklmnopqrstuvwxyz" , k=random.randint(4 , 9))).title()
+        customer['Name']=f"{stem} {random.choice(WORDS).title()} {random.choice(SUFFIXES)}".strip()
+    return customers
+
+
+def vary(name) :
+    stem=name.rsplit(' ' , 1)[0] if name.endswith(SUFFIXES[:-1]) else name
+    return random.choice([name.upper() , f"{stem} {random.choice(SUFFIXES[:-1])}." , name.lower().replace(' ' , '  ')])
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark the fuzzy customer index")
+    parser.add_argument('--customers' , type=int , default=100000)
+    parser.add_argument('--queries' , type=int , default=1000)
+    args=parser.parse_args()
+
+    random.seed(1)
+    customers=make_named_customers(args.customers)
+    started=time.perf_counter()
+    index=FuzzyCustomerIndex(customers)
+    build_s=time.perf_counter() - started
+
+    queries=[(position , vary(customers[position]['Name'])) for position in
+             random.sample(range(len(customers)) , args.queries)]
+    found=0
+    started=time.perf_counter()
+    for position , name in queries :
+        found+=any(candidate == position for _ , candidate in index.search('' , '' , name))
+    lookup_s=(time.perf_counter() - started) / len(queries)
+
+    print({
+        'customers' : args.customers , 'build_s' : round(build_s , 2) ,
+        'lookup_ms' : round(lookup_s * 1000 , 3) , 'recall' : round(found / len(queries) , 3)
+    })
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0 , os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from entries import make_entry
+from mock_bc import make_customers
+from mapping_functions import json_fast
+from Product_Catalog.templates import templates , country_dict
+
+# CPU time per request of JSON parsing and serialization, stdlib json versus orjson,
+# at different sizes of the customer list callers send to /get_customers.
+#   python benchmarks/bench_json.py --sizes 1000,10000,50000
+
+
+def cpu_time_per_call(function , repeat) :
+    started=time.process_time()
+    for _ in range(repeat) :
+        function()
+    return (time.process_time() - started) / repeat
+
+
+def measure(size , repeat) :
+    customers=make_customers(size)
+    request_body=json.dumps({ 'entry' : make_entry(1) , 'ac' : 'token' , 'customers' : customers }).encode()
+    customers_found=[{ 'title' : f"{customer['No']} - {customer['Name']}" , 'value' : customer['No'] }
+                     for customer in customers[:5]]
+    response={
+        'customer_mapping' : { 'no' : customers_found } , "ac" : 'token' , 't_id' : 'tenant' ,
+        'templates' : templates , 'countries' : country_dict
+    }
+
+    results={ }
+    for backend in ('stdlib' , 'orjson') :
+        if backend == 'orjson' and json_fast.orjson is None :
+            continue
+        json_fast.use_orjson=backend == 'orjson'
+        results[backend]={
+            'parse_request_ms' : cpu_time_per_call(lambda : json_fast.loads(request_body) , repeat) * 1000 ,
+            'serialize_response_ms' : cpu_time_per_call(lambda : json_fast.dumps(response) , repeat) * 1000 ,
+            'prebuilt_response_ms' : cpu_time_per_call(
+                lambda : json_fast.customers_response_body(customers_found , 'token' , 'tenant') , repeat) * 1000
+        }
+    return len(request_body) , results
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark JSON CPU time per request")
+    parser.add_argument('--sizes' , default='1000,10000,50000' , help="Comma separated customer list sizes")
+    parser.add_argument('--repeat' , type=int , default=20)
+    args=parser.parse_args()
+
+    for size in [int(size) for size in args.sizes.split(',')] :
+        body_size , results=measure(size , args.repeat)
+        print(f"{size} customers, {body_size / 1e6:.1f} MB request body")
+        for backend , timings in results.items() :
+            print(f"  {backend}: " + ", ".join(f"{name}={value:.3f}" for name , value in timings.items()))
@@ -0,0 +1,71 @@
+import argparse
+import copy
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0 , os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+import baseline_mapping
+from entries import make_catalog_entry
+from mapping_functions.mapping_pencils import create_order_data , map_lines
+from mapping_functions.order_entry import parse_order_entry
+from mapping_functions.order_plan import compile_order_plan
+from mapping_functions.product_catalog import ProductCatalog
+
+# Mapping time per entry of the original map_items (baseline) versus the compiled order plan and the
+# plan behind the mapping cache, on a synthetic catalog that exercises pencils, packaging and sharpeners.
+# No HTTP calls are made, the document number is a placeholder.
+#   python benchmarks/bench_mapping.py --entries 1000 --repeat 5
+
+CONFIG=baseline_mapping.get_environment_config()
+
+
+def map_with_baseline(order , plan) :
+    raw_entry , _ , data , quantity=order
+    return baseline_mapping.map_items(raw_entry , data , quantity , plan.catalog.tables , "SO000001")
+
+
+def map_with_plan(order , plan) :
+    _ , entry , data , quantity=order
+    product_dict , size=plan.pencil_ids(entry)
+    return plan.add_lines(entry , product_dict , size , data , "SO000001" , quantity)
+
+
+def map_with_cache(order , plan) :
+    # Every entry after the first round is served from the mapping cache
+    _ , entry , _ , quantity=order
+    return map_lines(plan , entry , quantity)
+
+
+def run(mapper , orders , plan) :
+    for raw_entry , entry , data , quantity in orders :
+        mapper((raw_entry , entry , copy.copy(data) | { 'lines' : { 'requests' : [] } } , quantity) , plan)
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark order mapping time per entry")
+    parser.add_argument('--entries' , type=int , default=1000)
+    parser.add_argument('--repeat' , type=int , default=5)
+    args=parser.parse_args()
+
+    catalog=ProductCatalog(baseline_mapping.make_catalog_tables() , source='synthetic')
+    plan=compile_order_plan(CONFIG , catalog)
+    rng=random.Random(7)
+    entries=[make_catalog_entry(entry_id , catalog.tables , rng) for entry_id in range(args.entries)]
+    best=min(timeit.repeat(lambda : [parse_order_entry(entry , catalog) for entry in entries] , number=1 ,
+                           repeat=args.repeat))
+    print(f"parse: {best / args.entries * 1e6:.1f} us per entry")
+
+    orders=[]
+    for raw_entry in entries :
+        entry=parse_order_entry(raw_entry , catalog)
+        data , quantity=create_order_data(entry , 'C0001')
+        orders.append((raw_entry , entry , data , quantity))
+
+    timings={ }
+    for name , mapper in (('baseline' , map_with_baseline) , ('plan' , map_with_plan) , ('cached' , map_with_cache)) :
+        timings[name]=min(timeit.repeat(lambda : run(mapper , orders , plan) , number=1 , repeat=args.repeat))
+        print(f"{name}: {timings[name] / args.entries * 1e6:.1f} us per entry "
+              f"({timings['baseline'] / timings[name]:.1f}x baseline)")
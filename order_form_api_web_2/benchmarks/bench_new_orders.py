@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import httpx
+
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from entries import make_entry
+from mock_bc import start_mock_bc , get_mock_env
+from servers import start_app_server , wait_until_ready
+
+# Concurrent /newOrders throughput of the Flask app under gunicorn sync workers
+# versus the ASGI entry point under uvicorn, against a mock Business Central.
+#   python benchmarks/bench_new_orders.py --mode sync --latency 0.5 --concurrency 200
+#   python benchmarks/bench_new_orders.py --mode asgi --latency 0.5 --concurrency 200
+
+
+async def run(url , total , concurrency) :
+    semaphore=asyncio.Semaphore(concurrency)
+    latencies=[]
+    errors=0
+
+    async with httpx.AsyncClient(timeout=300 , limits=httpx.Limits(max_connections=concurrency)) as client :
+        await wait_until_ready(client , url)
+
+        async def send_order(entry_id) :
+            nonlocal errors
+            async with semaphore :
+                started=time.perf_counter()
+                response=await client.post(f"{url}/newOrders" , json={
+                    'entry' : make_entry(entry_id) , 'ac' : 'token' , 'customer_no' : 'C0001'
+                })
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200 :
+                    errors+=1
+
+        started=time.perf_counter()
+        await asyncio.gather(*(send_order(entry_id) for entry_id in range(total)))
+        elapsed=time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests' : total ,
+        'errors' : errors ,
+        'elapsed_s' : round(elapsed , 3) ,
+        'throughput_rps' : round(total / elapsed , 1) ,
+        'p50_ms' : round(statistics.median(latencies) * 1000 , 1) ,
+        'p95_ms' : round(latencies[int(len(latencies) * 0.95) - 1] * 1000 , 1)
+    }
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark concurrent /newOrders throughput")
+    parser.add_argument('--mode' , choices=['sync' , 'asgi'] , default='sync')
+    parser.add_argument('--workers' , type=int , default=4)
+    parser.add_argument('--requests' , type=int , default=1000)
+    parser.add_argument('--concurrency' , type=int , default=200)
+    parser.add_argument('--latency' , type=float , default=0.5 , help="Mock Business Central latency in seconds")
+    parser.add_argument('--port' , type=int , default=2299)
+    args=parser.parse_args()
+
+    bc=start_mock_bc(latency=args.latency)
+    env={
+        **get_mock_env(f"http://127.0.0.1:{bc.server_address[1]}") ,
+        'IDEMPOTENCY_DB' : os.path.join(tempfile.mkdtemp() , 'idempotency.sqlite3')
+    }
+    server=start_app_server(args.mode , args.port , args.workers , env)
+    try :
+        result=asyncio.run(run(f"http://127.0.0.1:{args.port}" , args.requests , args.concurrency))
+        print({ 'mode' : args.mode , 'workers' : args.workers , 'latency_s' : args.latency , **result })
+    finally :
+        server.terminate()
+        server.wait()
+        bc.shutdown()
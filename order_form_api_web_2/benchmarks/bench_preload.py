@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import httpx
+
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from mock_bc import start_mock_bc , get_mock_env
+from servers import start_app_server , wait_until_ready
+
+# Cold start time and per-worker memory of gunicorn with and without preload_app.
+# PSS splits shared pages between the processes sharing them, so it drops when the
+# workers share the catalog and customer index with the master. Linux only.
+#   python benchmarks/bench_preload.py --workers 4 --customers 50000
+
+
+def read_memory(pid) :
+    """
+    Read the resident and proportional set size of a process.
+
+    Parameters:
+    - pid (int): Process ID.
+
+    Returns:
+    - dict: rss_mb and pss_mb.
+    """
+    memory={ }
+    with open(f"/proc/{pid}/smaps_rollup" , 'r') as file :
+        for line in file :
+            name , _ , value=line.partition(':')
+            if name in ('Rss' , 'Pss') :
+                memory[f"{name.lower()}_mb"]=round(int(value.split()[0]) / 1024 , 1)
+    return memory
+
+
+def get_children(pid) :
+    with open(f"/proc/{pid}/task/{pid}/children" , 'r') as file :
+        return [int(child) for child in file.read().split()]
+
+
+async def measure(url , server) :
+    started=time.perf_counter()
+    async with httpx.AsyncClient(timeout=300) as client :
+        await wait_until_ready(client , url)
+        ready_s=time.perf_counter() - started
+        # Every worker needs the customer snapshot, spread enough requests to reach all of them
+        for entry_id in range(32) :
+            await client.post(f"{url}/get_customers" , json={
+                'ac' : 'token' , 'catalog' : 'version' ,
+                'entry' : { '138' : f"DK{10000000 + entry_id}" , '88' : "" , '307' : "" , '86' : "" }
+            })
+
+    workers=[read_memory(pid) for pid in get_children(server.pid)]
+    return {
+        'ready_s' : round(ready_s , 2) ,
+        'worker_rss_mb' : round(sum(worker['rss_mb'] for worker in workers) / len(workers) , 1) ,
+        'worker_pss_mb' : round(sum(worker['pss_mb'] for worker in workers) / len(workers) , 1) ,
+        'master_pss_mb' : read_memory(server.pid)['pss_mb']
+    }
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Compare gunicorn with and without preload_app")
+    parser.add_argument('--workers' , type=int , default=4)
+    parser.add_argument('--customers' , type=int , default=50000)
+    parser.add_argument('--port' , type=int , default=2298)
+    args=parser.parse_args()
+
+    bc=start_mock_bc(customers=args.customers)
+    try :
+        for preload in ('0' , '1') :
+            env={
+                **get_mock_env(f"http://127.0.0.1:{bc.server_address[1]}") ,
+                'IDEMPOTENCY_DB' : os.path.join(tempfile.mkdtemp() , 'idempotency.sqlite3') ,
+                'GUNICORN_PRELOAD' : preload , 'BCID' : 'bench'
+            }
+            server=start_app_server('sync' , args.port , args.workers , env)
+            try :
+                result=asyncio.run(measure(f"http://127.0.0.1:{args.port}" , server))
+                print({ 'preload' : preload == '1' , 'workers' : args.workers , **result })
+            finally :
+                server.terminate()
+                server.wait()
+    finally :
+        bc.shutdown()
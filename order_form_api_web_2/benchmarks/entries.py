@@ -0,0 +1,74 @@
+import random
+
+# Synthetic Gravity Forms entries. They only use choices that map without the
+# production product catalog, which is not part of this repository.
+
+
+def make_entry(entry_id) :
+    """
+    Build a synthetic order entry.
+
+    Parameters:
+    - entry_id (int): Gravity Forms entry ID.
+
+    Returns:
+    - dict: Order entry.
+    """
+    return {
+        'id' : str(entry_id) ,
+        '7' : random.choice(["" , "Customized laser engraved" , "Standard color print"]) ,
+        '23' : "" , '24' : "" , '152' : "" ,
+        '25' : str(random.choice([100 , 250 , 500 , 1000])) ,
+        '28' : "" ,
+        '30' : "Other" ,
+        '86' : f"Company {entry_id} ApS" ,
+        '87.1' : "Main Street 1" , '87.2' : "" , '87.3' : "Copenhagen" , '87.5' : "2100" , '87.6' : "Denmark" ,
+        '88' : f"buyer{entry_id}@company{entry_id}.dk" ,
+        '89.3' : "Jane" , '89.6' : "Doe" ,
+        '94' : "" , '95.1' : "" , '95.2' : "" , '95.3' : "" , '95.5' : "" , '95.6' : "" ,
+        '96.3' : "" , '96.6' : "" , '97' : "" ,
+        '111' : random.choice(["" , "Customized packaging (Your own design)"]) ,
+        '119' : "Pencils only" ,
+        '121' : "Mini Single Card" ,
+        '125' : "" ,
+        '138' : f"DK{10000000 + entry_id}" ,
+        '139.1' : "" ,
+        '153' : "" ,
+        '233' : "No thanks not this time" ,
+        '238' : "" ,
+        '248' : "Danish" ,
+        '307' : f"+45 {20000000 + entry_id}"
+    }
+
+
+def make_catalog_entry(entry_id , tables , rng=random) :
+    """
+    Build a synthetic order entry that uses every part of a catalog: pencils, packaging and sharpeners.
+
+    Parameters:
+    - entry_id (int): Gravity Forms entry ID.
+    - tables (dict): Catalog tables the entry's choices are taken from, e.g. baseline_mapping.make_catalog_tables().
+    - rng (random.Random): Source of the choices.
+
+    Returns:
+    - dict: Order entry.
+    """
+    entry=make_entry(entry_id)
+    entry.update({
+        '7' : rng.choice(["" , "Customized laser engraved" , "Customized color print" , "Standard color print"]) ,
+        '28' : rng.choice(["" , *tables['state_of_pencils']]) ,
+        '30' : rng.choice(["Other" , *tables['languages']]) ,
+        '111' : rng.choice(["" , "Customized packaging (Your own design)"]) ,
+        '119' : rng.choice(["Pencils only" , "Gift packaging"]) ,
+        '121' : rng.choice(list(tables['packaging_types'])) ,
+        '153' : rng.choice(["" , *tables['languages']]) ,
+        '233' : rng.choice(["No thanks not this time" , "Standard ( plain )" , "Customized with color print"]) ,
+        '238' : str(rng.randint(1 , 200))
+    })
+    for quantity_field , seed_table in (('23' , 'graphite_seeds') , ('24' , 'color_seeds') ,
+                                        ('152' , 'multi_color_seeds')) :
+        filled=rng.random() < 0.6
+        entry[quantity_field]=str(rng.randint(1 , 2000)) if filled else ""
+        for key in tables[seed_table] :
+            entry[key]=str(rng.randint(1 , 500)) if filled and rng.random() < 0.7 else ""
+    return entry
@@ -0,0 +1,161 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler , ThreadingHTTPServer
+from urllib.parse import urlparse , parse_qs
+
+# Local stand-in for TOKEN_URL and the Business Central ODataV4 endpoints used by the service:
+#   POST .../token                      access token
+#   GET  .../ODataV4/<company>/<customer endpoint>  paged customers, follows $skiptoken and odata.maxpagesize
+#   POST .../ODataV4/<company>/Sales_Order_Excel    created sales order
+#   POST .../ODataV4/$batch                         batch responses
+#
+#   python benchmarks/mock_bc.py --port 8099 --latency 0.5 --error-rate 0.01
+
+CUSTOMER_PAGE_SIZE=1000
+
+
+def make_customers(count) :
+    """
+    Build synthetic Business Central customers.
+
+    Parameters:
+    - count (int): Number of customers.
+
+    Returns:
+    - List[dict]: Customers with the fields selected by get_customers_from_bc.
+    """
+    return [{
+        'No' : f"C{number:06d}" ,
+        'Blocked' : "All" if number % 50 == 0 else "" ,
+        'VAT_Registration_No' : f"DK{10000000 + number}" ,
+        'Phone_No' : f"+45 {20000000 + number}" ,
+        'Name' : f"Company {number} ApS" ,
+        'E_Mail' : f"buyer{number}@company{number}.dk" ,
+        'SystemModifiedAt' : "2024-01-01T00:00:00Z"
+    } for number in range(count)]
+
+
+class MockBusinessCentralHandler(BaseHTTPRequestHandler) :
+    protocol_version='HTTP/1.1'
+    latency=0.0
+    error_rate=0.0
+    error_status=503
+    customers=[]
+    counter=itertools.count(1)
+
+    def do_GET(self) :
+        if self.inject() :
+            return
+        url=urlparse(self.path)
+        query=parse_qs(url.query)
+        if '$filter' in query :
+            # Delta syncs see no changes
+            self.send_json(200 , { 'value' : [] })
+            return
+
+        offset=int(query.get('$skiptoken' , ['0'])[0])
+        page_size=CUSTOMER_PAGE_SIZE
+        prefer=self.headers.get('Prefer' , '')
+        if prefer.startswith('odata.maxpagesize=') :
+            page_size=min(page_size , int(prefer.partition('=')[2]))
+        page={ 'value' : self.customers[offset:offset + page_size] }
+        if offset + page_size < len(self.customers) :
+            page['@odata.nextLink']=f"http://{self.headers['Host']}{url.path}?$skiptoken={offset + page_size}"
+        self.send_json(200 , page)
+
+    def do_POST(self) :
+        length=int(self.headers.get('Content-Length' , 0))
+        body=self.rfile.read(length)
+        if self.inject() :
+            return
+
+        path=urlparse(self.path).path
+        if path.endswith('/token') :
+            self.send_json(200 , { 'access_token' : f"token{next(self.counter)}" , 'expires_in' : 3599 })
+        elif path.endswith('/$batch') :
+            document_no=f"SO{next(self.counter):06d}"
+            responses=[{
+                'id' : request['id'] , 'status' : 201 ,
+                'body' : { 'No' : document_no , 'Line_No' : index * 10000 }
+            } for index , request in enumerate(json.loads(body)['requests'])]
+            self.send_json(200 , { 'responses' : responses })
+        else :
+            self.send_json(201 , { 'No' : f"SO{next(self.counter):06d}" })
+
+    def inject(self) :
+        time.sleep(self.latency * random.uniform(0.8 , 1.2))
+        if random.random() < self.error_rate :
+            self.send_json(self.error_status , { 'error' : { 'message' : "Injected error" } })
+            return True
+        return False
+
+    def send_json(self , status , payload) :
+        body=json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type' , 'application/json')
+        self.send_header('Content-Length' , str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self , format , *args) :
+        pass
+
+
+def start_mock_bc(port=0 , latency=0.0 , error_rate=0.0 , error_status=503 , customers=1000) :
+    """
+    Start the mock Business Central and token server in a background thread.
+
+    Parameters:
+    - port (int): Port to listen on, 0 picks a free port.
+    - latency (float): Mean seconds every response is delayed, with 20% jitter.
+    - error_rate (float): Fraction of requests answered with error_status.
+    - error_status (int): HTTP status of injected errors.
+    - customers (int): Number of synthetic customers served.
+
+    Returns:
+    - ThreadingHTTPServer: The running server, its address is in server_address.
+    """
+    handler=type('Handler' , (MockBusinessCentralHandler ,) , {
+        'latency' : latency , 'error_rate' : error_rate , 'error_status' : error_status ,
+        'customers' : make_customers(customers) , 'counter' : itertools.count(1)
+    })
+    server=ThreadingHTTPServer(('127.0.0.1' , port) , handler)
+    server.daemon_threads=True
+    threading.Thread(target=server.serve_forever , daemon=True).start()
+    return server
+
+
+def get_mock_env(bc_url) :
+    """
+    Environment variables pointing the service at the mock server.
+
+    Parameters:
+    - bc_url (str): Base URL of the mock server.
+
+    Returns:
+    - dict: Environment variables.
+    """
+    return {
+        'BASEURL' : bc_url , 'TENANTID' : 'tenant' , 'TESTENVIRONMENT' : 'test' , 'PRODENVIRNMENT' : 'prod' ,
+        'COMPANYEU' : 'company' , 'CUSTOMERENDPOINT' : 'customers' , 'TOKEN_URL' : f"{bc_url}/oauth2/token" ,
+        'SCOPE' : 'https://api.businesscentral.dynamics.com/.default' , 'CLIENT_SECRET' : 'secret' ,
+        'GRANT_TYPE' : 'client_credentials'
+    }
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Mock Business Central and token server")
+    parser.add_argument('--port' , type=int , default=8099)
+    parser.add_argument('--latency' , type=float , default=0.5)
+    parser.add_argument('--error-rate' , type=float , default=0.0)
+    parser.add_argument('--error-status' , type=int , default=503)
+    parser.add_argument('--customers' , type=int , default=1000)
+    args=parser.parse_args()
+
+    server=start_mock_bc(args.port , args.latency , args.error_rate , args.error_status , args.customers)
+    print(f"Mock Business Central listening on http://127.0.0.1:{server.server_address[1]}")
+    threading.Event().wait()
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import httpx
+
+sys.path.insert(0 , os.path.dirname(os.path.abspath(__file__)))
+from entries import make_entry
+from mock_bc import start_mock_bc , get_mock_env , make_customers
+from servers import start_app_server , wait_until_ready
+
+# Latency and throughput of /retrieve_ac, /get_customers and /newOrders per worker count,
+# against the local mock Business Central and token server. Results are written as JSON
+# so runs can be compared with each other.
+#   python benchmarks/run_load.py --workers 1,2,4 --requests 500 --concurrency 32 --output bench_results.json
+
+
+def percentile(sorted_values , fraction) :
+    """
+    Nearest-rank percentile of sorted values.
+
+    Parameters:
+    - sorted_values (List[float]): Values in ascending order.
+    - fraction (float): Percentile as a fraction, e.g. 0.95.
+
+    Returns:
+    - float: The percentile, 0 if there are no values.
+    """
+    if not sorted_values :
+        return 0.0
+    rank=max(1 , math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def build_scenarios(ship_customers , customer_count) :
+    """
+    Build the request body factory of every route.
+
+    Parameters:
+    - ship_customers (bool): Send the customer list in the /get_customers body like legacy callers.
+    - customer_count (int): Number of customers sent when ship_customers is set.
+
+    Returns:
+    - dict: Route -> function building the JSON body of request number n.
+    """
+    customers=make_customers(customer_count) if ship_customers else None
+    # Entry IDs are offset per route run so /newOrders never replays an idempotent result
+    run_offset=int(time.time())
+
+    def customers_body(number) :
+        body={ 'entry' : make_entry(number) , 'ac' : 'token' }
+        if customers is not None :
+            body['customers']=customers
+        return body
+
+    return {
+        '/retrieve_ac' : lambda number : { 'bc_id' : 'client' } ,
+        '/get_customers' : customers_body ,
+        '/newOrders' : lambda number : {
+            'entry' : make_entry(run_offset * 100000 + number) , 'ac' : 'token' , 'customer_no' : 'C000001'
+        }
+    }
+
+
+async def drive(client , url , build_body , total , concurrency) :
+    """
+    Send requests to one route with bounded concurrency.
+
+    Returns:
+    - dict: Request count, errors, throughput and latency percentiles in milliseconds.
+    """
+    semaphore=asyncio.Semaphore(concurrency)
+    latencies=[]
+    errors=0
+
+    async def send(number) :
+        nonlocal errors
+        body=build_body(number)
+        async with semaphore :
+            started=time.perf_counter()
+            try :
+                response=await client.post(url , json=body)
+                failed=response.status_code >= 400
+            except httpx.HTTPError :
+                failed=True
+            latencies.append(time.perf_counter() - started)
+            if failed :
+                errors+=1
+
+    started=time.perf_counter()
+    await asyncio.gather(*(send(number) for number in range(total)))
+    elapsed=time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests' : total ,
+        'errors' : errors ,
+        'throughput_rps' : round(total / elapsed , 1) ,
+        'p50_ms' : round(percentile(latencies , 0.50) * 1000 , 2) ,
+        'p95_ms' : round(percentile(latencies , 0.95) * 1000 , 2) ,
+        'p99_ms' : round(percentile(latencies , 0.99) * 1000 , 2)
+    }
+
+
+async def run_worker_count(url , scenarios , routes , total , concurrency) :
+    results={ }
+    async with httpx.AsyncClient(timeout=300 , limits=httpx.Limits(max_connections=concurrency)) as client :
+        await wait_until_ready(client , url)
+        for route in routes :
+            # One warm-up request per route fills the worker's caches before measuring
+            await client.post(f"{url}{route}" , json=scenarios[route](0))
+            results[route]=await drive(client , f"{url}{route}" , scenarios[route] , total , concurrency)
+    return results
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Load test the service against a mock Business Central")
+    parser.add_argument('--mode' , choices=['sync' , 'asgi'] , default='sync')
+    parser.add_argument('--workers' , default='1,2,4' , help="Comma separated worker counts")
+    parser.add_argument('--routes' , default='/retrieve_ac,/get_customers,/newOrders')
+    parser.add_argument('--requests' , type=int , default=500 , help="Requests per route")
+    parser.add_argument('--concurrency' , type=int , default=32)
+    parser.add_argument('--latency' , type=float , default=0.1 , help="Mock Business Central latency in seconds")
+    parser.add_argument('--error-rate' , type=float , default=0.0)
+    parser.add_argument('--error-status' , type=int , default=503)
+    parser.add_argument('--customers' , type=int , default=5000)
+    parser.add_argument('--ship-customers' , action='store_true' ,
+                        help="Send the customer list in every /get_customers body")
+    parser.add_argument('--port' , type=int , default=2299)
+    parser.add_argument('--output' , default='bench_results.json')
+    args=parser.parse_args()
+
+    routes=args.routes.split(',')
+    scenarios=build_scenarios(args.ship_customers , args.customers)
+    bc=start_mock_bc(latency=args.latency , error_rate=args.error_rate , error_status=args.error_status ,
+                     customers=args.customers)
+    bc_url=f"http://127.0.0.1:{bc.server_address[1]}"
+
+    report={
+        'started_at' : time.strftime('%Y-%m-%dT%H:%M:%S') ,
+        'python' : platform.python_version() ,
+        'settings' : { key : value for key , value in vars(args).items() if key != 'output' } ,
+        'results' : { }
+    }
+    try :
+        for workers in [int(count) for count in args.workers.split(',')] :
+            env={
+                **get_mock_env(bc_url) ,
+                'IDEMPOTENCY_DB' : os.path.join(tempfile.mkdtemp() , 'idempotency.sqlite3')
+            }
+            server=start_app_server(args.mode , args.port , workers , env)
+            try :
+                results=asyncio.run(run_worker_count(f"http://127.0.0.1:{args.port}" , scenarios , routes ,
+                                                     args.requests , args.concurrency))
+            finally :
+                server.terminate()
+                server.wait()
+            report['results'][str(workers)]=results
+            for route , result in results.items() :
+                print(f"workers={workers} {route}: {result}")
+    finally :
+        bc.shutdown()
+
+    with open(args.output , 'w') as file :
+        json.dump(report , file , indent=2)
+    print(f"Results written to {args.output}")
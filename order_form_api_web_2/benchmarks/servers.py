@@ -0,0 +1,45 @@
+import asyncio
+import os
+import subprocess
+import httpx
+
+APP_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_app_server(mode , port , workers , env) :
+    """
+    Start the service in a subprocess.
+
+    Parameters:
+    - mode (str): 'sync' for gunicorn sync workers, 'asgi' for the ASGI entry point under uvicorn.
+    - port (int): Port to listen on.
+    - workers (int): Number of worker processes.
+    - env (dict): Extra environment variables.
+
+    Returns:
+    - subprocess.Popen: The server process.
+    """
+    if mode == 'sync' :
+        command=['gunicorn' , '-c' , 'gunicorn_config.py' , '-k' , 'sync' , '-w' , str(workers) , '-b' ,
+                 f"127.0.0.1:{port}" , 'app:app']
+    else :
+        command=['uvicorn' , 'asgi:app' , '--workers' , str(workers) , '--port' , str(port) , '--log-level' ,
+                 'warning']
+    return subprocess.Popen(command , cwd=APP_DIR , env={ **os.environ , **env })
+
+
+async def wait_until_ready(client , url) :
+    """
+    Wait until the service answers /serverIsActive.
+
+    Parameters:
+    - client (httpx.AsyncClient): HTTP client.
+    - url (str): Base URL of the service.
+    """
+    for _ in range(100) :
+        try :
+            await client.get(f"{url}/serverIsActive")
+            return
+        except httpx.TransportError :
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
@@ -1,2 +1,80 @@
-bind = "0.0.0.0:2235"
-workers = 4
\ No newline at end of file
+import gc
+import multiprocessing
+import os
+
+# Production settings, every value can be overridden through the environment.
+# serve.py runs gunicorn with this file:
+#   python serve.py
+#   python serve.py --worker-class gevent --workers 8
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', "0.0.0.0:2235")
+backlog = env_int('GUNICORN_BACKLOG', 2048)
+
+# The workers mostly wait on Business Central, so threads or greenlets serve more
+# concurrent orders per process than sync workers.
+# - sync: one request per process, 2 * CPU + 1 processes
+# - gthread: GUNICORN_THREADS threads per process, CPU + 1 processes
+# - gevent: GUNICORN_WORKER_CONNECTIONS greenlets per process, one process per CPU, needs the gevent package,
+#   the app isn't preloaded
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'sync':
+    default_workers, threads = 2 * cpu_count + 1, 1
+elif worker_class == 'gthread':
+    default_workers, threads = cpu_count + 1, env_int('GUNICORN_THREADS', 8)
+elif worker_class == 'gevent':
+    default_workers, threads = cpu_count, 1
+else:
+    raise ValueError(f"Unsupported GUNICORN_WORKER_CLASS: {worker_class}")
+workers = env_int('GUNICORN_WORKERS', default_workers)
+worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+
+# Order submissions can wait on several Business Central calls
+timeout = env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers now and then, the jitter keeps them from restarting at the same time
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+# Heartbeat files in memory, a slow disk would otherwise look like a hung worker
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Import the app once in the master so the workers share the catalog and customer index pages.
+# gevent patches the standard library in the worker, after a preloaded app already created
+# its SQLite connections, locks and threads, so gevent workers import the app themselves.
+preload_app = os.getenv('GUNICORN_PRELOAD', '0' if worker_class == 'gevent' else '1') == '1'
+if preload_app and worker_class == 'gevent':
+    raise ValueError("GUNICORN_PRELOAD=1 is not supported with GUNICORN_WORKER_CLASS=gevent")
+
+if preload_app:
+    # Objects created while preloading are frozen before forking, no collection should move them first
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        from mapping_functions.preload import warm_master
+        warm_master()
+        gc.enable()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from mapping_functions.preload import post_fork_worker
+        post_fork_worker()
+
+
+def post_worker_init(worker):
+    # Runs before the worker accepts connections
+    from mapping_functions.preload import warm_worker
+    warm_worker()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlparse
+import httpx
+from mapping_functions.circuit_breaker import get_breaker , is_failure_status
+from mapping_functions.http_client import get_client_config
+from mapping_functions.idempotency import idempotency_store , OrderInProgressError
+from mapping_functions.instrumentation import stage_timer , observe_upstream
+from mapping_functions.tenants import get_current_tenant
+from mapping_functions.mapping_pencils import get_order_plan , build_order_header , get_order_url , get_order_key , \
+    map_lines , order_record , read_order_record
+
+
+def create_async_client(tenant) :
+    """
+    Create the non-blocking HTTP client of a tenant used by the async order pipeline.
+
+    Parameters:
+    - tenant (Tenant): The tenant.
+
+    Returns:
+    - httpx.AsyncClient: Pooled client, sized by ASYNC_HTTP_MAX_CONNECTIONS, keeping the tenant's pool_size connections open.
+    """
+    config=get_client_config()
+    max_connections=int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS' , 200))
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(config['read_timeout'] , connect=config['connect_timeout']) ,
+        limits=httpx.Limits(max_connections=max_connections ,
+                            max_keepalive_connections=min(tenant.pool_size , max_connections)) ,
+        transport=httpx.AsyncHTTPTransport(retries=config['retries'])
+    )
+
+
+# Clients of the event loop of this worker, by tenant name, like the sessions of http_client
+_async_clients={ }
+
+
+def get_async_client(tenant=None) :
+    """
+    Return the async client of a tenant, creating it on first use.
+
+    Only called from the event loop, which serializes the calls.
+
+    Parameters:
+    - tenant (Tenant): The tenant, the current tenant if omitted.
+
+    Returns:
+    - httpx.AsyncClient: The tenant's client.
+    """
+    tenant=tenant or get_current_tenant()
+    client=_async_clients.get(tenant.name)
+    if client is None :
+        client=_async_clients[tenant.name]=create_async_client(tenant)
+    return client
+
+
+async def close_async_clients() :
+    """
+    Close the async clients of every tenant, called when the event loop shuts down.
+    """
+    clients=list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients :
+        await client.aclose()
+
+
+async def create_new_order_async(client , quantity , customer , access_token , entry) :
+    """
+    Create a new sales order without blocking the event loop.
+
+    Parameters:
+    - client (httpx.AsyncClient): HTTP client.
+    - quantity (int): Total quantity of items.
+    - customer (str): Customer number.
+    - access_token (str): Access token for authentication.
+    - entry (OrderEntry): Order entry.
+
+    Returns:
+    - str: Document number of the created sales order.
+    """
+    header=build_order_header(quantity , customer , entry)
+    headers={
+        'Content-Type' : 'application/json' ,
+        'Authorization' : f"Bearer {access_token}"
+    }
+
+    # Same idempotency handling as create_new_order. The store waits on SQLite locks, keep it off the event loop
+    key=get_order_key(header)
+    claimed , record=await asyncio.to_thread(idempotency_store.claim , key)
+    if not claimed :
+        if record['status'] == 'done' :
+            return read_order_record(record['result'])['document_no']
+        raise OrderInProgressError(key)
+
+    url=get_order_url(get_order_plan().config)
+    upstream=urlparse(url).netloc
+    breaker=get_breaker(upstream , 'Sales_Order_Excel' , get_current_tenant().name)
+    started=time.perf_counter()
+    status='error'
+    try :
+        breaker.before_call()
+        try :
+            response=await client.post(url , headers=headers , content=json.dumps(header))
+            status=str(response.status_code)
+        finally :
+            if status == 'error' or is_failure_status(int(status)) :
+                breaker.record_failure()
+            else :
+                breaker.record_success()
+        document_no=response.json()['No']
+    except Exception :
+        await asyncio.to_thread(idempotency_store.release , key)
+        raise
+    finally :
+        observe_upstream(upstream , 'Sales_Order_Excel' , 'POST' , status , time.perf_counter() - started)
+
+    await asyncio.to_thread(idempotency_store.complete , key , order_record(document_no))
+    return document_no
+
+
+async def map_items_async(client , entry , data , access_token , quantity) :
+    """
+    Map the items from the order entry to the sales order data, awaiting the order creation.
+
+    Produces the same sales order data as map_items.
+
+    Parameters:
+    - client (httpx.AsyncClient): HTTP client.
+    - entry (OrderEntry): Order entry.
+    - data (dict): Sales order data.
+    - access_token (str): Access token for authentication.
+    - quantity (int): Total quantity of items.
+
+    Returns:
+    - dict: Updated sales order data.
+    """
+    # Same order as map_items, the lines are mapped before the order is created
+    data['lines']['requests'].extend(map_lines(get_order_plan() , entry , quantity))
+    with stage_timer('create_new_order') :
+        document_no=await create_new_order_async(client , quantity , data['customer_number'] , access_token ,
+                                                 entry)
+    for line in data['lines']['requests'] :
+        line['body']['Document_No']=document_no
+    return data
@@ -0,0 +1,149 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor , wait , FIRST_COMPLETED
+from mapping_functions.circuit_breaker import CircuitOpenError
+from mapping_functions.idempotency import idempotency_store , OrderInProgressError
+from mapping_functions.mapping_pencils import map_items , create_order_data , build_order_header , get_order_key
+from mapping_functions.order_entry import parse_order_entry , OrderEntryError
+from mapping_functions.tenants import get_current_tenant , TenantBusyError
+
+
+class RateLimiter :
+    """
+    Token bucket limiting how many orders per second are sent to one tenant.
+    """
+
+    def __init__(self , rate , burst=None) :
+        """
+        Parameters:
+        - rate (float): Orders per second, 0 or less for no limit.
+        - burst (int): Orders that may be sent at once, defaults to the rate.
+        """
+        self.rate=rate
+        self.capacity=burst or max(1 , int(rate))
+        self.tokens=float(self.capacity)
+        self.updated_at=time.monotonic()
+        self._lock=threading.Lock()
+
+    def acquire(self) :
+        """
+        Block until an order may be sent.
+        """
+        if self.rate <= 0 :
+            return
+        while True :
+            with self._lock :
+                now=time.monotonic()
+                self.tokens=min(self.capacity , self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at=now
+                if self.tokens >= 1 :
+                    self.tokens-=1
+                    return
+                wait_time=(1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+_rate_limiters={ }
+_rate_limiters_lock=threading.Lock()
+
+
+def get_rate_limiter(tenant_name) :
+    """
+    Return the rate limiter of a tenant, shared by all bulk requests of this worker.
+
+    Parameters:
+    - tenant_name (str): Name of the tenant, companies sharing an Azure AD tenant have their own limiter.
+
+    Returns:
+    - RateLimiter: The tenant's rate limiter.
+    """
+    with _rate_limiters_lock :
+        if tenant_name not in _rate_limiters :
+            _rate_limiters[tenant_name]=RateLimiter(float(os.getenv('BULK_RATE_LIMIT' , 10)))
+        return _rate_limiters[tenant_name]
+
+
+def process_order(index , order , access_token , rate_limiter) :
+    """
+    Map and submit one order of a bulk request, skipping orders that were already submitted.
+
+    The order is submitted once per order key like a single /newOrders call, so a bulk
+    replay of an order created by /newOrders, or the reverse, returns its document number.
+    It holds one of the tenant's request slots while it is submitted.
+
+    Parameters:
+    - index (int): Position of the order in the bulk request.
+    - order (dict): Order with 'entry', 'customer_no' and optionally 'ac'.
+    - access_token (str): Access token used when the order has none.
+    - rate_limiter (RateLimiter): Rate limiter of the tenant.
+
+    Returns:
+    - dict: Per-order result.
+    """
+    result={ 'index' : index }
+    try :
+        result['entry_id']=order['entry']['id']
+        entry=parse_order_entry(order['entry'])
+        order_data , quantity=create_order_data(entry , order.get('customer_no'))
+
+        # A submitted order is replayed by map_items without calling Business Central, it costs no rate
+        key=get_order_key(build_order_header(quantity , order.get('customer_no') , entry))
+        replayed=idempotency_store.lookup(key) is not None
+        if not replayed :
+            rate_limiter.acquire()
+        with get_current_tenant().slot() :
+            mapped_items=map_items(entry , order_data , order.get('ac' , access_token) , quantity)
+        return { **result , 'status' : 'replayed' if replayed else 'created' , 'result' : mapped_items }
+
+    except OrderEntryError as e :
+        return { **result , 'status' : 'invalid' , 'error' : str(e) , 'field' : e.field }
+
+    except OrderInProgressError :
+        return { **result , 'status' : 'in_progress' }
+
+    except TenantBusyError as e :
+        return { **result , 'status' : 'busy' , 'error' : str(e) , 'retry_after' : e.retry_after }
+
+    except CircuitOpenError as e :
+        return { **result , 'status' : 'unavailable' , 'error' : str(e) , 'retry_after' : e.retry_after }
+
+    except Exception as e :
+        return { **result , 'status' : 'error' , 'error' : str(e) }
+
+
+def process_bulk(orders , access_token , concurrency=None) :
+    """
+    Submit orders of the current tenant with bounded concurrency, yielding each result as soon as it completes.
+
+    Orders are read lazily, so at most 'concurrency' orders are in flight at a time, and
+    never more than the tenant's max_concurrency.
+
+    Parameters:
+    - orders (Iterable[dict]): Orders with 'entry', 'customer_no' and optionally 'ac'.
+    - access_token (str): Access token used for orders without one.
+    - concurrency (int): Orders submitted in parallel, defaults to BULK_CONCURRENCY.
+
+    Returns:
+    - Iterator[dict]: Per-order results in completion order.
+    """
+    tenant=get_current_tenant()
+    concurrency=min(concurrency or int(os.getenv('BULK_CONCURRENCY' , 8)) , tenant.max_concurrency)
+    rate_limiter=get_rate_limiter(tenant.name)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor :
+        in_flight=set()
+        for index , order in enumerate(orders) :
+            if len(in_flight) >= concurrency :
+                done , in_flight=wait(in_flight , return_when=FIRST_COMPLETED)
+                for future in done :
+                    yield future.result()
+            # The pool's threads serve the orders for the tenant of the bulk request
+            in_flight.add(executor.submit(contextvars.copy_context().run , process_order , index , order ,
+                                          access_token , rate_limiter))
+
+        while in_flight :
+            done , in_flight=wait(in_flight , return_when=FIRST_COMPLETED)
+            for future in done :
+                yield future.result()
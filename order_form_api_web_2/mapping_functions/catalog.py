@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import os
+from Product_Catalog.templates import templates , country_dict
+from mapping_functions.json_fast import dumps
+from mapping_functions.product_catalog import HIERARCHY_TABLES , VARIANT_TABLES , get_catalog , add_swap_listener
+
+try :
+    import brotli
+except ImportError :  # brotli is optional, gzip is always available
+    brotli=None
+
+
+def build_catalog(product_catalog) :
+    """
+    Collect the static catalog tables served to the form frontend.
+
+    Parameters:
+    - product_catalog (ProductCatalog): Product catalog to serve.
+
+    Returns:
+    - dict: Templates, countries, product hierarchy and variant tables.
+    """
+    return {
+        'templates' : templates ,
+        'countries' : country_dict ,
+        'product_hierarchy' : { name : product_catalog.tables[name] for name in HIERARCHY_TABLES } ,
+        'variants' : { name : product_catalog.tables[name] for name in VARIANT_TABLES }
+    }
+
+
+class CatalogBundle :
+    """
+    The serialized catalog with its content hash and precompressed encodings.
+    """
+
+    def __init__(self , catalog) :
+        """
+        Parameters:
+        - catalog (dict): Catalog tables from build_catalog().
+        """
+        self.body=dumps(catalog)
+        self.version=hashlib.sha256(self.body).hexdigest()[:16]
+        self.encodings={ 'identity' : self.body , 'gzip' : gzip.compress(self.body , compresslevel=9) }
+        if brotli is not None :
+            self.encodings['br']=brotli.compress(self.body , quality=11)
+
+    def etag(self , encoding) :
+        """
+        Entity tag of one encoding of the catalog.
+
+        Parameters:
+        - encoding (str): Content encoding.
+
+        Returns:
+        - str: Quoted entity tag.
+        """
+        return f'"{self.version}"' if encoding == 'identity' else f'"{self.version}-{encoding}"'
+
+    def matching_etag(self , if_none_match , accept_encoding=None) :
+        """
+        Check an If-None-Match header against the current catalog version.
+
+        Parameters:
+        - if_none_match (str): Header value.
+        - accept_encoding (str): Accept-Encoding header value, picks the entity tag a '*' is answered with.
+
+        Returns:
+        - str: The entity tag that matched, for the 304 response. None if the client doesn't have this version.
+        """
+        if not if_none_match :
+            return None
+        if if_none_match.strip() == '*' :
+            return self.etag(self.choose_encoding(accept_encoding))
+        for tag in if_none_match.split(',') :
+            tag=tag.strip().removeprefix('W/').strip('"')
+            # The client has this version in any encoding, its cache is keyed by the tag it holds
+            if tag.split('-' , 1)[0] == self.version :
+                return f'"{tag}"'
+        return None
+
+    def choose_encoding(self , accept_encoding) :
+        """
+        Pick the smallest encoding the client accepts.
+
+        Parameters:
+        - accept_encoding (str): Accept-Encoding header value.
+
+        Returns:
+        - str: 'br', 'gzip' or 'identity'.
+        """
+        accepted=set()
+        for part in (accept_encoding or '').split(',') :
+            name , _ , params=part.strip().partition(';')
+            if params.strip().replace(' ' , '') in ('q=0' , 'q=0.0' , 'q=0.00' , 'q=0.000') :
+                continue
+            accepted.add(name.strip().lower())
+
+        for encoding in ('br' , 'gzip') :
+            if encoding in self.encodings and (encoding in accepted or '*' in accepted) :
+                return encoding
+        return 'identity'
+
+
+_bundle=CatalogBundle(build_catalog(get_catalog()))
+
+
+def get_catalog_bundle() :
+    """
+    Return the catalog bundle built at startup.
+
+    Returns:
+    - CatalogBundle: Current catalog bundle.
+    """
+    return _bundle
+
+
+def rebuild_catalog_bundle(product_catalog) :
+    """
+    Serialize and compress the catalog tables again after the product catalog was swapped.
+
+    Parameters:
+    - product_catalog (ProductCatalog): The new product catalog.
+
+    Returns:
+    - CatalogBundle: The new catalog bundle.
+    """
+    global _bundle
+    _bundle=CatalogBundle(build_catalog(product_catalog))
+    return _bundle
+
+
+add_swap_listener(rebuild_catalog_bundle)
+
+
+def get_cache_control() :
+    """
+    Cache-Control header of catalog responses.
+
+    Returns:
+    - str: Header value.
+    """
+    return f"public, max-age={int(os.getenv('CATALOG_MAX_AGE' , 300))}, must-revalidate"
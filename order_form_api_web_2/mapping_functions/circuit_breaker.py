@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+
+CLOSED='closed'
+OPEN='open'
+HALF_OPEN='half_open'
+
+
+class CircuitOpenError(Exception) :
+    """
+    Raised instead of calling an upstream endpoint whose circuit is open.
+    """
+
+    def __init__(self , name , retry_after) :
+        super().__init__(f"{name} is unavailable, retry in {retry_after} seconds")
+        self.name=name
+        self.retry_after=retry_after
+
+
+def get_breaker_config() :
+    """
+    Retrieve circuit breaker configuration variables.
+
+    Returns:
+    - dict: Dictionary containing the circuit breaker configuration.
+    """
+    return {
+        "failure_threshold" : int(os.getenv('CIRCUIT_FAILURE_THRESHOLD' , 5)) ,
+        "recovery_timeout" : float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT' , 30)) ,
+        "half_open_calls" : int(os.getenv('CIRCUIT_HALF_OPEN_CALLS' , 1))
+    }
+
+
+class CircuitBreaker :
+    """
+    Circuit breaker for one upstream endpoint.
+
+    Closed: calls pass, consecutive failures are counted. After 'failure_threshold'
+    failures the circuit opens and calls fail at once for 'recovery_timeout' seconds.
+    Half-open: up to 'half_open_calls' trial calls pass. A success closes the circuit,
+    a failure opens it again.
+    """
+
+    def __init__(self , name , failure_threshold=5 , recovery_timeout=30 , half_open_calls=1) :
+        """
+        Parameters:
+        - name (str): Endpoint name used in errors.
+        - failure_threshold (int): Consecutive failures that open the circuit.
+        - recovery_timeout (float): Seconds the circuit stays open before trial calls are let through.
+        - half_open_calls (int): Concurrent trial calls while half-open.
+        """
+        self.name=name
+        self.failure_threshold=failure_threshold
+        self.recovery_timeout=recovery_timeout
+        self.half_open_calls=half_open_calls
+        self.state=CLOSED
+        self.failures=0
+        self.opened_at=0
+        self.trials=0
+        self._lock=threading.Lock()
+
+    def before_call(self) :
+        """
+        Let a call through or reject it.
+
+        Raises:
+        - CircuitOpenError: If the circuit is open or all trial calls are taken.
+        """
+        with self._lock :
+            if self.state == OPEN :
+                remaining=self.opened_at + self.recovery_timeout - time.time()
+                if remaining > 0 :
+                    raise CircuitOpenError(self.name , max(1 , round(remaining)))
+                self.state=HALF_OPEN
+                self.trials=0
+            if self.state == HALF_OPEN :
+                if self.trials >= self.half_open_calls :
+                    raise CircuitOpenError(self.name , max(1 , round(self.recovery_timeout)))
+                self.trials+=1
+
+    def record_success(self) :
+        with self._lock :
+            self.state=CLOSED
+            self.failures=0
+
+    def record_failure(self) :
+        with self._lock :
+            self.failures+=1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold :
+                self.state=OPEN
+                self.opened_at=time.time()
+                self.failures=0
+
+    def get_status(self) :
+        """
+        Return the state of the circuit.
+
+        Returns:
+        - dict: State and consecutive failures.
+        """
+        with self._lock :
+            return { 'state' : self.state , 'failures' : self.failures }
+
+
+def is_failure_status(status_code) :
+    """
+    Check whether a response status means the upstream is struggling.
+
+    Parameters:
+    - status_code (int): HTTP status code.
+
+    Returns:
+    - bool: True for 429 and 5xx.
+    """
+    return status_code == 429 or status_code >= 500
+
+
+_breakers={ }
+_breakers_lock=threading.Lock()
+
+
+def get_breaker(upstream , endpoint , tenant=None) :
+    """
+    Return the circuit breaker of an upstream endpoint, creating it on first use.
+
+    Tenants on the same Business Central host have separate breakers, one company
+    failing doesn't cut off the others.
+
+    Parameters:
+    - upstream (str): Host of the upstream.
+    - endpoint (str): Last path segment of the URL, e.g. Sales_Order_Excel.
+    - tenant (str): Name of the tenant calling the endpoint.
+
+    Returns:
+    - CircuitBreaker: The endpoint's breaker.
+    """
+    key=(upstream , endpoint , tenant)
+    breaker=_breakers.get(key)
+    if breaker is None :
+        with _breakers_lock :
+            breaker=_breakers.get(key)
+            if breaker is None :
+                name=f"{tenant}:{upstream}/{endpoint}" if tenant else f"{upstream}/{endpoint}"
+                breaker=_breakers[key]=CircuitBreaker(name , **get_breaker_config())
+    return breaker
+
+
+def get_breaker_states() :
+    """
+    Return the state of every circuit of this worker.
+
+    Returns:
+    - dict: Status by endpoint name.
+    """
+    with _breakers_lock :
+        breakers=list(_breakers.values())
+    return { breaker.name : breaker.get_status() for breaker in breakers }
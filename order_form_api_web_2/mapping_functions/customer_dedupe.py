@@ -0,0 +1,322 @@
+import argparse
+import json
+import time
+import pandas as pd
+from mapping_functions.customer_mapping import iter_customers_from_bc
+from mapping_functions.fuzzy_matching import COMPANY_SUFFIXES , COUNTRY_CODES , TRANSLITERATION
+
+# Customer fields loaded for the report
+CUSTOMER_FIELDS=('No' , 'Name' , 'VAT_Registration_No' , 'Phone_No' , 'E_Mail' , 'Blocked')
+
+# Mail domains shared by unrelated customers, they never block or match
+FREE_MAIL_DOMAINS=frozenset([
+    'gmail.com' , 'googlemail.com' , 'hotmail.com' , 'hotmail.dk' , 'outlook.com' , 'outlook.dk' , 'live.com' ,
+    'live.dk' , 'msn.com' , 'yahoo.com' , 'yahoo.dk' , 'icloud.com' , 'me.com' , 'aol.com' , 'gmx.de' , 'gmx.net' ,
+    'web.de' , 'mail.dk' , 'jubii.dk' , 'protonmail.com' , 'proton.me'
+])
+
+# Weight of every agreeing key in the score of a candidate pair, the name weighs by token overlap
+MATCH_WEIGHTS={ 'vat' : 1.0 , 'phone' : 0.6 , 'name' : 0.6 , 'domain' : 0.4 }
+
+# Columns blocked on: customers only become a candidate pair when they share one of these keys
+BLOCKING_KEYS=('vat' , 'phone' , 'domain' , 'name' , 'name_token')
+
+# Combining marks left by NFKD
+combining_pattern=r'[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]'
+suffix_pattern=r'(?<!\S)(?:' + '|'.join(sorted(COMPANY_SUFFIXES , key=len , reverse=True)) + r')(?!\S)'
+
+
+def load_customers(path=None , access_token=None , include_blocked=False) :
+    """
+    Load the customers to deduplicate from a file or from Business Central.
+
+    Customers from Business Central are streamed into columns, so no list of dicts of
+    the whole base is built.
+
+    Parameters:
+    - path (str): CSV or JSON file, JSON either a list of customers or an OData page. Business Central if omitted.
+    - access_token (str): Access token for authentication, required without a path.
+    - include_blocked (bool): Also load blocked customers.
+
+    Returns:
+    - pandas.DataFrame: One row per customer with the columns of CUSTOMER_FIELDS as strings.
+    """
+    if path is None :
+        columns={ field : [] for field in CUSTOMER_FIELDS }
+        for customer in iter_customers_from_bc(access_token , include_blocked=include_blocked) :
+            for field , values in columns.items() :
+                values.append(customer.get(field) or '')
+        return pd.DataFrame(columns)
+
+    if path.endswith('.json') :
+        with open(path , 'r') as file :
+            document=json.load(file)
+        frame=pd.DataFrame(document['value'] if isinstance(document , dict) else document)
+    else :
+        frame=pd.read_csv(path , dtype=str , keep_default_na=False)
+
+    for field in CUSTOMER_FIELDS :
+        frame[field]=frame[field].fillna('').astype(str) if field in frame else ''
+    if not include_blocked :
+        frame=frame[frame['Blocked'] != "All"]
+    return frame[list(CUSTOMER_FIELDS)].reset_index(drop=True)
+
+
+def normalize_phones(phones) :
+    """
+    Vectorized normalize_phone of fuzzy_matching.
+
+    Parameters:
+    - phones (pandas.Series): Phone numbers.
+
+    Returns:
+    - pandas.Series: National significant numbers, empty if too short to identify a customer.
+    """
+    stripped=phones.str.strip()
+    digits=stripped.str.replace(r'\D' , '' , regex=True)
+    international=stripped.str.startswith('+') | digits.str.startswith('00')
+    digits=digits.where(~international , digits.str.lstrip('0'))
+    pending=international.copy()
+    for length in (3 , 2 , 1) :
+        prefixed=pending & digits.str[:length].isin(COUNTRY_CODES)
+        digits=digits.where(~prefixed , digits.str[length :])
+        pending&=~prefixed
+    # Trunk prefix of national numbers, e.g. 030 in Germany
+    digits=digits.str.lstrip('0')
+    return digits.where(digits.str.len() >= 6 , '')
+
+
+def normalize_company_names(names) :
+    """
+    Vectorized normalize_company_name of fuzzy_matching.
+
+    Parameters:
+    - names (pandas.Series): Company names.
+
+    Returns:
+    - pandas.Series: Normalized names, tokens separated by single spaces.
+    """
+    names=names.str.lower().str.translate(TRANSLITERATION).str.normalize('NFKD')
+    names=names.str.replace(combining_pattern , '' , regex=True).str.replace(r"[/.']" , '' , regex=True)
+    names=names.str.replace('&' , ' and ' , regex=False).str.replace(r'[^a-z0-9]+' , ' ' , regex=True).str.strip()
+    significant=names.str.replace(suffix_pattern , '' , regex=True).str.replace(r' +' , ' ' , regex=True).str.strip()
+    # A name made only of suffixes is kept as it is
+    return significant.where(significant != '' , names)
+
+
+def normalize_customers(customers) :
+    """
+    Compute the match keys of every customer with vectorized string operations.
+
+    Parameters:
+    - customers (pandas.DataFrame): Customers as returned by load_customers.
+
+    Returns:
+    - pandas.DataFrame: vat, phone, domain, name and name_token columns, empty where a customer has no key.
+    """
+    vat=customers['VAT_Registration_No'].str.replace(r'\D' , '' , regex=True)
+    email=customers['E_Mail'].str.strip().str.lower()
+    domain=email.str.rpartition('@')[2].where(email.str.contains('@' , regex=False) , '')
+    name=normalize_company_names(customers['Name'])
+    return pd.DataFrame({
+        # Fewer digits than a VAT number has are placeholders like "0"
+        'vat' : vat.where(vat.str.len() >= 5 , '') ,
+        'phone' : normalize_phones(customers['Phone_No']) ,
+        'domain' : domain.where(~domain.isin(FREE_MAIL_DOMAINS) , '') ,
+        'name' : name ,
+        'name_token' : name.str.partition(' ')[0]
+    } , index=customers.index)
+
+
+def candidate_pairs(keys , max_block_size=100) :
+    """
+    Pair up the customers that share a blocking key.
+
+    Blocks larger than 'max_block_size' are skipped: a key shared by that many
+    customers, e.g. a common first word, doesn't tell duplicates apart and would
+    produce quadratically many pairs.
+
+    Parameters:
+    - keys (pandas.DataFrame): Match keys as returned by normalize_customers.
+    - max_block_size (int): Largest block paired up.
+
+    Returns:
+    - pandas.DataFrame: Unique (left, right) position pairs with left < right.
+    """
+    pairs=[]
+    for key in BLOCKING_KEYS :
+        blocked=pd.DataFrame({ 'key' : keys[key].to_numpy() , 'position' : range(len(keys)) })
+        blocked=blocked[blocked['key'] != '']
+        sizes=blocked.groupby('key')['key'].transform('size')
+        blocked=blocked[(sizes >= 2) & (sizes <= max_block_size)]
+        merged=blocked.merge(blocked , on='key' , suffixes=('_left' , '_right'))
+        merged=merged[merged['position_left'] < merged['position_right']]
+        pairs.append(pd.DataFrame({ 'left' : merged['position_left'].to_numpy() ,
+                                    'right' : merged['position_right'].to_numpy() }))
+    return pd.concat(pairs , ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def name_similarity(names , pairs) :
+    """
+    Token Jaccard similarity of the names of every pair, computed with joins instead of a loop over the pairs.
+
+    Parameters:
+    - names (pandas.Series): Normalized names.
+    - pairs (pandas.DataFrame): (left, right) position pairs.
+
+    Returns:
+    - numpy.ndarray: Similarity between 0 and 1 per pair.
+    """
+    tokens=names.reset_index(drop=True).str.split().explode().dropna()
+    tokens=pd.DataFrame({ 'position' : tokens.index , 'token' : tokens.to_numpy() }).drop_duplicates()
+    token_counts=tokens.groupby('position').size().reindex(range(len(names)) , fill_value=0).to_numpy()
+
+    left_tokens=pd.DataFrame({ 'pair' : range(len(pairs)) , 'position' : pairs['left'].to_numpy() }) \
+        .merge(tokens , on='position')[['pair' , 'token']]
+    right_tokens=pd.DataFrame({ 'pair' : range(len(pairs)) , 'position' : pairs['right'].to_numpy() }) \
+        .merge(tokens , on='position')[['pair' , 'token']]
+    shared=left_tokens.merge(right_tokens , on=['pair' , 'token']).groupby('pair').size() \
+        .reindex(range(len(pairs)) , fill_value=0).to_numpy()
+
+    union=token_counts[pairs['left'].to_numpy()] + token_counts[pairs['right'].to_numpy()] - shared
+    return shared / union.clip(min=1)
+
+
+def score_pairs(keys , pairs) :
+    """
+    Score every candidate pair by the keys its customers agree on, see MATCH_WEIGHTS.
+
+    Parameters:
+    - keys (pandas.DataFrame): Match keys as returned by normalize_customers.
+    - pairs (pandas.DataFrame): (left, right) position pairs.
+
+    Returns:
+    - pandas.DataFrame: The pairs with a column per key and the total 'score', capped at 1.
+    """
+    left=pairs['left'].to_numpy()
+    right=pairs['right'].to_numpy()
+    scored=pairs.copy()
+    for key in ('vat' , 'phone' , 'domain') :
+        values=keys[key].to_numpy()
+        scored[key]=(values[left] == values[right]) & (values[left] != '')
+    scored['name']=name_similarity(keys['name'] , pairs)
+    scored['score']=sum(scored[key] * weight for key , weight in MATCH_WEIGHTS.items()).clip(upper=1.0)
+    return scored
+
+
+def cluster_pairs(count , pairs) :
+    """
+    Group matching pairs into clusters with union-find.
+
+    Parameters:
+    - count (int): Number of customers.
+    - pairs (pandas.DataFrame): Matching (left, right) position pairs.
+
+    Returns:
+    - List[int]: Cluster root per customer position, a customer without matches is its own root.
+    """
+    parent=list(range(count))
+
+    def find(position) :
+        while parent[position] != position :
+            # Path halving keeps the trees flat
+            parent[position]=parent[parent[position]]
+            position=parent[position]
+        return position
+
+    for left , right in zip(pairs['left'].tolist() , pairs['right'].tolist()) :
+        left_root , right_root=find(left) , find(right)
+        if left_root != right_root :
+            parent[max(left_root , right_root)]=min(left_root , right_root)
+    return [find(position) for position in range(count)]
+
+
+def find_duplicates(customers , threshold=0.6 , max_block_size=100) :
+    """
+    Find clusters of duplicate customers in a whole customer base.
+
+    Parameters:
+    - customers (pandas.DataFrame): Customers as returned by load_customers.
+    - threshold (float): Minimum pair score for two customers to be duplicates.
+    - max_block_size (int): Largest block paired up, see candidate_pairs.
+
+    Returns:
+    - tuple: DataFrame of the customers in clusters, with 'cluster', 'cluster_size' and 'score'
+      columns, largest cluster first, and a dict of counts.
+    """
+    customers=customers.reset_index(drop=True)
+    keys=normalize_customers(customers)
+    pairs=candidate_pairs(keys , max_block_size)
+    scored=score_pairs(keys , pairs)
+    matches=scored[scored['score'] >= threshold]
+
+    duplicates=customers.assign(cluster=cluster_pairs(len(customers) , matches))
+    # Best score of each customer in its cluster
+    best=pd.concat([matches[['left' , 'score']].rename(columns={ 'left' : 'position' }) ,
+                    matches[['right' , 'score']].rename(columns={ 'right' : 'position' })]) \
+        .groupby('position')['score'].max()
+    duplicates['score']=best.reindex(range(len(customers))).round(3).to_numpy()
+    duplicates['cluster_size']=duplicates.groupby('cluster')['cluster'].transform('size')
+    duplicates=duplicates[duplicates['cluster_size'] > 1]
+    duplicates=duplicates.sort_values(['cluster_size' , 'cluster' , 'No'] , ascending=[False , True , True])
+    # Number the clusters from 1 in report order
+    duplicates['cluster']=pd.factorize(duplicates['cluster'])[0] + 1
+
+    summary={
+        'customers' : len(customers) , 'candidate_pairs' : len(pairs) , 'matching_pairs' : len(matches) ,
+        'clusters' : int(duplicates['cluster'].max()) if len(duplicates) else 0 ,
+        'duplicate_customers' : len(duplicates)
+    }
+    return duplicates[['cluster' , 'cluster_size' , 'score' , *CUSTOMER_FIELDS]].reset_index(drop=True) , summary
+
+
+def write_duplicates(duplicates , path) :
+    """
+    Write the duplicate clusters as CSV, or as JSON when the path ends in .json.
+
+    Parameters:
+    - duplicates (pandas.DataFrame): Customers in clusters as returned by find_duplicates.
+    - path (str): Output file.
+    """
+    if not path.endswith('.json') :
+        duplicates.to_csv(path , index=False)
+        return
+
+    clusters=[{
+        'cluster' : int(cluster) , 'size' : len(members) ,
+        'customers' : members.drop(columns=['cluster' , 'cluster_size']).to_dict('records')
+    } for cluster , members in duplicates.groupby('cluster' , sort=False)]
+    with open(path , 'w') as file :
+        json.dump(clusters , file , indent=2 , ensure_ascii=False)
+
+
+if __name__ == '__main__' :
+    # Report of duplicate customers across the whole customer base:
+    #   python -m mapping_functions.customer_dedupe --output duplicates.csv
+    #   python -m mapping_functions.customer_dedupe --input customers.json --output duplicates.json
+    from mapping_functions.tenants import get_tenant , use_tenant
+    from mapping_functions.validation import get_access_token
+
+    parser=argparse.ArgumentParser(description="Find duplicate customers in Business Central")
+    parser.add_argument('--input' , help="CSV or JSON file of customers, Business Central if omitted")
+    parser.add_argument('--output' , default='duplicate_customers.csv' , help="CSV file, or JSON if it ends in .json")
+    parser.add_argument('--tenant' , help="Tenant whose customers are loaded, the default tenant if omitted")
+    parser.add_argument('--threshold' , type=float , default=0.6 , help="Minimum score of a duplicate pair")
+    parser.add_argument('--max-block-size' , type=int , default=100)
+    parser.add_argument('--include-blocked' , action='store_true')
+    args=parser.parse_args()
+
+    started=time.perf_counter()
+    if args.input :
+        customers=load_customers(args.input , include_blocked=args.include_blocked)
+    else :
+        tenant=get_tenant(args.tenant)
+        with use_tenant(tenant) :
+            customers=load_customers(access_token=get_access_token(tenant.bc_id) ,
+                                     include_blocked=args.include_blocked)
+    loaded_s=time.perf_counter() - started
+
+    duplicates , summary=find_duplicates(customers , args.threshold , args.max_block_size)
+    write_duplicates(duplicates , args.output)
+    print('Deduplication finished:' , { **summary , 'load_s' : round(loaded_s , 1) ,
+                                        'total_s' : round(time.perf_counter() - started , 1) })
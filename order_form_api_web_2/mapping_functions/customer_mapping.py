@@ -1,45 +1,310 @@
 import json
 import os
-import requests
+from mapping_functions import http_client
+from mapping_functions.odata_stream import iter_odata_pages
+from mapping_functions.single_flight import SingleFlight
+from mapping_functions.tenants import get_current_tenant
 from mapping_functions.validation import get_access_token
 import re
+import threading
+from array import array
 
+# Pre-compile the regex pattern to remove non-digits
+non_digit_pattern=re.compile(r'\D')
 
-def get_customers_from_bc(access_token) :
+# Identical customer fetches running at the same time share one call to Business Central
+customer_fetches=SingleFlight()
+
+
+def get_customers_from_bc(access_token , modified_since=None , include_blocked=False) :
     """
     Retrieve customers from Business Central who are not blocked.
 
+    Follows '@odata.nextLink' so tenants larger than one OData page are returned in full.
+
+    Parameters:
+    - access_token (str): Access token for authentication.
+    - modified_since (str): Only return customers modified at or after this timestamp.
+    - include_blocked (bool): Also return blocked customers.
+
+    Returns:
+    - List[dict]: A list of dictionaries containing customer information, shared with concurrent callers.
+    """
+    return customer_fetches.do((get_current_tenant().name , access_token , modified_since , include_blocked) ,
+                               lambda : fetch_customers_from_bc(access_token , modified_since , include_blocked))
+
+
+def fetch_customers_from_bc(access_token , modified_since=None , include_blocked=False) :
+    """
+    Retrieve customers from Business Central, see get_customers_from_bc.
+
     Parameters:
     - access_token (str): Access token for authentication.
+    - modified_since (str): Only return customers modified at or after this timestamp.
+    - include_blocked (bool): Also return blocked customers.
 
     Returns:
     - List[dict]: A list of dictionaries containing customer information.
     """
-    base_url=os.getenv("BASEURL")
-    tenant_id=os.getenv("TENANTID")
-    environment=os.getenv('PRODENVIRNMENT')
-    company=os.getenv('COMPANYEU')
-    endpoint=os.getenv('CUSTOMERENDPOINT')
-    url=f"{base_url}/{tenant_id}/{environment}/ODataV4/{company}/{endpoint}?$select=Blocked,No,VAT_Registration_No,Phone_No,Name,E_Mail"
+    return list(iter_customers_from_bc(access_token , modified_since , include_blocked))
+
+
+def iter_customers_from_bc(access_token , modified_since=None , include_blocked=False) :
+    """
+    Stream customers from Business Central page by page.
+
+    Pages are requested with at most CUSTOMER_PAGE_SIZE customers and parsed while
+    they download, blocked customers are dropped on the way. Memory stays flat in the
+    number of customers unless the caller keeps them.
+
+    Parameters:
+    - access_token (str): Access token for authentication.
+    - modified_since (str): Only return customers modified at or after this timestamp.
+    - include_blocked (bool): Also return blocked customers.
+
+    Returns:
+    - Iterator[dict]: Customers in Business Central order.
+    """
+    tenant=get_current_tenant()
+    base_url=tenant.base_url
+    tenant_id=tenant.tenant_id
+    environment=tenant.customers_environment
+    company=tenant.company
+    endpoint=tenant.customer_endpoint
+    modified_field=get_modified_field()
+    fields="Blocked,No,VAT_Registration_No,Phone_No,Name,E_Mail" + (f",{modified_field}" if modified_field else "")
+    url=f"{base_url}/{tenant_id}/{environment}/ODataV4/{company}/{endpoint}?$select={fields}"
+    if modified_since is not None :
+        url+=f"&$filter={modified_field} ge {modified_since}"
 
     headers={
         "Content-Type" : "application/json" ,
-        "Authorization" : f"Bearer {access_token}"
+        "Authorization" : f"Bearer {access_token}" ,
+        "Prefer" : f"odata.maxpagesize={int(os.getenv('CUSTOMER_PAGE_SIZE' , 5000))}"
     }
 
-    response=requests.get(url , headers=headers)
-    customers=response.json().get('value' , [])
+    customers=iter_odata_pages(lambda page_url : http_client.get(page_url , headers=headers , stream=True) , url)
+    if include_blocked :
+        return customers
 
     # Filter out blocked customers
-    active_customers=[customer for customer in customers if customer['Blocked'] != "All"]
+    return (customer for customer in customers if customer['Blocked'] != "All")
+
+
+def get_modified_field() :
+    """
+    Name of the customer field used for delta syncs, empty when delta sync is disabled.
+
+    Returns:
+    - str: OData field name.
+    """
+    return os.getenv('CUSTOMERMODIFIEDFIELD' , 'SystemModifiedAt')
+
+
+class CustomerIndex :
+    """
+    Hash indexes over a customer list for matching new entries against it.
+
+    Customers are indexed by normalized VAT digits, email domain (gmail excluded),
+    phone number and upper-cased name, so a lookup costs a few dict probes instead
+    of a regex pass over every customer.
+    """
+
+    def __init__(self , customers=()) :
+        self.customers=[]
+        self._keys=[]
+        self._by_vat={ }
+        self._by_domain={ }
+        self._by_phone={ }
+        self._by_name={ }
+        # Reentrant, so refresh_and_match holds it across both steps
+        self._lock=threading.RLock()
+        self.refresh(customers)
+
+    @staticmethod
+    def customer_keys(customer) :
+        """
+        Compute the index keys of a customer.
+
+        Parameters:
+        - customer (dict): Customer as returned by Business Central.
 
-    return active_customers
+        Returns:
+        - tuple: VAT digits, email domain, phone and name keys. A key is None when the customer can't match on it.
+        """
+        vat=non_digit_pattern.sub('' , customer['VAT_Registration_No'])
+        email=customer['E_Mail']
+        return (
+            vat if vat != "" else None ,
+            email.split('@' , 1)[-1].upper() if 'gmail.com' not in email.lower() else None ,
+            customer['Phone_No'] ,
+            customer['Name'].upper()
+        )
+
+    def refresh(self , customers) :
+        """
+        Bring the index in line with a new customer list.
+
+        Only positions whose customer changed are re-indexed.
+
+        Parameters:
+        - customers (List[dict]): The current list of customers.
+        """
+        customers=list(customers)
+        with self._lock :
+            old=self.customers
+            changed=len(customers) != len(old)
+            for position , customer in enumerate(customers) :
+                if position < len(old) :
+                    if old[position] == customer :
+                        continue
+                    self._remove(position)
+                    self._keys[position]=self._add(position , customer)
+                else :
+                    self._keys.append(self._add(position , customer))
+                changed=True
+
+            for position in range(len(customers) , len(old)) :
+                self._remove(position)
+            del self._keys[len(customers):]
+            # An unchanged list keeps its identity, so indexes derived from it stay valid
+            if changed :
+                self.customers=customers
+
+    def match(self , vat_no , email , phone , name) :
+        """
+        Find customers matching on VAT number, email domain, phone, or name.
+
+        Parameters:
+        - vat_no (str): VAT registration number.
+        - email (str): Email address.
+        - phone (str): Phone number.
+        - name (str): Customer name.
+
+        Returns:
+        - List[dict]: A list of dictionaries with customer IDs and names of matching customers, in customer list order.
+        """
+        vat=non_digit_pattern.sub('' , vat_no)
+        domain=email.split('@' , 1)[-1].upper()
+
+        with self._lock :
+            positions=set()
+            if vat != "" :
+                positions.update(self._by_vat.get(vat , ()))
+            positions.update(self._by_domain.get(domain , ()))
+            if phone != "" :
+                positions.update(self._by_phone.get(phone , ()))
+            if name != "" :
+                positions.update(self._by_name.get(name.upper() , ()))
+            return self._customers_at(positions)
+
+    def match_identity(self , vat_no , phone) :
+        """
+        Find customers matching on VAT number or phone only, the fields that identify a customer.
+
+        Unlike match, a shared email domain or name is not counted, so a single result
+        is safe to assign an order to without review.
+
+        Parameters:
+        - vat_no (str): VAT registration number.
+        - phone (str): Phone number.
+
+        Returns:
+        - List[dict]: Matching customers, see match.
+        """
+        vat=non_digit_pattern.sub('' , vat_no)
+
+        with self._lock :
+            positions=set()
+            if vat != "" :
+                positions.update(self._by_vat.get(vat , ()))
+            if phone != "" :
+                positions.update(self._by_phone.get(phone , ()))
+            return self._customers_at(positions)
+
+    def refresh_and_match(self , customers , vat_no , email , phone , name) :
+        """
+        Refresh the index with a customer list and match an entry against it in one step.
+
+        The lock is held across both steps, so a concurrent refresh with another
+        caller's customers can't slip in between and answer with their customers.
+
+        Parameters:
+        - customers (List[dict]): The current list of customers.
+        - vat_no (str): VAT registration number.
+        - email (str): Email address.
+        - phone (str): Phone number.
+        - name (str): Customer name.
+
+        Returns:
+        - List[dict]: Matching customers, see match.
+        """
+        with self._lock :
+            self.refresh(customers)
+            return self.match(vat_no , email , phone , name)
+
+    def compact(self) :
+        """
+        Store every position set as a packed array.
+
+        Called in a preloaded master before forking: the arrays hold no Python int
+        objects, so workers share their pages until a refresh touches a key, which
+        turns that key back into a set.
+        """
+        with self._lock :
+            for index in self._indexes() :
+                for key , positions in index.items() :
+                    index[key]=array('I' , sorted(positions))
+
+    def _customers_at(self , positions) :
+        matching_customers=[]
+        encountered_customer_ids=set()
+        for position in sorted(positions) :
+            customer=self.customers[position]
+            if customer['No'] not in encountered_customer_ids :
+                matching_customers.append(
+                    { 'title' : f"{customer['No']} - {customer['Name']}" , 'value' : customer['No'] })
+                encountered_customer_ids.add(customer['No'])
+        return matching_customers
+
+    def _indexes(self) :
+        return self._by_vat , self._by_domain , self._by_phone , self._by_name
+
+    @staticmethod
+    def _positions(index , key) :
+        positions=index.get(key)
+        if positions is None :
+            positions=index[key]=set()
+        elif not isinstance(positions , set) :
+            positions=index[key]=set(positions)
+        return positions
+
+    def _add(self , position , customer) :
+        keys=self.customer_keys(customer)
+        for index , key in zip(self._indexes() , keys) :
+            if key is not None :
+                self._positions(index , key).add(position)
+        return keys
+
+    def _remove(self , position) :
+        for index , key in zip(self._indexes() , self._keys[position]) :
+            if key is not None :
+                positions=self._positions(index , key)
+                positions.discard(position)
+                if not positions :
+                    del index[key]
+
+
+# Index shared by the requests served by this worker
+customer_index=CustomerIndex()
 
 
 def check_if_customer_exists(vat_no , email , phone , name , customers) :
     """
     Check if a customer exists based on VAT number, email, phone, or name.
 
+    The worker's customer index is refreshed with the given customers before matching.
+
     Parameters:
     - vat_no (str): VAT registration number.
     - email (str): Email address.
@@ -50,25 +315,4 @@ def check_if_customer_exists(vat_no , email , phone , name , customers) :
     Returns:
     - List[dict]: A list of dictionaries with customer IDs and names of matching customers.
     """
-    # Pre-compile the regex pattern to remove non-digits
-    pattern=re.compile(r'\D')
-
-    matching_customers=[]
-    encountered_customer_ids=set()
-
-    for customer in customers :
-        vat_match=pattern.sub('' , customer['VAT_Registration_No']) == pattern.sub('' , vat_no) and pattern.sub('' ,
-                                                                                                                customer[
-                                                                                                                    'VAT_Registration_No']) != ""
-        email_domain_match='gmail.com' not in customer['E_Mail'].lower() and customer['E_Mail'].split('@' , 1)[
-            -1].upper() == email.split('@' , 1)[-1].upper()
-        phone_match=customer['Phone_No'] == phone and phone != ""
-        name_match=customer['Name'].upper() == name.upper() and name != ""
-
-        if vat_match or email_domain_match or phone_match or name_match :
-            if customer['No'] not in encountered_customer_ids :
-                matching_customers.append(
-                    { 'title' : f"{customer['No']} - {customer['Name']}" , 'value' : customer['No'] })
-                encountered_customer_ids.add(customer['No'])
-
-    return matching_customers
+    return customer_index.refresh_and_match(customers , vat_no , email , phone , name)
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from mapping_functions.customer_mapping import CustomerIndex , get_customers_from_bc , get_modified_field , \
+    iter_customers_from_bc
+from mapping_functions.fuzzy_matching import FuzzyIndexCache
+from mapping_functions.instrumentation import logger
+from mapping_functions.tenants import get_current_tenant , get_tenant
+
+
+class CustomerSnapshot :
+    """
+    Worker-owned copy of the active Business Central customers.
+
+    The snapshot is loaded in full once and then kept current with delta syncs that
+    only fetch customers modified since the last sync. A full reload runs
+    periodically to drop customers deleted in Business Central.
+    """
+
+    def __init__(self , ttl=300 , full_reload_interval=86400) :
+        """
+        Parameters:
+        - ttl (int): Seconds a sync stays fresh before the next request triggers a delta sync.
+        - full_reload_interval (int): Seconds between full reloads.
+        """
+        self.ttl=ttl
+        self.full_reload_interval=full_reload_interval
+        self.customers={ }
+        self.index=CustomerIndex()
+        self.fuzzy_indexes=FuzzyIndexCache()
+        self.loaded=False
+        self.synced_at=0
+        self.full_loaded_at=0
+        self.watermark=None
+        self._lock=threading.Lock()
+
+    def get_index(self , access_token) :
+        """
+        Return the customer index, syncing the snapshot first when it is stale.
+
+        Parameters:
+        - access_token (str): Access token for authentication.
+
+        Returns:
+        - CustomerIndex: Index over the active customers.
+        """
+        if time.time() - self.synced_at >= self.ttl :
+            # While a sync runs other requests keep using the current snapshot
+            if self._lock.acquire(blocking=not self.loaded) :
+                try :
+                    if time.time() - self.synced_at >= self.ttl :
+                        self.sync(access_token)
+                finally :
+                    self._lock.release()
+        return self.index
+
+    def get_fuzzy_index(self , access_token) :
+        """
+        Return the fuzzy index over the active customers, built on first use after every change.
+
+        Parameters:
+        - access_token (str): Access token for authentication.
+
+        Returns:
+        - FuzzyCustomerIndex: Fuzzy index over the active customers.
+        """
+        return self.fuzzy_indexes.get(self.get_index(access_token).customers)
+
+    def sync(self , access_token) :
+        """
+        Bring the snapshot up to date with Business Central.
+
+        Parameters:
+        - access_token (str): Access token for authentication.
+        """
+        now=time.time()
+        modified_field=get_modified_field()
+        try :
+            if not self.loaded or not modified_field or self.watermark is None or \
+                    now - self.full_loaded_at >= self.full_reload_interval :
+                self._full_load(access_token , modified_field)
+                self.full_loaded_at=now
+            else :
+                self._delta_sync(access_token , modified_field)
+        except Exception :
+            if not self.loaded :
+                raise
+            logger.warning("Customer sync failed, serving the previous snapshot" , exc_info=True)
+        self.synced_at=now
+        self.index.refresh(self.customers.values())
+
+    def _full_load(self , access_token , modified_field) :
+        # Customers go straight from the response into the snapshot, no list of the whole base is built
+        customers={ }
+        watermark=''
+        for customer in iter_customers_from_bc(access_token) :
+            customers[customer['No']]=customer
+            watermark=max(watermark , customer.get(modified_field) or '')
+        self.customers=customers
+        self.watermark=watermark or None
+        self.loaded=True
+
+    def _delta_sync(self , access_token , modified_field) :
+        changed=get_customers_from_bc(access_token , modified_since=self.watermark , include_blocked=True)
+        for customer in changed :
+            if customer['Blocked'] == "All" :
+                self.customers.pop(customer['No'] , None)
+            else :
+                self.customers[customer['No']]=customer
+            if (customer.get(modified_field) or '') > self.watermark :
+                self.watermark=customer[modified_field]
+
+
+_snapshots={ }
+_snapshots_lock=threading.Lock()
+
+
+def get_customer_snapshot(tenant=None) :
+    """
+    Return the customer snapshot of a tenant, creating it on first use.
+
+    A snapshot syncs through the tenant that asks for it, so it must only be used
+    while that tenant is current.
+
+    Parameters:
+    - tenant (Tenant): The tenant, the current one if omitted.
+
+    Returns:
+    - CustomerSnapshot: Snapshot shared by the tenant's requests in this worker.
+    """
+    tenant=tenant or get_current_tenant()
+    snapshot=_snapshots.get(tenant.name)
+    if snapshot is None :
+        with _snapshots_lock :
+            snapshot=_snapshots.get(tenant.name)
+            if snapshot is None :
+                snapshot=_snapshots[tenant.name]=CustomerSnapshot(
+                    ttl=int(os.getenv('CUSTOMER_SNAPSHOT_TTL' , 300)) ,
+                    full_reload_interval=int(os.getenv('CUSTOMER_FULL_RELOAD_INTERVAL' , 86400))
+                )
+    return snapshot
+
+
+# Snapshot of the default tenant
+customer_snapshot=get_customer_snapshot(get_tenant())
@@ -0,0 +1,304 @@
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from mapping_functions.customer_mapping import non_digit_pattern
+
+# Legal form suffixes that don't tell two companies apart, after '/', '.' and apostrophes are removed
+COMPANY_SUFFIXES=frozenset([
+    'aps' , 'as' , 'ivs' , 'is' , 'ks' , 'ps' , 'amba' , 'smba' , 'fmba' , 'ab' , 'hb' , 'kb' , 'asa' , 'ans' ,
+    'oy' , 'oyj' , 'gmbh' , 'ag' , 'kg' , 'ug' , 'ohg' , 'ev' , 'bv' , 'nv' , 'vof' , 'sa' , 'sas' , 'sarl' ,
+    'srl' , 'spa' , 'sl' , 'sro' , 'kft' , 'zoo' , 'spzoo' , 'ltd' , 'limited' , 'plc' , 'llp' , 'llc' , 'inc' ,
+    'corp' , 'corporation' , 'co' , 'company'
+])
+
+# Country calling codes stripped from international numbers, longest prefix first
+COUNTRY_CODES=frozenset([
+    '1' , '7' , '20' , '27' , '30' , '31' , '32' , '33' , '34' , '36' , '39' , '40' , '41' , '43' , '44' , '45' ,
+    '46' , '47' , '48' , '49' , '52' , '55' , '61' , '64' , '81' , '82' , '86' , '90' , '91' , '351' , '352' ,
+    '353' , '354' , '358' , '370' , '371' , '372' , '385' , '386' , '420' , '421' , '971'
+])
+
+# Letters NFKD doesn't decompose
+TRANSLITERATION=str.maketrans({ 'æ' : 'ae' , 'ø' : 'oe' , 'å' : 'aa' , 'ß' : 'ss' , 'ð' : 'd' , 'þ' : 'th' ,
+                                'ł' : 'l' , 'œ' : 'oe' })
+
+SOUNDEX_CODES={ **dict.fromkeys('bfpv' , '1') , **dict.fromkeys('cgjkqsxz' , '2') , **dict.fromkeys('dt' , '3') ,
+                'l' : '4' , **dict.fromkeys('mn' , '5') , 'r' : '6' }
+
+non_word_pattern=re.compile(r'[^a-z0-9]+')
+
+
+def normalize_company_name(name) :
+    """
+    Normalize a company name for fuzzy matching.
+
+    Lower-cases, transliterates and strips accents, drops punctuation and legal form
+    suffixes, so "ACME ApS" and "Acme Aps." both become "acme".
+
+    Parameters:
+    - name (str): Company name.
+
+    Returns:
+    - str: Normalized name, tokens separated by single spaces.
+    """
+    name=unicodedata.normalize('NFKD' , name.lower().translate(TRANSLITERATION))
+    name=''.join(char for char in name if not unicodedata.combining(char))
+    name=name.replace('/' , '').replace('.' , '').replace("'" , '').replace('&' , ' and ')
+    tokens=non_word_pattern.sub(' ' , name).split()
+    significant=[token for token in tokens if token not in COMPANY_SUFFIXES]
+    # A name made only of suffixes is kept as it is
+    return ' '.join(significant or tokens)
+
+
+def normalize_phone(phone) :
+    """
+    Normalize a phone number to its national significant number.
+
+    "+45 20 00 00 01", "0045 20000001" and "20000001" all become "20000001".
+
+    Parameters:
+    - phone (str): Phone number.
+
+    Returns:
+    - str: Digits, empty if too short to identify a customer.
+    """
+    stripped=phone.strip()
+    digits=non_digit_pattern.sub('' , stripped)
+    international=stripped.startswith('+') or digits.startswith('00')
+    if international :
+        digits=digits.lstrip('0')
+        for length in (3 , 2 , 1) :
+            if digits[:length] in COUNTRY_CODES :
+                digits=digits[length:]
+                break
+    # Trunk prefix of national numbers, e.g. 030 in Germany
+    digits=digits.lstrip('0')
+    return digits if len(digits) >= 6 else ''
+
+
+def soundex(token) :
+    """
+    Soundex code of a word, so names that sound alike share a key.
+
+    Parameters:
+    - token (str): Normalized word.
+
+    Returns:
+    - str: Code like 'a250', empty for tokens that don't start with a letter.
+    """
+    if not token or not token[0].isalpha() :
+        return ''
+    code=token[0]
+    previous=SOUNDEX_CODES.get(token[0] , '')
+    for char in token[1:] :
+        digit=SOUNDEX_CODES.get(char , '')
+        if digit and digit != previous :
+            code+=digit
+            if len(code) == 4 :
+                break
+        if char not in 'hw' :
+            previous=digit
+    return code.ljust(4 , '0')
+
+
+def name_grams(normalized) :
+    """
+    Trigrams and Soundex keys of a normalized name.
+
+    Every token is padded with spaces, so short tokens still produce grams and word
+    boundaries weigh in.
+
+    Parameters:
+    - normalized (str): Normalized name.
+
+    Returns:
+    - set: Grams.
+    """
+    grams=set()
+    for token in normalized.split() :
+        padded=f"  {token} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+        code=soundex(token)
+        if code :
+            grams.add(f"#{code}")
+    return grams
+
+
+class FuzzyCustomerIndex :
+    """
+    Inverted trigram index over customer names for ranking near-duplicate customers.
+
+    Every name gram has a sorted, packed posting list of customer positions. A lookup
+    counts the grams each customer shares with the query in the posting lists of the
+    query's rare grams, then checks its best candidates against the common grams by
+    binary search and scores them with the Dice coefficient. Customers are never
+    compared pairwise. Normalized VAT numbers and phone numbers match exactly with
+    score 1.
+    """
+
+    def __init__(self , customers=() , max_posting_share=0.02) :
+        """
+        Parameters:
+        - customers (List[dict]): Customers as returned by Business Central.
+        - max_posting_share (float): Grams found in more than this share of the customers are skipped.
+        """
+        self.customers=list(customers)
+        self.max_posting=max(1000 , int(len(self.customers) * max_posting_share))
+        postings={ }
+        self.gram_counts=array('H')
+        self.by_vat={ }
+        self.by_phone={ }
+        for position , customer in enumerate(self.customers) :
+            grams=name_grams(normalize_company_name(customer['Name']))
+            self.gram_counts.append(min(len(grams) , 65535))
+            for gram in grams :
+                postings.setdefault(gram , []).append(position)
+
+            vat=non_digit_pattern.sub('' , customer['VAT_Registration_No'])
+            if vat != "" :
+                self.by_vat.setdefault(vat , []).append(position)
+            phone=normalize_phone(customer['Phone_No'])
+            if phone != "" :
+                self.by_phone.setdefault(phone , []).append(position)
+
+        self.postings={ gram : array('I' , positions) for gram , positions in postings.items() }
+
+    def search(self , vat_no , phone , name , limit=10 , threshold=0.5) :
+        """
+        Rank the customers most similar to an entry.
+
+        Parameters:
+        - vat_no (str): VAT registration number.
+        - phone (str): Phone number.
+        - name (str): Customer name.
+        - limit (int): Maximum number of candidates.
+        - threshold (float): Minimum score between 0 and 1.
+
+        Returns:
+        - List[tuple]: (score, position) pairs, best first.
+        """
+        scores={ }
+        vat=non_digit_pattern.sub('' , vat_no)
+        if vat != "" :
+            for position in self.by_vat.get(vat , ()) :
+                scores[position]=1.0
+        phone=normalize_phone(phone)
+        if phone != "" :
+            for position in self.by_phone.get(phone , ()) :
+                scores[position]=1.0
+
+        grams=name_grams(normalize_company_name(name))
+        postings=sorted((self.postings[gram] for gram in grams if gram in self.postings) , key=len)
+        if postings :
+            rare=sum(1 for posting in postings if len(posting) <= self.max_posting) or 1
+            shared={ }
+            for posting in postings[:rare] :
+                for position in posting :
+                    shared[position]=shared.get(position , 0) + 1
+
+            query_size=len(grams)
+            for position in heapq.nlargest(max(50 , limit * 5) , shared , key=shared.get) :
+                count=shared[position]
+                for posting in postings[rare:] :
+                    index=bisect_left(posting , position)
+                    if index < len(posting) and posting[index] == position :
+                        count+=1
+                score=2 * count / (query_size + self.gram_counts[position])
+                if score >= threshold and score > scores.get(position , 0) :
+                    scores[position]=score
+
+        ranked=sorted(((score , position) for position , score in scores.items() if score >= threshold) ,
+                      key=lambda candidate : (-candidate[0] , candidate[1]))
+        return ranked[:limit]
+
+    def match(self , vat_no , phone , name , limit=10 , threshold=0.5) :
+        """
+        Find the customers most similar to an entry.
+
+        Parameters:
+        - vat_no (str): VAT registration number.
+        - phone (str): Phone number.
+        - name (str): Customer name.
+        - limit (int): Maximum number of customers.
+        - threshold (float): Minimum score between 0 and 1.
+
+        Returns:
+        - List[dict]: Customer IDs, names and scores, best first.
+        """
+        matching_customers=[]
+        encountered_customer_ids=set()
+        for score , position in self.search(vat_no , phone , name , limit , threshold) :
+            customer=self.customers[position]
+            if customer['No'] not in encountered_customer_ids :
+                matching_customers.append({ 'title' : f"{customer['No']} - {customer['Name']}" ,
+                                            'value' : customer['No'] , 'score' : round(score , 3) })
+                encountered_customer_ids.add(customer['No'])
+        return matching_customers
+
+
+def get_fuzzy_config() :
+    """
+    Retrieve the fuzzy matching settings.
+
+    Returns:
+    - dict: limit and threshold keyword arguments of FuzzyCustomerIndex.match().
+    """
+    return {
+        'limit' : int(os.getenv('FUZZY_MATCH_LIMIT' , 10)) ,
+        'threshold' : float(os.getenv('FUZZY_MATCH_THRESHOLD' , 0.5))
+    }
+
+
+def merge_matches(exact_matches , fuzzy_matches) :
+    """
+    Combine exact and fuzzy matches, exact matches first.
+
+    Parameters:
+    - exact_matches (List[dict]): Matches from CustomerIndex.match().
+    - fuzzy_matches (List[dict]): Matches from FuzzyCustomerIndex.match().
+
+    Returns:
+    - List[dict]: Matches without duplicate customers, exact ones with score 1.
+    """
+    merged=[{ **customer , 'score' : 1.0 } for customer in exact_matches]
+    encountered_customer_ids={ customer['value'] for customer in exact_matches }
+    merged.extend(customer for customer in fuzzy_matches if customer['value'] not in encountered_customer_ids)
+    return merged
+
+
+class FuzzyIndexCache :
+    """
+    Keeps a fuzzy index built for the current customer list of a snapshot.
+
+    The index is rebuilt when the list changes. While a rebuild runs, other requests
+    keep using the previous index.
+    """
+
+    def __init__(self) :
+        self.index=None
+        self.customers=None
+        self._lock=threading.Lock()
+
+    def get(self , customers) :
+        """
+        Return the fuzzy index of a customer list.
+
+        Parameters:
+        - customers (List[dict]): Customer list, compared by identity.
+
+        Returns:
+        - FuzzyCustomerIndex: Index over the customers.
+        """
+        if self.customers is not customers :
+            if self._lock.acquire(blocking=self.index is None) :
+                try :
+                    if self.customers is not customers :
+                        self.index=FuzzyCustomerIndex(customers)
+                        self.customers=customers
+                finally :
+                    self._lock.release()
+        return self.index
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from mapping_functions.circuit_breaker import get_breaker , is_failure_status
+from mapping_functions.instrumentation import observe_upstream
+from mapping_functions.tenants import get_current_tenant
+
+
+def get_client_config() :
+    """
+    Retrieve HTTP client configuration variables.
+
+    Returns:
+    - dict: Dictionary containing the HTTP client configuration.
+    """
+    return {
+        "pool_size" : int(os.getenv('HTTP_POOL_SIZE' , 10)) ,
+        "connect_timeout" : float(os.getenv('HTTP_CONNECT_TIMEOUT' , 5)) ,
+        "read_timeout" : float(os.getenv('HTTP_READ_TIMEOUT' , 60)) ,
+        "retries" : int(os.getenv('HTTP_RETRIES' , 3)) ,
+        "backoff_factor" : float(os.getenv('HTTP_BACKOFF_FACTOR' , 0.5)) ,
+        "gzip" : os.getenv('HTTP_GZIP' , '1') != '0'
+    }
+
+
+class OutboundRetry(Retry) :
+    """
+    Retry policy for Business Central and token calls.
+
+    Idempotent methods are retried on 429 and 5xx. A POST is only retried on 429 and
+    503, where the server rejected the request without processing it, so a retry
+    can't create a second sales order.
+    """
+
+    def is_retry(self , method , status_code , has_retry_after=False) :
+        if method == "POST" :
+            return bool(self.total) and status_code in (429 , 503)
+        return super().is_retry(method , status_code , has_retry_after)
+
+
+def create_session(config) :
+    """
+    Create a pooled keep-alive session.
+
+    Parameters:
+    - config (dict): HTTP client configuration.
+
+    Returns:
+    - requests.Session: Session with retrying, pooled adapters mounted.
+    """
+    retry=OutboundRetry(
+        total=config['retries'] ,
+        backoff_factor=config['backoff_factor'] ,
+        status_forcelist=(429 , 500 , 502 , 503 , 504) ,
+        respect_retry_after_header=True ,
+        raise_on_status=False
+    )
+    adapter=HTTPAdapter(pool_connections=4 , pool_maxsize=config['pool_size'] , max_retries=retry)
+
+    session=requests.Session()
+    session.mount('https://' , adapter)
+    session.mount('http://' , adapter)
+    session.headers['Accept-Encoding']='gzip, deflate' if config['gzip'] else 'identity'
+    return session
+
+
+# Session and owning process by tenant name
+_sessions={ }
+_timeout=None
+_session_lock=threading.Lock()
+
+
+def get_session(tenant=None) :
+    """
+    Return the session of a tenant in the current worker process, creating it on first use.
+
+    Every tenant has its own connection pool, so a company with slow responses only
+    ties up its own connections.
+
+    Parameters:
+    - tenant (Tenant): The tenant, the current one if omitted.
+
+    Returns:
+    - requests.Session: Session shared by the tenant's requests.
+    """
+    global _timeout
+
+    tenant=tenant or get_current_tenant()
+    session=_sessions.get(tenant.name)
+    # A forked worker must not reuse the sockets of its parent
+    if session is None or session[1] != os.getpid() :
+        with _session_lock :
+            session=_sessions.get(tenant.name)
+            if session is None or session[1] != os.getpid() :
+                config={ **get_client_config() , 'pool_size' : tenant.pool_size }
+                _timeout=(config['connect_timeout'] , config['read_timeout'])
+                session=_sessions[tenant.name]=(create_session(config) , os.getpid())
+    return session[0]
+
+
+def request(method , url , **kwargs) :
+    """
+    Send a request through the session of the current tenant.
+
+    Parameters:
+    - method (str): HTTP method.
+    - url (str): Request URL.
+    - kwargs: Passed on to requests, 'timeout' defaults to the configured connect and read timeouts.
+
+    Returns:
+    - requests.Response: The response.
+
+    Raises:
+    - CircuitOpenError: If the endpoint's circuit is open, without sending the request.
+    """
+    tenant=get_current_tenant()
+    session=get_session(tenant)
+    kwargs.setdefault('timeout' , _timeout)
+
+    parsed_url=urlparse(url)
+    endpoint=parsed_url.path.rstrip('/').rsplit('/' , 1)[-1]
+    breaker=get_breaker(parsed_url.netloc , endpoint , tenant.name)
+    breaker.before_call()
+
+    started=time.perf_counter()
+    status='error'
+    try :
+        response=session.request(method , url , **kwargs)
+        status=str(response.status_code)
+        return response
+    finally :
+        if status == 'error' or is_failure_status(int(status)) :
+            breaker.record_failure()
+        else :
+            breaker.record_success()
+        observe_upstream(parsed_url.netloc , endpoint , method , status , time.perf_counter() - started)
+
+
+def get(url , **kwargs) :
+    """
+    Send a GET request through the shared session.
+
+    Parameters:
+    - url (str): Request URL.
+
+    Returns:
+    - requests.Response: The response.
+    """
+    return request("GET" , url , **kwargs)
+
+
+def post(url , **kwargs) :
+    """
+    Send a POST request through the shared session.
+
+    Parameters:
+    - url (str): Request URL.
+
+    Returns:
+    - requests.Response: The response.
+    """
+    return request("POST" , url , **kwargs)
@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class OrderInProgressError(Exception) :
+    """
+    Raised when the same order is submitted while an earlier submission is still running.
+    """
+
+    def __init__(self , key , retry_after=None) :
+        super().__init__(f"Order {key} is already being submitted")
+        self.key=key
+        # A submission takes one Business Central call, the caller can retry within seconds
+        self.retry_after=retry_after or int(os.getenv('ORDER_IN_PROGRESS_RETRY_AFTER' , 5))
+
+
+class IdempotencyStore :
+    """
+    Local SQLite record of which orders were already submitted to Business Central.
+
+    A key is claimed before its order is submitted and completed with the result
+    afterwards. The database is shared by all gunicorn workers on the host, so a
+    retried request that lands on another worker still finds the result. Finished
+    results are also kept in a per-worker LRU, so a repeat on the same worker is
+    answered without touching the database. Records expire after 'ttl' seconds.
+    """
+
+    def __init__(self , path , ttl=604800 , pending_timeout=300 , cache_size=10000 , purge_interval=3600) :
+        """
+        Parameters:
+        - path (str): SQLite database file.
+        - ttl (int): Seconds a finished record is kept.
+        - pending_timeout (int): Seconds after which an unfinished claim may be taken over.
+        - cache_size (int): Finished records kept in memory per worker.
+        - purge_interval (int): Seconds between deletions of expired records.
+        """
+        self.path=path
+        self.ttl=ttl
+        self.pending_timeout=pending_timeout
+        self.cache_size=cache_size
+        self.purge_interval=purge_interval
+        self.purged_at=0
+        self._cache=OrderedDict()
+        self._cache_lock=threading.Lock()
+        self._local=threading.local()
+
+    def _connection(self) :
+        # SQLite connections can't cross threads or forks, keep one per thread and process
+        connection=getattr(self._local , 'connection' , None)
+        if connection is None or self._local.pid != os.getpid() :
+            connection=sqlite3.connect(self.path , timeout=30 , isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                "key TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, updated_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idempotency_updated_at ON idempotency (updated_at)")
+            self._local.connection=connection
+            self._local.pid=os.getpid()
+        return connection
+
+    def _cached(self , key , now) :
+        with self._cache_lock :
+            cached=self._cache.get(key)
+            if cached is None :
+                return None
+            if cached[1] <= now :
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return cached[0]
+
+    def _remember(self , key , result , expires_at) :
+        with self._cache_lock :
+            self._cache[key]=(result , expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size :
+                self._cache.popitem(last=False)
+
+    def claim(self , key) :
+        """
+        Claim a key before submitting its order.
+
+        Parameters:
+        - key (str): Idempotency key.
+
+        Returns:
+        - tuple: (True, None) if the caller owns the key now, otherwise (False, record) with the existing record.
+        """
+        now=time.time()
+        cached=self._cached(key , now)
+        if cached is not None :
+            return False , { 'status' : 'done' , 'result' : cached }
+
+        connection=self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try :
+            row=connection.execute("SELECT status, result, updated_at FROM idempotency WHERE key = ?" ,
+                                   (key ,)).fetchone()
+            if row is not None :
+                status , result , updated_at=row
+                expired=now - updated_at > (self.pending_timeout if status == 'pending' else self.ttl)
+                if not expired :
+                    connection.execute("COMMIT")
+                    if status == 'done' :
+                        result=json.loads(result)
+                        self._remember(key , result , updated_at + self.ttl)
+                        return False , { 'status' : status , 'result' : result }
+                    return False , { 'status' : status , 'result' : None }
+
+            connection.execute("INSERT OR REPLACE INTO idempotency (key, status, result, updated_at) VALUES (?, ?, ?, ?)" ,
+                               (key , 'pending' , None , now))
+            connection.execute("COMMIT")
+            return True , None
+        except Exception :
+            connection.execute("ROLLBACK")
+            raise
+
+    def lookup(self , key) :
+        """
+        Return the stored result of a finished key without claiming it.
+
+        Parameters:
+        - key (str): Idempotency key.
+
+        Returns:
+        - The stored result, None if the key isn't finished.
+        """
+        now=time.time()
+        cached=self._cached(key , now)
+        if cached is not None :
+            return cached
+
+        row=self._connection().execute("SELECT result, updated_at FROM idempotency WHERE key = ? AND status = 'done'" ,
+                                       (key ,)).fetchone()
+        if row is None or now - row[1] > self.ttl :
+            return None
+        result=json.loads(row[0])
+        self._remember(key , result , row[1] + self.ttl)
+        return result
+
+    def complete(self , key , result) :
+        """
+        Store the result of a submitted order.
+
+        Parameters:
+        - key (str): Idempotency key.
+        - result: JSON serializable result to replay for later requests with the same key.
+        """
+        now=time.time()
+        connection=self._connection()
+        connection.execute("UPDATE idempotency SET status = ?, result = ?, updated_at = ? WHERE key = ?" ,
+                           ('done' , json.dumps(result) , now , key))
+        self._remember(key , result , now + self.ttl)
+
+        if now - self.purged_at >= self.purge_interval :
+            self.purged_at=now
+            connection.execute("DELETE FROM idempotency WHERE status = 'done' AND updated_at < ?" , (now - self.ttl ,))
+
+    def release(self , key) :
+        """
+        Drop a claim after a failed submission so the order can be retried.
+
+        Parameters:
+        - key (str): Idempotency key.
+        """
+        self._connection().execute("DELETE FROM idempotency WHERE key = ? AND status = 'pending'" , (key ,))
+
+
+# Store shared by the workers on this host
+idempotency_store=IdempotencyStore(
+    os.getenv('IDEMPOTENCY_DB' , 'order_state.sqlite3') ,
+    ttl=int(os.getenv('IDEMPOTENCY_TTL' , 604800)) ,
+    cache_size=int(os.getenv('IDEMPOTENCY_CACHE_SIZE' , 10000))
+)
+
+
+def submit_once(key , submit) :
+    """
+    Run a submission once per idempotency key, replaying the stored result for repeats.
+
+    Parameters:
+    - key (str): Idempotency key.
+    - submit (callable): Submits the order and returns a JSON serializable result.
+
+    Returns:
+    - The result of the first successful submission.
+    """
+    claimed , record=idempotency_store.claim(key)
+    if not claimed :
+        if record['status'] == 'done' :
+            return record['result']
+        raise OrderInProgressError(key)
+
+    try :
+        result=submit()
+    except Exception :
+        idempotency_store.release(key)
+        raise
+
+    idempotency_store.complete(key , result)
+    return result
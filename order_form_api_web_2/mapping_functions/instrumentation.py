@@ -0,0 +1,272 @@
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+# Request ID of the request being served, attached to every log record
+request_id_var=contextvars.ContextVar('request_id' , default='-')
+
+DEFAULT_BUCKETS=(0.005 , 0.01 , 0.025 , 0.05 , 0.1 , 0.25 , 0.5 , 1.0 , 2.5 , 5.0 , 10.0 , 30.0)
+
+logger=logging.getLogger('order_form_api')
+
+# Request IDs accepted from callers, anything else could forge log lines or paths
+request_id_pattern=re.compile(r'[A-Za-z0-9-]{1,64}')
+
+
+class Histogram :
+    """
+    Cumulative histogram of durations in seconds, in the Prometheus bucket layout.
+    """
+
+    def __init__(self , buckets=DEFAULT_BUCKETS) :
+        self.buckets=buckets
+        self.counts=[0] * len(buckets)
+        self.count=0
+        self.sum=0.0
+
+    def observe(self , value) :
+        for index , bound in enumerate(self.buckets) :
+            if value <= bound :
+                self.counts[index]+=1
+        self.count+=1
+        self.sum+=value
+
+
+class MetricsRegistry :
+    """
+    Histograms of this worker process, keyed by metric name and label values.
+
+    Every gunicorn worker keeps its own registry, the 'worker' label tells them apart.
+    """
+
+    def __init__(self) :
+        self.help={ }
+        self.histograms={ }
+        self._lock=threading.Lock()
+
+    def describe(self , name , help_text) :
+        self.help[name]=help_text
+
+    def reset(self) :
+        """
+        Drop all observations, e.g. those a preloaded master recorded before forking a worker.
+        """
+        self._lock=threading.Lock()
+        self.histograms={ }
+
+    def observe(self , name , labels , value) :
+        """
+        Record a duration.
+
+        Parameters:
+        - name (str): Metric name.
+        - labels (dict): Label names and values.
+        - value (float): Duration in seconds.
+        """
+        key=(name , tuple(sorted(labels.items())))
+        with self._lock :
+            histogram=self.histograms.get(key)
+            if histogram is None :
+                histogram=self.histograms[key]=Histogram()
+            histogram.observe(value)
+
+    def render(self) :
+        """
+        Render all histograms in the Prometheus text exposition format.
+
+        Returns:
+        - str: Metrics text.
+        """
+        worker=('worker' , str(os.getpid()))
+        lines=[]
+        with self._lock :
+            for name in sorted({ key[0] for key in self.histograms }) :
+                lines.append(f"# HELP {name} {self.help.get(name , name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric , labels) , histogram in sorted(self.histograms.items()) :
+                    if metric != name :
+                        continue
+                    label_text=','.join(f'{key}="{escape_label(value)}"' for key , value in labels + (worker ,))
+                    for bound , count in zip(histogram.buckets , histogram.counts) :
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value) :
+    return str(value).replace('\\' , '\\\\').replace('"' , '\\"').replace('\n' , '\\n')
+
+
+metrics=MetricsRegistry()
+metrics.describe('http_request_duration_seconds' , "Duration of requests served, per route.")
+metrics.describe('upstream_request_duration_seconds' , "Duration of outbound HTTP calls, per upstream endpoint.")
+metrics.describe('stage_duration_seconds' , "Duration of order pipeline stages.")
+
+
+@contextmanager
+def stage_timer(stage) :
+    """
+    Time a pipeline stage and record it in stage_duration_seconds.
+
+    Parameters:
+    - stage (str): Stage name.
+    """
+    started=time.perf_counter()
+    try :
+        yield
+    finally :
+        elapsed=time.perf_counter() - started
+        metrics.observe('stage_duration_seconds' , { 'stage' : stage } , elapsed)
+        logger.debug("stage %s took %.1f ms" , stage , elapsed * 1000)
+
+
+def observe_upstream(upstream , endpoint , method , status , elapsed) :
+    """
+    Record an outbound HTTP call in upstream_request_duration_seconds.
+
+    Parameters:
+    - upstream (str): Host of the upstream.
+    - endpoint (str): Last path segment of the URL, e.g. Sales_Order_Excel.
+    - method (str): HTTP method.
+    - status (str): HTTP status, or 'error' if no response arrived.
+    - elapsed (float): Duration in seconds.
+    """
+    metrics.observe('upstream_request_duration_seconds' , {
+        'upstream' : upstream , 'endpoint' : endpoint , 'method' : method , 'status' : status
+    } , elapsed)
+    logger.debug("%s %s/%s -> %s in %.1f ms" , method , upstream , endpoint , status , elapsed * 1000)
+
+
+class SamplingProfiler :
+    """
+    Samples the stack of one thread at a fixed interval and counts collapsed stacks.
+
+    The output is in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self , thread_id , interval=0.005) :
+        self.thread_id=thread_id
+        self.interval=interval
+        self.samples=Counter()
+        self._stop=threading.Event()
+        self._thread=threading.Thread(target=self._run , daemon=True)
+
+    def start(self) :
+        self._thread.start()
+
+    def stop(self) :
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) :
+        while not self._stop.wait(self.interval) :
+            frame=sys._current_frames().get(self.thread_id)
+            stack=[]
+            while frame is not None :
+                stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                frame=frame.f_back
+            if stack :
+                self.samples[';'.join(reversed(stack))]+=1
+
+    def write(self , path) :
+        with open(path , 'w') as file :
+            for stack , count in self.samples.most_common() :
+                file.write(f"{stack} {count}\n")
+
+
+def configure_logging() :
+    """
+    Configure logging so every record carries the current request ID.
+    """
+    factory=logging.getLogRecordFactory()
+
+    def record_factory(*args , **kwargs) :
+        record=factory(*args , **kwargs)
+        record.request_id=request_id_var.get()
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+    logging.basicConfig(level=os.getenv('LOG_LEVEL' , 'INFO') ,
+                        format="%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+
+def get_request_id(header) :
+    """
+    Take the caller's request ID if it is well-formed, otherwise generate one.
+
+    Parameters:
+    - header (str): Value of the X-Request-ID header, None if absent.
+
+    Returns:
+    - str: Request ID.
+    """
+    if header and request_id_pattern.fullmatch(header) :
+        return header
+    return uuid.uuid4().hex
+
+
+def init_app(app) :
+    """
+    Add request IDs, request timing, the /metrics route and the per-request profiler to a Flask app.
+
+    A request is profiled when PROFILING_ENABLED=1 and it carries the header 'X-Profile: 1'.
+    The folded stacks are written to PROFILE_DIR/<profile id>.folded, the profile ID is
+    generated by the server and logged with the request ID.
+
+    Parameters:
+    - app (Flask): The Flask app.
+    """
+    from flask import g , request , Response
+
+    configure_logging()
+    profiling_enabled=os.getenv('PROFILING_ENABLED') == '1'
+    profile_dir=os.getenv('PROFILE_DIR' , '.')
+
+    @app.before_request
+    def start_request() :
+        request_id=get_request_id(request.headers.get('X-Request-ID'))
+        g.request_id_token=request_id_var.set(request_id)
+        g.request_id=request_id
+        g.started=time.perf_counter()
+        g.profiler=None
+        if profiling_enabled and request.headers.get('X-Profile') == '1' :
+            g.profiler=SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def finish_request(response) :
+        elapsed=time.perf_counter() - g.started
+        route=request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('http_request_duration_seconds' , {
+            'route' : route , 'method' : request.method , 'status' : str(response.status_code)
+        } , elapsed)
+        response.headers['X-Request-ID']=g.request_id
+
+        if g.profiler is not None :
+            g.profiler.stop()
+            path=os.path.join(profile_dir , f"{uuid.uuid4().hex}.folded")
+            g.profiler.write(path)
+            logger.info("profile written to %s" , path)
+
+        logger.info("%s %s -> %s in %.1f ms" , request.method , request.path , response.status_code , elapsed * 1000)
+        return response
+
+    @app.teardown_request
+    def reset_request_id(exception) :
+        token=g.pop('request_id_token' , None)
+        if token is not None :
+            request_id_var.reset(token)
+
+    @app.route('/metrics' , methods=['GET'])
+    def metrics_route() :
+        return Response(metrics.render() , mimetype='text/plain; version=0.0.4')
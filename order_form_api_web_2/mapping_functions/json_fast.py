@@ -0,0 +1,110 @@
+import json
+import os
+from flask.json.provider import DefaultJSONProvider
+from Product_Catalog.templates import templates , country_dict
+
+try :
+    import orjson
+except ImportError :  # orjson is optional, the stdlib json module is used without it
+    orjson=None
+
+# JSON_BACKEND=stdlib forces the stdlib json module even when orjson is installed
+use_orjson=orjson is not None and os.getenv('JSON_BACKEND' , 'orjson') == 'orjson'
+
+
+def dumps(obj , default=None , sort_keys=True) :
+    """
+    Serialize to compact JSON bytes with the fastest available backend.
+
+    Parameters:
+    - obj: Object to serialize.
+    - default (callable): Converter for objects the backend can't serialize.
+    - sort_keys (bool): Sort the keys of dictionaries.
+
+    Returns:
+    - bytes: JSON document.
+    """
+    if use_orjson :
+        option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj , default=default , option=option)
+    return json.dumps(obj , default=default , sort_keys=sort_keys , separators=(',' , ':')).encode()
+
+
+def loads(data) :
+    """
+    Parse a JSON document with the fastest available backend.
+
+    Parameters:
+    - data (bytes | str): JSON document.
+
+    Returns:
+    - The parsed object.
+    """
+    if use_orjson :
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider) :
+    """
+    Flask JSON provider that parses and serializes with orjson when it is available.
+
+    Calls with extra json.dumps/json.loads arguments and debug-mode pretty printing
+    fall back to the default provider.
+    """
+
+    def dumps(self , obj , **kwargs) :
+        if not use_orjson or kwargs :
+            return super().dumps(obj , **kwargs)
+        return dumps(obj , default=self.default , sort_keys=self.sort_keys).decode()
+
+    def loads(self , s , **kwargs) :
+        if not use_orjson or kwargs :
+            return super().loads(s , **kwargs)
+        return orjson.loads(s)
+
+    def response(self , *args , **kwargs) :
+        if not use_orjson or self._app.debug :
+            return super().response(*args , **kwargs)
+        obj=self._prepare_response_obj(args , kwargs)
+        body=dumps(obj , default=self.default , sort_keys=self.sort_keys) + b"\n"
+        return self._app.response_class(body , mimetype=self.mimetype)
+
+
+# The catalog parts of /get_customers only change on deploy, serialize them once
+TEMPLATES_JSON=dumps(templates)
+COUNTRIES_JSON=dumps(country_dict)
+
+
+def customers_response_body(customers_found , access_token , tenant_id , catalog_version=None) :
+    """
+    Build the /get_customers response body around the pre-serialized catalog parts.
+
+    Produces the same document as jsonify with sorted keys.
+
+    Parameters:
+    - customers_found (List[dict]): Matching customers.
+    - access_token (str): Access token echoed to the caller.
+    - tenant_id (str): Business Central tenant ID.
+    - catalog_version (str): When given, only this version is returned instead of templates and countries.
+
+    Returns:
+    - bytes: JSON document.
+    """
+    if catalog_version is not None :
+        return b''.join([
+            b'{"ac":' , dumps(access_token) ,
+            b',"catalog_version":' , dumps(catalog_version) ,
+            b',"customer_mapping":' , dumps({ 'no' : customers_found }) ,
+            b',"t_id":' , dumps(tenant_id) ,
+            b'}\n'
+        ])
+
+    return b''.join([
+        b'{"ac":' , dumps(access_token) ,
+        b',"countries":' , COUNTRIES_JSON ,
+        b',"customer_mapping":' , dumps({ 'no' : customers_found }) ,
+        b',"t_id":' , dumps(tenant_id) ,
+        b',"templates":' , TEMPLATES_JSON ,
+        b'}\n'
+    ])
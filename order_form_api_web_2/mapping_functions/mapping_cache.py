@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class MappingCache :
+    """
+    Per-worker LRU cache of mapped sales order lines.
+
+    Keys are built by map_lines from the catalog version, the company and the
+    mapping key of the entry, so entries that differ only in customer or address
+    share the lines, and a catalog swap never serves lines of the old catalog.
+    """
+
+    def __init__(self , max_size=1024) :
+        """
+        Parameters:
+        - max_size (int): Mapped entries kept, the least recently used one is dropped first.
+        """
+        self.max_size=max_size
+        self.stats={ 'hits' : 0 , 'misses' : 0 , 'evictions' : 0 }
+        self._lines=OrderedDict()
+        self._lock=threading.Lock()
+
+    def get(self , key) :
+        """
+        Return the lines mapped for a key.
+
+        Parameters:
+        - key (tuple): Cache key.
+
+        Returns:
+        - List[dict]: Cached line requests, shared and not to be mutated, None on a miss.
+        """
+        with self._lock :
+            lines=self._lines.get(key)
+            if lines is None :
+                self.stats['misses']+=1
+                return None
+            self._lines.move_to_end(key)
+            self.stats['hits']+=1
+            return lines
+
+    def put(self , key , lines) :
+        """
+        Store the lines mapped for a key.
+
+        Parameters:
+        - key (tuple): Cache key.
+        - lines (List[dict]): Line requests, the cache keeps them as they are.
+        """
+        if self.max_size <= 0 :
+            return
+        with self._lock :
+            self._lines[key]=lines
+            self._lines.move_to_end(key)
+            while len(self._lines) > self.max_size :
+                self._lines.popitem(last=False)
+                self.stats['evictions']+=1
+
+    def get_stats(self) :
+        """
+        Return the cache counters.
+
+        Returns:
+        - dict: Hit, miss and eviction counts plus the number of cached entries.
+        """
+        with self._lock :
+            return { **self.stats , 'cached' : len(self._lines) }
+
+    def clear(self) :
+        """
+        Drop all lines cached in this worker.
+        """
+        with self._lock :
+            self._lines.clear()
+
+
+# Mapped lines of this worker, see map_lines in mapping_pencils
+mapping_cache=MappingCache(int(os.getenv('MAPPING_CACHE_SIZE' , 1024)))
@@ -1,135 +1,81 @@
 import json
-import os
-import requests
-from Product_Catalog.VarianCodes.ProductHierarchy import personalized_vs_standard , state_of_pencils , graphite_seeds , \
-    color_seeds , multi_color_seeds , packaging_types , packaging , languages , country_codes
-from Product_Catalog.VarianCodes.variants import item_dict , packaging_items
+from mapping_functions import http_client
+from Product_Catalog.VarianCodes.ProductHierarchy import country_codes
+from mapping_functions.order_plan import compile_order_plan
+from mapping_functions.product_catalog import add_swap_listener
+from mapping_functions.idempotency import submit_once
+from mapping_functions.instrumentation import stage_timer
+from mapping_functions.mapping_cache import mapping_cache
+from mapping_functions.tenants import tenants , get_current_tenant
 import re
 
 
 def get_environment_config() :
     """
-    Retrieve environment configuration variables.
+    Retrieve environment configuration variables of the current tenant.
 
     Returns:
     - dict: Dictionary containing the environment configuration.
     """
-    return {
-        "base_url" : os.getenv("BASEURL") ,
-        "tenant_id" : os.getenv("TENANTID") ,
-        "environment" : os.getenv('TESTENVIRONMENT') ,
-        "company" : os.getenv('COMPANYEU')
-    }
+    return get_current_tenant().get_order_config()
+
+
+# Mapping rules compiled once per worker, tenant and catalog, map_items evaluates them against each entry
+order_plans={ tenant.name : compile_order_plan(tenant.get_order_config()) for tenant in tenants }
 
 
-def add_one_item(data , item_type , quantity , item_no , item_id , location , config , document_no) :
+def get_order_plan() :
     """
-    Add an item line to the sales order data.
+    Return the order plan of the current tenant and the active catalog.
 
-    Parameters:
-    - data (dict): Sales order data.
-    - item_type (str): Type of the item.
-    - quantity (int): Quantity of the item.
-    - item_no (str): Item number.
-    - item_id (str): Unique ID for the item.
-    - location (str): Location code.
-    - config (dict): Environment configuration.
-    - document_no (str): Document number.
+    A request takes the plan once and uses it throughout, so a catalog swap never
+    mixes two catalogs in one order.
+
+    Returns:
+    - OrderPlan: The compiled plan.
     """
-    data['lines']['requests'].append({
-        "method" : "POST" ,
-        "id" : item_id ,
-        "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-        "headers" : {
-            "Content-Type" : "application/json"
-        } ,
-        "body" : {
-            "Document_No" : document_no ,
-            "Type" : item_type ,
-            "No" : item_no ,
-            "Location_Code" : location ,
-            "Quantity" : quantity
-        }
-    })
+    return order_plans[get_current_tenant().name]
 
 
-def add_fee(data , item_type , quantity , item_no , item_id , location , config , document_no , price) :
+def recompile_order_plan(catalog) :
     """
-    Add a fee line to the sales order data.
+    Compile the order plans against a new catalog, called when the catalog is swapped.
 
     Parameters:
-    - data (dict): Sales order data.
-    - item_type (str): Type of the item.
-    - quantity (int): Quantity of the item.
-    - item_no (str): Item number.
-    - item_id (str): Unique ID for the item.
-    - location (str): Location code.
-    - config (dict): Environment configuration.
-    - document_no (str): Document number.
-    - price (float): Unit price of the fee.
+    - catalog (ProductCatalog): The new catalog.
     """
-    data['lines']['requests'].append({
-        "method" : "POST" ,
-        "id" : item_id ,
-        "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-        "headers" : {
-            "Content-Type" : "application/json"
-        } ,
-        "body" : {
-            "Document_No" : document_no ,
-            "Type" : item_type ,
-            "No" : item_no ,
-            "Location_Code" : location ,
-            "Quantity" : quantity ,
-            "Unit_Price" : price
-        }
-    })
+    global order_plans
+    order_plans={ name : compile_order_plan(plan.config , catalog) for name , plan in order_plans.items() }
 
 
-def handle_language(entries , data , document_no) :
+add_swap_listener(recompile_order_plan)
+
+# Document number of the lines of a preview, no sales order is created for it
+PREVIEW_DOCUMENT_NO="PREVIEW"
+
+
+def create_order_data(entry , customer_number) :
     """
-    Handle the language specification for the sales order.
+    Create the sales order data structure for an order entry.
 
     Parameters:
-    - entries (dict): Order entries.
-    - data (dict): Sales order data.
-    - document_no (str): Document number.
+    - entry (OrderEntry): Order entry.
+    - customer_number (str): Customer number.
+
+    Returns:
+    - tuple: Sales order data and total quantity of items.
     """
-    config=get_environment_config()
-
-    if entries['30'] not in ["Other" , ""] :
-        data['lines']['requests'].append({
-            "method" : "POST" ,
-            "id" : "898989" ,
-            "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-            "headers" : {
-                "Content-Type" : "application/json"
-            } ,
-            "body" : {
-                "Document_No" : document_no ,
-                "Type" : "Item" ,
-                "No" : languages[entries['30']] ,
-                "Location_Code" : "PP" ,
-                "Quantity" : 1
-            }
-        })
-    else :
-        data['lines']['requests'].append({
-            "method" : "POST" ,
-            "id" : "89898asd9" ,
-            "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-            "headers" : {
-                "Content-Type" : "application/json"
-            } ,
-            "body" : {
-                "Document_No" : document_no ,
-                "Type" : "Item" ,
-                "No" : '604' ,
-                "Location_Code" : "PP" ,
-                "Quantity" : 1 ,
-                "Description" : entries['248']
-            }
-        })
+    # The total quantity of the form, or the sum of the pencil quantities, was worked out by parse_order_entry
+    quantity=entry.quantity
+
+    # Create data structure for order
+    order_data={
+        "order" : { "Total Quantity" : quantity } ,
+        "lines" : { "requests" : [] } ,
+        "customer_number" : customer_number
+    }
+
+    return order_data , quantity
 
 
 def map_items(entry , data , access_token , quantity) :
@@ -137,7 +83,7 @@ def map_items(entry , data , access_token , quantity) :
     Map the items from the order entry to the sales order data.
 
     Parameters:
-    - entry (dict): Order entry.
+    - entry (OrderEntry): Order entry.
     - data (dict): Sales order data.
     - access_token (str): Access token for authentication.
     - quantity (int): Total quantity of items.
@@ -145,277 +91,194 @@ def map_items(entry , data , access_token , quantity) :
     Returns:
     - dict: Updated sales order data.
     """
-    config=get_environment_config()
-    product_dict={ }
-    data , product_dict , document_no=add_pencils(entry , product_dict , data , access_token , quantity)
-
-    if entry['119'] not in ["Pencils only" , "" , " "] :
-        add_packaging(entry , product_dict , data , document_no , quantity)
-    if entry['233'] != "No thanks not this time" :
-        add_sharpeners(entry , data , config , document_no)
-    handle_language(entry , data , document_no)
-    if entry['7'] in ["Customized laser engraved" , "Customized color print"] :
-        add_fee(data , "Item" , 1 , "625" , "k1k1" , "PP" , config , document_no , 10.0)
-    if entry['111'] == "Customized packaging (Your own design)" :
-        add_fee(data , "Item" , 1 , "626" , "k1k2" , "PP" , config , document_no , 15.0)
-    if entry['7'] in ["Customized color print" , "Standard color print"] :
-        add_one_item(data , "Item" , quantity , "100" , "k1k3" , "PP" , config , document_no)
-    add_one_item(data , "Item" , 1 , "997" , "k1k5" , "PP" , config , document_no)
-
+    # Lines are mapped before the order is created, an entry the catalog can't map never reaches Business Central
+    data['lines']['requests'].extend(map_lines(get_order_plan() , entry , quantity))
+    with stage_timer('create_new_order') :
+        document_no=create_new_order(quantity , data['customer_number'] , access_token , entry)
+    for line in data['lines']['requests'] :
+        line['body']['Document_No']=document_no
     return data
 
 
-def add_pencils(entry , product_dict , data , access_token , quantity) :
+def map_lines(plan , entry , quantity) :
     """
-    Add pencil items to the sales order data.
+    Map the sales order lines of an order entry, without a document number.
+
+    Lines are cached by the catalog version, the company and the entry's mapping key,
+    so previews and retries of an entry that was mapped before skip the mapping.
 
     Parameters:
-    - entry (dict): Order entry.
-    - product_dict (dict): Product dictionary.
-    - data (dict): Sales order data.
-    - access_token (str): Access token for authentication.
+    - plan (OrderPlan): Order plan of the request.
+    - entry (OrderEntry): Order entry.
     - quantity (int): Total quantity of items.
 
     Returns:
-    - tuple: Updated sales order data, product dictionary, and document number.
+    - List[dict]: Line requests, the caller may set their Document_No.
     """
-    config=get_environment_config()
-    lang=entry['30']
-
-    size_and_state={
-        "size" : "normal" if entry['121'] not in ["Mini Single Card" , "Hanger Tag"] else "mini" ,
-        "state" : "up" if entry['121'] in ["Mini Single Card" , "Hanger Tag"] else (
-            "sp" if entry['121'] in ["5-Pack" , "3-Pack"] else (
-                "sp" if entry['28'] == "" else state_of_pencils[entry['28']]
-            )
-        )
-    }
-
-    personalized=entry['7'] in ["Customized laser engraved" , "Customized color print"]
-
-    if entry['23'] != "" :
-        product_dict[
-            "Pencil_ID_gh"]=f"{personalized_vs_standard[personalized]} {size_and_state['state']} {'Other' if personalized or size_and_state['size'] == 'mini' else lang}"
-    if entry['24'] != "" :
-        product_dict[
-            "Pencil_ID_cl"]=f"{personalized_vs_standard[personalized]} sp {'Other' if personalized or size_and_state['size'] == 'mini' else lang}"
-    if entry['152'] != "" :
-        product_dict["Pencil_ID_ml"]=f"{personalized_vs_standard[personalized]} sp Other"
-
-    data , document_no=handle_pencils(product_dict , access_token , entry , data , size_and_state['size'] , quantity)
+    key=(plan.catalog.version , plan.line_url , entry.mapping_key() , quantity)
+    lines=mapping_cache.get(key)
+    if lines is None :
+        with stage_timer('pencil_ids') :
+            product_dict , size=plan.pencil_ids(entry)
+        with stage_timer('add_lines') :
+            data=plan.add_lines(entry , product_dict , size , { 'lines' : { 'requests' : [] } } , None , quantity)
+        lines=data['lines']['requests']
+        mapping_cache.put(key , lines)
 
-    return data , product_dict , document_no
+    # The cached lines stay untouched, only the body of a line is changed by the callers
+    return [{ **line , 'body' : { **line['body'] } } for line in lines]
 
 
-def add_packaging(entry , product_dict , data , document_no , quantity) :
+def preview_items(entry , data , quantity) :
     """
-    Add packaging items to the sales order data.
+    Map the items from the order entry like map_items, without creating the sales order.
 
     Parameters:
-    - entry (dict): Order entry.
-    - product_dict (dict): Product dictionary.
+    - entry (OrderEntry): Order entry.
     - data (dict): Sales order data.
-    - document_no (str): Document number.
     - quantity (int): Total quantity of items.
 
     Returns:
-    - dict: Updated sales order data.
+    - dict: Sales order data with the lines of the placeholder document PREVIEW_DOCUMENT_NO.
     """
-    config=get_environment_config()
-    packaging_type=entry['121']
-    customized_packaging=entry['111'] == "Customized packaging (Your own design)"
-    lang="Other" if entry['153'] == "" else entry['153']
-    product_dict[
-        'packaging_id']=f"{packaging_types[packaging_type]} {(packaging[customized_packaging] if packaging_type != 'Hanger Tag' else 's')} {lang}"
-    data=generate_packaging_batch(product_dict , data , "packaging_id" , document_no , quantity)
-
+    lines=map_lines(get_order_plan() , entry , quantity)
+    for line in lines :
+        line['body']['Document_No']=PREVIEW_DOCUMENT_NO
+    data['lines']['requests'].extend(lines)
     return data
 
 
-def handle_pencils(product_dict , access_token , entry , data , size , quantity) :
+def create_new_order(quantity , customer , access_token , entry) :
     """
-    Handle the addition of pencil items to the sales order data.
+    Create a new sales order.
+
+    Resubmissions of an order that was already created, in any submission mode, return
+    the stored document number instead of creating a duplicate.
 
     Parameters:
-    - product_dict (dict): Product dictionary.
-    - access_token (str): Access token for authentication.
-    - entry (dict): Order entry.
-    - data (dict): Sales order data.
-    - size (str): Size of the pencils.
     - quantity (int): Total quantity of items.
+    - customer (str): Customer number.
+    - access_token (str): Access token for authentication.
+    - entry (OrderEntry): Order entry.
 
     Returns:
-    - tuple: Updated sales order data and document number.
+    - str: Document number of the created sales order.
     """
-    config=get_environment_config()
-    document_no=create_new_order(quantity , data['customer_number'] , access_token , entry)
+    header=build_order_header(quantity , customer , entry)
+    headers={
+        'Content-Type' : 'application/json' ,
+        'Authorization' : f"Bearer {access_token}"
+    }
 
-    if "Pencil_ID_gh" in product_dict :
-        data=generate_pencil_batch(product_dict , graphite_seeds , data , entry , size , "Pencil_ID_gh" , document_no)
-    if "Pencil_ID_cl" in product_dict :
-        data=generate_pencil_batch(product_dict , color_seeds , data , entry , size , "Pencil_ID_cl" , document_no)
-    if "Pencil_ID_ml" in product_dict :
-        data=generate_pencil_batch(product_dict , multi_color_seeds , data , entry , size , "Pencil_ID_ml" ,
-                                   document_no)
+    def submit() :
+        response=http_client.post(get_order_url(get_order_plan().config) , headers=headers , data=json.dumps(header))
+        # The caller posts the lines, none were created with the header
+        return order_record(response.json()['No'])
 
-    return data , document_no
+    return read_order_record(submit_once(get_order_key(header) , submit))['document_no']
 
 
-def create_new_order(quantity , customer , access_token , entry) :
+def get_order_key(header) :
     """
-    Create a new sales order.
+    Build the idempotency key of a sales order from its tenant, customer and external document number.
+
+    The key is also the order's key in the order queue. Customer numbers repeat across
+    companies, the tenant keeps their orders apart.
 
     Parameters:
-    - quantity (int): Total quantity of items.
-    - customer (str): Customer number.
-    - access_token (str): Access token for authentication.
-    - entry (dict): Order entry.
+    - header (dict): Sales order header fields.
 
     Returns:
-    - str: Document number of the created sales order.
+    - str: Idempotency key.
     """
-    config=get_environment_config()
-
-    order_data={
-        "PTE_Total_Quantity" : int(quantity) ,
-        "PTE_Status_Code" : "19-APPROVAL" ,
-        "Sell_to_Customer_No" : customer ,
-        "Sell_to_Contact" : entry['89.3'] ,
-        "External_Document_No" : (entry['125'])[:35] if entry['125'] != '' else entry['id'] ,
-        "Sell_to_Address" : (entry["87.1"])[:99] ,
-        "Sell_to_Address_2" : (entry["87.2"])[:49] ,
-        "Sell_to_City" : (entry["87.3"])[:29] ,
-        "Sell_to_Post_Code" : (entry["87.5"])[:19] ,
-        "Sell_to_Country_Region_Code" : (country_codes[entry["87.6"]])[:9] if entry["87.6"] in country_codes else "" ,
-        "Sell_to_Phone_No" : re.sub('\D' , '' , entry["307"]) ,
-        "Sell_to_E_Mail" : entry["88"] ,
-        "ShippingOptions" : "Custom Address" ,
-        "PTE_Ship_to_Email" : entry["88"]
-    }
+    return f"sales_order:{get_current_tenant().name}:{header['Sell_to_Customer_No']}:{header['External_Document_No']}"
 
-    if entry['139.1'] == "Delivery address is different from invoice" :
-        ship_keys={
-            'add_1' : '95.1' , 'add_2' : '95.2' , 'city' : '95.3' , 'post_code' : '95.5' , 'region' : '95.6' ,
-            'contact_first' : '96.3' , 'contact_last' : '96.6' , 'phone' : '97' , 'company' : '94'
-        }
-    else :
-        ship_keys={
-            'add_1' : '87.1' , 'add_2' : '87.2' , 'city' : '87.3' , 'post_code' : '87.5' , 'region' : '87.6' ,
-            'contact_first' : '89.3' , 'contact_last' : '89.6' , 'phone' : '307' , 'company' : '86'
-        }
 
-    order_data.update({
-        "Ship_to_Address" : (entry[ship_keys['add_1']])[:99] ,
-        "Ship_to_Address_2" : (entry[ship_keys['add_2']])[:49] ,
-        "Ship_to_City" : (entry[ship_keys['city']])[:20] ,
-        "Ship_to_Post_Code" : (entry[ship_keys['post_code']])[:19] ,
-        "Ship_to_Country_Region_Code" : (country_codes[entry[ship_keys['region']]])[:9] if entry[ship_keys[
-            'region']] in country_codes else "" ,
-        "Ship_to_Contact" : f"{entry[ship_keys['contact_first']]} {entry[ship_keys['contact_last']]}" ,
-        "PTE_Ship_to_Phone_No" : re.sub(r'\D' , '' , entry[ship_keys['phone']]) ,
-        "Ship_to_Name" : entry[ship_keys['company']]
-    })
+def order_record(document_no , lines=None) :
+    """
+    Build the idempotency record of a sales order, stored under its order key by every submission mode.
 
-    payload=json.dumps(order_data)
-    headers={
-        'Content-Type' : 'application/json' ,
-        'Authorization' : f"Bearer {access_token}"
-    }
-    url=f"{config['base_url']}/{config['tenant_id']}/{config['environment']}/ODataV4/{config['company']}/Sales_Order_Excel"
-    response=requests.post(url , headers=headers , data=payload)
+    Parameters:
+    - document_no (str): Document number of the created sales order.
+    - lines (List[dict]): 'id' and 'line_no' of the lines created with the header, None if the caller posts the lines.
 
-    return response.json()['No']
+    Returns:
+    - dict: Order record.
+    """
+    return { 'document_no' : document_no , 'lines' : lines }
 
 
-def generate_pencil_batch(product_dict , seeds , data , entry , size , color_id , document_no) :
+def read_order_record(result) :
     """
-    Generate a batch of pencil items for the sales order.
+    Read an order record from the idempotency store.
+
+    Records of single orders stored before every mode shared the record hold the plain document number.
 
     Parameters:
-    - product_dict (dict): Product dictionary.
-    - seeds (dict): Seeds for generating pencil items.
-    - data (dict): Sales order data.
-    - entry (dict): Order entry.
-    - size (str): Size of the pencils.
-    - color_id (str): Color ID of the pencils.
-    - document_no (str): Document number.
+    - result: Stored result of an order key.
 
     Returns:
-    - dict: Updated sales order data.
+    - dict: Order record, see order_record.
     """
-    config=get_environment_config()
-
-    for key in seeds.keys() :
-        if entry[key] != "" :
-            data['lines']['requests'].append({
-                "method" : "POST" ,
-                "id" : str(key) ,
-                "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-                "headers" : {
-                    "Content-Type" : "application/json"
-                } ,
-                "body" : {
-                    "Document_No" : document_no ,
-                    "Type" : "Item" ,
-                    "No" : item_dict[f"{product_dict[color_id]} {seeds[key]} {size}"] ,
-                    "Location_Code" : "PP" ,
-                    "Quantity" : int(entry[key])
-                }
-            })
-    return data
+    if isinstance(result , str) :
+        return order_record(result)
+    return result
 
 
-def generate_packaging_batch(product_dict , data , packaging_id , document_no , quantity) :
+def get_order_url(config) :
     """
-    Generate a batch of packaging items for the sales order.
+    Build the URL of the sales order endpoint.
 
     Parameters:
-    - product_dict (dict): Product dictionary.
-    - data (dict): Sales order data.
-    - packaging_id (str): ID of the packaging.
-    - document_no (str): Document number.
-    - quantity (int): Total quantity of items.
+    - config (dict): Environment configuration.
 
     Returns:
-    - dict: Updated sales order data.
+    - str: Sales order endpoint URL.
     """
-    config=get_environment_config()
-    packaging_item=packaging_items[product_dict[packaging_id]]
-
-    if packaging_item in ["2100" , "5240"] :
-        quantity=quantity / 3
-    elif packaging_item in ["2300" , "5250"] :
-        quantity=quantity / 5
-
-    data['lines']['requests'].append({
-        "method" : "POST" ,
-        "id" : str(1) ,
-        "url" : f"{config['company']}/Sales_Order_ExcelSalesLines" ,
-        "headers" : {
-            "Content-Type" : "application/json"
-        } ,
-        "body" : {
-            "Document_No" : document_no ,
-            "Type" : "Item" ,
-            "No" : packaging_item ,
-            "Location_Code" : "PP" ,
-            "Quantity" : quantity
-        }
-    })
-    return data
+    return f"{config['base_url']}/{config['tenant_id']}/{config['environment']}/ODataV4/{config['company']}/Sales_Order_Excel"
 
 
-def add_sharpeners(entries , data , config , document_no) :
+def build_order_header(quantity , customer , entry) :
     """
-    Add sharpeners to the sales order data.
+    Build the sales order header for an order entry.
 
     Parameters:
-    - entries (dict): Order entries.
-    - data (dict): Sales order data.
-    - config (dict): Environment configuration.
-    - document_no (str): Document number.
+    - quantity (int): Total quantity of items.
+    - customer (str): Customer number.
+    - entry (OrderEntry): Order entry.
+
+    Returns:
+    - dict: Sales order header fields.
     """
-    if entries['233'] == "Standard ( plain )" :
-        add_one_item(data , "Item" , int(entries['238']) , "720" , "sharp1" , "PP" , config , document_no)
-    elif entries['233'] == "Customized with color print" :
-        add_one_item(data , "Item" , int(entries['238']) , "722" , "sharp2" , "PP" , config , document_no)
+    invoice=entry.invoice_address
+    order_data={
+        "PTE_Total_Quantity" : int(quantity) ,
+        "PTE_Status_Code" : "19-APPROVAL" ,
+        "Sell_to_Customer_No" : customer ,
+        "Sell_to_Contact" : invoice.contact_first ,
+        "External_Document_No" : entry.external_document_no[:35] if entry.external_document_no != '' else entry.id ,
+        "Sell_to_Address" : invoice.address[:99] ,
+        "Sell_to_Address_2" : invoice.address_2[:49] ,
+        "Sell_to_City" : invoice.city[:29] ,
+        "Sell_to_Post_Code" : invoice.post_code[:19] ,
+        "Sell_to_Country_Region_Code" : country_codes[invoice.country][:9] if invoice.country in country_codes else "" ,
+        "Sell_to_Phone_No" : re.sub(r'\D' , '' , invoice.phone) ,
+        "Sell_to_E_Mail" : entry.email ,
+        "ShippingOptions" : "Custom Address" ,
+        "PTE_Ship_to_Email" : entry.email
+    }
+
+    # The delivery address if the form has a different one, the invoice address otherwise
+    ship_to=entry.ship_to_address
+    order_data.update({
+        "Ship_to_Address" : ship_to.address[:99] ,
+        "Ship_to_Address_2" : ship_to.address_2[:49] ,
+        "Ship_to_City" : ship_to.city[:20] ,
+        "Ship_to_Post_Code" : ship_to.post_code[:19] ,
+        "Ship_to_Country_Region_Code" : country_codes[ship_to.country][:9] if ship_to.country in country_codes else "" ,
+        "Ship_to_Contact" : f"{ship_to.contact_first} {ship_to.contact_last}" ,
+        "PTE_Ship_to_Phone_No" : re.sub(r'\D' , '' , ship_to.phone) ,
+        "Ship_to_Name" : ship_to.company
+    })
+
+    return order_data
@@ -0,0 +1,140 @@
+import codecs
+import json
+import re
+
+_whitespace=re.compile(r'[ \t\n\r]*')
+# Characters that can follow a value, a number that isn't followed by one may continue in the next chunk
+_value_ends=frozenset(' \t\n\r,:]}')
+_decoder=json.JSONDecoder()
+
+
+class ODataPageReader :
+    """
+    Incremental reader of one OData JSON page.
+
+    The items of the page's value array are decoded one at a time while the response
+    body arrives, so memory holds one item and the unread rest of the current chunk,
+    however large the page is. The other members of the page, e.g. '@odata.nextLink',
+    are collected in 'members', which is complete once the items are read.
+    """
+
+    def __init__(self , chunks , array_key='value') :
+        """
+        Parameters:
+        - chunks (Iterable[bytes]): Body of the response, e.g. response.iter_content().
+        - array_key (str): Member holding the items.
+        """
+        self.array_key=array_key
+        self.members={ }
+        self._chunks=iter(chunks)
+        self._utf8=codecs.getincrementaldecoder('utf-8')()
+        self._buffer=""
+        self._position=0
+        self._eof=False
+
+    def __iter__(self) :
+        """
+        Yield the items of the page.
+
+        Raises:
+        - json.JSONDecodeError: If the body is not a JSON object or is cut off.
+        """
+        self._expect('{')
+        if self._peek() == '}' :
+            self._position+=1
+            return
+        while True :
+            key=self._value()
+            if not isinstance(key , str) :
+                raise self._error("Expecting property name")
+            self._expect(':')
+            if key == self.array_key :
+                yield from self._items()
+            else :
+                self.members[key]=self._value()
+            if self._next_of(',}') == '}' :
+                return
+
+    def _items(self) :
+        self._expect('[')
+        if self._peek() == ']' :
+            self._position+=1
+            return
+        while True :
+            yield self._value()
+            if self._next_of(',]') == ']' :
+                return
+
+    def _read(self) :
+        # Drop what was decoded already, the buffer only keeps the unread text
+        self._buffer=self._buffer[self._position :]
+        self._position=0
+        try :
+            chunk=next(self._chunks)
+        except StopIteration :
+            self._buffer+=self._utf8.decode(b"" , final=True)
+            self._eof=True
+            return
+        self._buffer+=self._utf8.decode(chunk)
+
+    def _peek(self) :
+        # Next character after whitespace, empty at the end of the body
+        while True :
+            self._position=_whitespace.match(self._buffer , self._position).end()
+            if self._position < len(self._buffer) :
+                return self._buffer[self._position]
+            if self._eof :
+                return ""
+            self._read()
+
+    def _expect(self , character) :
+        if self._peek() != character :
+            raise self._error(f"Expecting {character!r}")
+        self._position+=1
+
+    def _next_of(self , characters) :
+        character=self._peek()
+        if character == "" or character not in characters :
+            raise self._error(f"Expecting one of {characters!r}")
+        self._position+=1
+        return character
+
+    def _value(self) :
+        self._peek()
+        while True :
+            try :
+                value , end=_decoder.raw_decode(self._buffer , self._position)
+                if self._eof or (end < len(self._buffer) and self._buffer[end] in _value_ends) :
+                    self._position=end
+                    return value
+            except json.JSONDecodeError :
+                if self._eof :
+                    raise
+            self._read()
+
+    def _error(self , message) :
+        return json.JSONDecodeError(message , self._buffer , self._position)
+
+
+def iter_odata_pages(get_page , url , array_key='value') :
+    """
+    Yield the items of an OData collection, following '@odata.nextLink' from page to page.
+
+    Parameters:
+    - get_page (callable): Sends the GET of a page URL and returns the streamed requests.Response.
+    - url (str): URL of the first page.
+    - array_key (str): Member holding the items.
+
+    Returns:
+    - Iterator[dict]: The items of every page, in order.
+    """
+    while url :
+        response=get_page(url)
+        try :
+            response.raise_for_status()
+            reader=ODataPageReader(response.iter_content(65536) , array_key)
+            yield from reader
+        finally :
+            response.close()
+        # The next link carries the $skiptoken of the following page
+        url=reader.members.get('@odata.nextLink')
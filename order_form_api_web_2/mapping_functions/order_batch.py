@@ -0,0 +1,156 @@
+import json
+from mapping_functions import http_client
+from mapping_functions.idempotency import submit_once
+from mapping_functions.instrumentation import stage_timer
+from mapping_functions.mapping_pencils import get_order_plan , build_order_header , get_order_key , map_lines , \
+    order_record , read_order_record
+from mapping_functions.tenants import get_current_tenant
+
+
+class BatchSubmissionError(Exception) :
+    """
+    Raised when Business Central rejects a request of an order $batch. The whole batch is rolled back.
+    """
+
+
+def get_batch_url(config) :
+    """
+    Build the URL of the OData $batch endpoint.
+
+    Parameters:
+    - config (dict): Environment configuration.
+
+    Returns:
+    - str: $batch endpoint URL.
+    """
+    return f"{config['base_url']}/{config['tenant_id']}/{config['environment']}/ODataV4/$batch"
+
+
+def build_order_batch(config , header , line_requests) :
+    """
+    Build a $batch body that creates the sales order header and its lines in one changeset.
+
+    The lines are posted through the header's navigation property, so they don't need the
+    document number that Business Central only assigns when the header is inserted.
+
+    Parameters:
+    - config (dict): Environment configuration.
+    - header (dict): Sales order header fields.
+    - line_requests (List[dict]): Line requests as built by the mapping functions.
+
+    Returns:
+    - dict: $batch request body.
+    """
+    requests=[{
+        "method" : "POST" ,
+        "id" : "header" ,
+        "atomicityGroup" : "order" ,
+        "url" : f"{config['company']}/Sales_Order_Excel" ,
+        "headers" : {
+            "Content-Type" : "application/json"
+        } ,
+        "body" : header
+    }]
+
+    for index , line in enumerate(line_requests) :
+        body={ key : value for key , value in line['body'].items() if key != "Document_No" }
+        requests.append({
+            "method" : "POST" ,
+            "id" : f"line{index}" ,
+            "atomicityGroup" : "order" ,
+            "dependsOn" : ["header"] ,
+            "url" : "$header/Sales_Order_ExcelSalesLines" ,
+            "headers" : line['headers'] ,
+            "body" : body
+        })
+
+    return { "requests" : requests }
+
+
+def submit_order_batch(header , line_requests , access_token) :
+    """
+    Create the sales order header and all lines with a single transactional $batch call.
+
+    Parameters:
+    - header (dict): Sales order header fields.
+    - line_requests (List[dict]): Line requests as built by the mapping functions.
+    - access_token (str): Access token for authentication.
+
+    Returns:
+    - dict: Order record with the document number and the line number of every line request.
+    """
+    config=get_order_plan().config
+    payload=json.dumps(build_order_batch(config , header , line_requests))
+    headers={
+        'Content-Type' : 'application/json' ,
+        'Accept' : 'application/json' ,
+        'Authorization' : f"Bearer {access_token}" ,
+        # Run the batch as one transaction so a failing line rolls back the whole order
+        'Isolation' : 'snapshot'
+    }
+    response=http_client.post(get_batch_url(config) , headers=headers , data=payload)
+    if response.status_code >= 400 :
+        raise BatchSubmissionError(f"Batch rejected with status code {response.status_code}: {response.text}")
+
+    responses={ item['id'] : item for item in response.json().get('responses' , []) }
+    for item in responses.values() :
+        if item.get('status' , 500) >= 400 :
+            message=item.get('body' , { }).get('error' , { }).get('message' , '')
+            raise BatchSubmissionError(f"Batch request {item['id']} failed with status code {item['status']}: {message}")
+
+    return order_record(responses['header']['body']['No'] , [
+        { "id" : line['id'] , "line_no" : responses[f"line{index}"]['body'].get('Line_No') }
+        for index , line in enumerate(line_requests)
+    ])
+
+
+def map_order(entry , data , quantity) :
+    """
+    Map the order entry to a sales order header and line requests without calling Business Central.
+
+    Parameters:
+    - entry (OrderEntry): Order entry.
+    - data (dict): Sales order data.
+    - quantity (int): Total quantity of items.
+
+    Returns:
+    - dict: Order totals, customer number, tenant, header and line requests, ready for submit_order_batch.
+    """
+    # Lines are mapped before the header exists, the batch links them to it
+    data['lines']['requests'].extend(map_lines(get_order_plan() , entry , quantity))
+
+    return {
+        "order" : data['order'] ,
+        "customer_number" : data['customer_number'] ,
+        "tenant" : get_current_tenant().name ,
+        "header" : build_order_header(quantity , data['customer_number'] , entry) ,
+        "lines" : data['lines']['requests']
+    }
+
+
+def map_and_submit_items(entry , data , access_token , quantity) :
+    """
+    Map the items from the order entry and submit the order with its lines in one $batch call.
+
+    Parameters:
+    - entry (OrderEntry): Order entry.
+    - data (dict): Sales order data.
+    - access_token (str): Access token for authentication.
+    - quantity (int): Total quantity of items.
+
+    Returns:
+    - dict: Order totals, the created document number and the line number of every line. The lines
+      are None when the order was created by a /newOrders call that returned the lines to its caller.
+    """
+    order=map_order(entry , data , quantity)
+    with stage_timer('submit_order_batch') :
+        result=read_order_record(submit_once(get_order_key(order['header']) ,
+                                             lambda : submit_order_batch(order['header'] , order['lines'] ,
+                                                                         access_token)))
+
+    return {
+        "order" : order['order'] ,
+        "customer_number" : order['customer_number'] ,
+        "document_no" : result['document_no'] ,
+        "lines" : result['lines']
+    }
@@ -0,0 +1,209 @@
+from mapping_functions.order_plan import PERSONALIZED_PRINTS , MINI_PACKAGING , MULTI_PACKS , NO_PACKAGING , \
+    NO_LANGUAGE , CUSTOMIZED_PACKAGING , PENCIL_FAMILIES , SHARPENERS
+from mapping_functions.product_catalog import get_catalog
+
+DIFFERENT_DELIVERY_ADDRESS="Delivery address is different from invoice"
+
+# Address fields of the form: (company, contact first name, contact last name, address, address 2, city,
+# post code, country, phone)
+INVOICE_ADDRESS_FIELDS=('86' , '89.3' , '89.6' , '87.1' , '87.2' , '87.3' , '87.5' , '87.6' , '307')
+DELIVERY_ADDRESS_FIELDS=('94' , '96.3' , '96.6' , '95.1' , '95.2' , '95.3' , '95.5' , '95.6' , '97')
+
+
+class OrderEntryError(ValueError) :
+    """
+    Raised for an order entry that can't be mapped, the request is rejected before Business Central is called.
+    """
+
+    def __init__(self , field , message) :
+        super().__init__(f"Field {field}: {message}" if field else message)
+        self.field=field
+
+
+class Address :
+    """
+    Postal address and contact of an order entry.
+    """
+    __slots__=('company' , 'contact_first' , 'contact_last' , 'address' , 'address_2' , 'city' , 'post_code' ,
+               'country' , 'phone')
+
+    def __init__(self , company , contact_first , contact_last , address , address_2 , city , post_code , country ,
+                 phone) :
+        self.company=company
+        self.contact_first=contact_first
+        self.contact_last=contact_last
+        self.address=address
+        self.address_2=address_2
+        self.city=city
+        self.post_code=post_code
+        self.country=country
+        self.phone=phone
+
+
+class OrderEntry :
+    """
+    Order entry of the order form, checked and converted once before it is mapped.
+
+    Quantities are ints, empty quantity fields are left out of 'pencil_quantities' and
+    'seed_quantities'. The mapping functions read these attributes instead of the
+    form's field IDs.
+    """
+    __slots__=('id' , 'print_type' , 'personalized' , 'pencil_state' , 'language' , 'language_description' ,
+               'pencil_quantities' , 'seed_quantities' , 'quantity' , 'packaging_choice' , 'packaging_type' ,
+               'packaging_design' , 'customized_packaging' , 'packaging_language' , 'sharpener' ,
+               'sharpener_quantity' , 'external_document_no' , 'email' , 'invoice_address' , 'delivery_address')
+
+    def __init__(self , **fields) :
+        for name in self.__slots__ :
+            setattr(self , name , fields.get(name))
+
+    @property
+    def has_packaging(self) :
+        return self.packaging_choice not in NO_PACKAGING
+
+    @property
+    def ship_to_address(self) :
+        return self.delivery_address or self.invoice_address
+
+    def mapping_key(self) :
+        """
+        Key of the fields the sales order lines are mapped from.
+
+        The ID, customer and addresses only go into the header, entries that differ
+        only in those have the same key. Quantities are listed in the order the
+        parser found them, which is fixed by the catalog.
+
+        Returns:
+        - tuple: Hashable key.
+        """
+        return (self.print_type , self.pencil_state , self.language , self.language_description ,
+                tuple(self.pencil_quantities.items()) , tuple(self.seed_quantities.items()) , self.quantity ,
+                self.packaging_choice , self.packaging_type , self.packaging_design , self.packaging_language ,
+                self.sharpener , self.sharpener_quantity)
+
+
+def _text(entry , field) :
+    if field not in entry :
+        raise OrderEntryError(field , "is missing")
+    value=entry[field]
+    if not isinstance(value , str) :
+        raise OrderEntryError(field , "must be a string")
+    return value
+
+
+def _quantity(entry , field) :
+    if field not in entry :
+        raise OrderEntryError(field , "is missing")
+    value=entry[field]
+    if value == "" :
+        return None
+    if isinstance(value , bool) or not isinstance(value , (str , int)) :
+        raise OrderEntryError(field , "must be a whole number")
+    try :
+        quantity=int(value)
+    except ValueError :
+        raise OrderEntryError(field , f"{value!r} is not a whole number") from None
+    if quantity < 0 :
+        raise OrderEntryError(field , "must not be negative")
+    return quantity
+
+
+def _address(entry , fields) :
+    return Address(*(_text(entry , field) for field in fields))
+
+
+def parse_order_entry(entry , catalog=None) :
+    """
+    Check an order entry and convert it to an OrderEntry.
+
+    Every field the mapping reads is checked here, together with the catalog values it
+    is looked up by, so a bad entry fails before any call to Business Central.
+
+    Parameters:
+    - entry (dict): Order entry as posted by the order form.
+    - catalog (ProductCatalog): Product catalog, the active one if omitted.
+
+    Returns:
+    - OrderEntry: The parsed entry.
+
+    Raises:
+    - OrderEntryError: If a field is missing, malformed or not in the catalog.
+    """
+    if not isinstance(entry , dict) :
+        raise OrderEntryError(None , "entry must be an object")
+    if 'id' not in entry :
+        raise OrderEntryError('id' , "is missing")
+    tables=(catalog or get_catalog()).tables
+
+    print_type=_text(entry , '7')
+    packaging_type=_text(entry , '121')
+    mini=packaging_type in MINI_PACKAGING
+    pencil_state=""
+    if not mini and packaging_type not in MULTI_PACKS :
+        pencil_state=_text(entry , '28')
+        if pencil_state != "" and pencil_state not in tables['state_of_pencils'] :
+            raise OrderEntryError('28' , f"unknown pencil state {pencil_state!r}")
+
+    language=_text(entry , '30')
+    if language in NO_LANGUAGE :
+        language_description=_text(entry , '248')
+    elif language in tables['languages'] :
+        language_description=None
+    else :
+        raise OrderEntryError('30' , f"unknown language {language!r}")
+
+    pencil_quantities={ }
+    seed_quantities={ }
+    for quantity_field , product_key , seed_table , _ , _ in PENCIL_FAMILIES :
+        quantity=_quantity(entry , quantity_field)
+        if quantity is not None :
+            pencil_quantities[product_key]=quantity
+            for key in tables[seed_table] :
+                seed_quantity=_quantity(entry , key)
+                if seed_quantity is not None :
+                    seed_quantities[key]=seed_quantity
+
+    total_quantity=_quantity(entry , '25') if '25' in entry else None
+    quantity=total_quantity or sum(pencil_quantities.values())
+
+    packaging_choice=_text(entry , '119')
+    packaging_design=_text(entry , '111')
+    packaging_language=None
+    if packaging_choice not in NO_PACKAGING :
+        if packaging_type not in tables['packaging_types'] :
+            raise OrderEntryError('121' , f"unknown packaging type {packaging_type!r}")
+        packaging_language=_text(entry , '153') or "Other"
+
+    sharpener=_text(entry , '233')
+    sharpener_quantity=None
+    if sharpener in SHARPENERS :
+        sharpener_quantity=_quantity(entry , '238')
+        if sharpener_quantity is None :
+            raise OrderEntryError('238' , "is required with a sharpener")
+
+    delivery_address=None
+    if _text(entry , '139.1') == DIFFERENT_DELIVERY_ADDRESS :
+        delivery_address=_address(entry , DELIVERY_ADDRESS_FIELDS)
+
+    return OrderEntry(
+        id=entry['id'] ,
+        print_type=print_type ,
+        personalized=print_type in PERSONALIZED_PRINTS ,
+        pencil_state=pencil_state ,
+        language=language ,
+        language_description=language_description ,
+        pencil_quantities=pencil_quantities ,
+        seed_quantities=seed_quantities ,
+        quantity=quantity ,
+        packaging_choice=packaging_choice ,
+        packaging_type=packaging_type ,
+        packaging_design=packaging_design ,
+        customized_packaging=packaging_design == CUSTOMIZED_PACKAGING ,
+        packaging_language=packaging_language ,
+        sharpener=sharpener ,
+        sharpener_quantity=sharpener_quantity ,
+        external_document_no=_text(entry , '125') ,
+        email=_text(entry , '88') ,
+        invoice_address=_address(entry , INVOICE_ADDRESS_FIELDS) ,
+        delivery_address=delivery_address
+    )
@@ -0,0 +1,206 @@
+from mapping_functions.product_catalog import get_catalog
+
+PERSONALIZED_PRINTS=frozenset(["Customized laser engraved" , "Customized color print"])
+COLOR_PRINTS=frozenset(["Customized color print" , "Standard color print"])
+MINI_PACKAGING=frozenset(["Mini Single Card" , "Hanger Tag"])
+MULTI_PACKS=frozenset(["5-Pack" , "3-Pack"])
+NO_PACKAGING=frozenset(["Pencils only" , "" , " "])
+NO_LANGUAGE=frozenset(["Other" , ""])
+CUSTOMIZED_PACKAGING="Customized packaging (Your own design)"
+
+# Pencil families: (quantity field, product key, seed table, fixed state, fixed language).
+# A fixed value of None takes the state or language from the entry.
+PENCIL_FAMILIES=(
+    ('23' , "Pencil_ID_gh" , 'graphite_seeds' , None , None) ,
+    ('24' , "Pencil_ID_cl" , 'color_seeds' , "sp" , None) ,
+    ('152' , "Pencil_ID_ml" , 'multi_color_seeds' , "sp" , "Other")
+)
+
+# Packaging items sold per pack, the pencil quantity is divided by the pack size
+PACKAGING_DIVISORS={ "2100" : 3 , "5240" : 3 , "2300" : 5 , "5250" : 5 }
+
+# Sharpener choice (field 233) -> (item number, line ID), the quantity is taken from field 238
+SHARPENERS={
+    "Standard ( plain )" : ("720" , "sharp1") ,
+    "Customized with color print" : ("722" , "sharp2")
+}
+
+# Fee and service lines in order: (OrderEntry attribute, matching values, item number, line ID, unit price,
+# quantity). An attribute of None always matches, a quantity of None uses the total quantity of the order.
+FEE_RULES=(
+    ('print_type' , PERSONALIZED_PRINTS , "625" , "k1k1" , 10.0 , 1) ,
+    ('packaging_design' , frozenset([CUSTOMIZED_PACKAGING]) , "626" , "k1k2" , 15.0 , 1) ,
+    ('print_type' , COLOR_PRINTS , "100" , "k1k3" , None , None) ,
+    (None , None , "997" , "k1k5" , None , 1)
+)
+
+
+class OrderPlan :
+    """
+    The order mapping rules compiled once at startup.
+
+    The environment configuration is read once and the catalog lookups use the
+    tables the product catalog compiled. A plan is bound to one catalog, a catalog
+    swap compiles a new plan.
+    """
+
+    def __init__(self , config , catalog) :
+        """
+        Parameters:
+        - config (dict): Environment configuration.
+        - catalog (ProductCatalog): Product catalog.
+        """
+        self.config=config
+        self.catalog=catalog
+        self.line_url=f"{config['company']}/Sales_Order_ExcelSalesLines"
+        self._family_items={ }
+        tables=catalog.tables
+        self.state_of_pencils=tables['state_of_pencils']
+        self.personalized_vs_standard=tables['personalized_vs_standard']
+        self.languages=tables['languages']
+        self.families=[(quantity_field , product_key , tables[seed_table] , fixed_state , fixed_lang)
+                       for quantity_field , product_key , seed_table , fixed_state , fixed_lang in PENCIL_FAMILIES]
+
+    def pencil_ids(self , entry) :
+        """
+        Determine the pencil product IDs of the order entry.
+
+        Parameters:
+        - entry (OrderEntry): Order entry.
+
+        Returns:
+        - tuple: Product dictionary and size of the pencils.
+        """
+        packaging_type=entry.packaging_type
+        mini=packaging_type in MINI_PACKAGING
+        size="mini" if mini else "normal"
+        if mini :
+            state="up"
+        elif packaging_type in MULTI_PACKS or entry.pencil_state == "" :
+            state="sp"
+        else :
+            state=self.state_of_pencils[entry.pencil_state]
+
+        personalized=entry.personalized
+        entry_lang='Other' if personalized or mini else entry.language
+
+        product_dict={ }
+        for _ , product_key , _ , fixed_state , fixed_lang in self.families :
+            if product_key in entry.pencil_quantities :
+                product_dict[product_key]=f"{self.personalized_vs_standard[personalized]} " \
+                                          f"{fixed_state or state} {fixed_lang or entry_lang}"
+
+        return product_dict , size
+
+    def add_lines(self , entry , product_dict , size , data , document_no , quantity) :
+        """
+        Add all sales order lines of the order entry.
+
+        Parameters:
+        - entry (OrderEntry): Order entry.
+        - product_dict (dict): Product dictionary from pencil_ids().
+        - size (str): Size of the pencils.
+        - data (dict): Sales order data.
+        - document_no (str): Document number.
+        - quantity (int): Total quantity of items.
+
+        Returns:
+        - dict: Updated sales order data.
+        """
+        lines=data['lines']['requests']
+
+        for _ , product_key , seeds , _ , _ in self.families :
+            if product_key in product_dict :
+                product_id=product_dict[product_key]
+                items=self.catalog.family_items.get((product_id , product_key , size))
+                if items is None :
+                    items=self._get_family_items(product_id , seeds , size)
+                for key in seeds :
+                    if key in entry.seed_quantities :
+                        if key not in items :
+                            raise KeyError(f"{product_id} {seeds[key]} {size}")
+                        lines.append(self._line(str(key) , document_no , items[key] , entry.seed_quantities[key]))
+
+        if entry.has_packaging :
+            lines.append(self._packaging_line(entry , document_no , quantity))
+
+        if entry.sharpener in SHARPENERS :
+            item_no , line_id=SHARPENERS[entry.sharpener]
+            lines.append(self._line(line_id , document_no , item_no , entry.sharpener_quantity))
+
+        if entry.language not in NO_LANGUAGE :
+            lines.append(self._line("898989" , document_no , self.languages[entry.language] , 1))
+        else :
+            lines.append(self._line("89898asd9" , document_no , '604' , 1 , Description=entry.language_description))
+
+        for attribute , values , item_no , line_id , price , fee_quantity in FEE_RULES :
+            if attribute is None or getattr(entry , attribute) in values :
+                line_quantity=quantity if fee_quantity is None else fee_quantity
+                if price is None :
+                    lines.append(self._line(line_id , document_no , item_no , line_quantity))
+                else :
+                    lines.append(self._line(line_id , document_no , item_no , line_quantity , Unit_Price=price))
+
+        return data
+
+    def _get_family_items(self , product_id , seeds , size) :
+        # Product IDs the catalog didn't compile, e.g. an unknown language, are resolved on first use
+        cache_key=(product_id , id(seeds) , size)
+        items=self._family_items.get(cache_key)
+        if items is None :
+            item_dict=self.catalog.tables['item_dict']
+            items={ }
+            for key , seed in seeds.items() :
+                catalog_key=f"{product_id} {seed} {size}"
+                if catalog_key in item_dict :
+                    items[key]=item_dict[catalog_key]
+            self._family_items[cache_key]=items
+        return items
+
+    def _packaging_line(self , entry , document_no , quantity) :
+        packaging_type=entry.packaging_type
+        customized_packaging=entry.customized_packaging
+        lang=entry.packaging_language
+        packaging_item=self.catalog.packaging_index.get((packaging_type , customized_packaging , lang))
+        if packaging_item is None :
+            tables=self.catalog.tables
+            packaging_id=f"{tables['packaging_types'][packaging_type]} " \
+                         f"{(tables['packaging'][customized_packaging] if packaging_type != 'Hanger Tag' else 's')} {lang}"
+            packaging_item=tables['packaging_items'][packaging_id]
+
+        if packaging_item in PACKAGING_DIVISORS :
+            quantity=quantity / PACKAGING_DIVISORS[packaging_item]
+
+        return self._line(str(1) , document_no , packaging_item , quantity)
+
+    def _line(self , line_id , document_no , item_no , quantity , **extra) :
+        return {
+            "method" : "POST" ,
+            "id" : line_id ,
+            "url" : self.line_url ,
+            "headers" : {
+                "Content-Type" : "application/json"
+            } ,
+            "body" : {
+                "Document_No" : document_no ,
+                "Type" : "Item" ,
+                "No" : item_no ,
+                "Location_Code" : "PP" ,
+                "Quantity" : quantity ,
+                **extra
+            }
+        }
+
+
+def compile_order_plan(config , catalog=None) :
+    """
+    Compile the order mapping rules against an environment configuration and a product catalog.
+
+    Parameters:
+    - config (dict): Environment configuration.
+    - catalog (ProductCatalog): Product catalog, the active one if omitted.
+
+    Returns:
+    - OrderPlan: The compiled plan.
+    """
+    return OrderPlan(config , catalog or get_catalog())
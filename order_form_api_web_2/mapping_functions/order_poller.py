@@ -0,0 +1,209 @@
+import json
+import os
+import time
+from urllib.parse import urlencode
+from mapping_functions.bulk_orders import process_bulk
+from mapping_functions.customer_snapshot import get_customer_snapshot
+from mapping_functions.instrumentation import logger
+from mapping_functions.tenants import get_current_tenant
+from mapping_functions.validation import get_access_token , get_credentials , extract_order_batch
+
+
+class EntriesUnavailableError(Exception) :
+    """
+    Raised when Gravity Forms doesn't return the entries after the checkpoint.
+    """
+
+
+def load_checkpoint(path) :
+    """
+    Read the ID of the last processed entry.
+
+    Parameters:
+    - path (str): Checkpoint file.
+
+    Returns:
+    - int: Last processed entry ID, 0 if nothing was processed yet.
+    """
+    try :
+        with open(path , 'r') as file :
+            return int(json.load(file)['last_entry_id'])
+    except (OSError , ValueError , KeyError) :
+        return 0
+
+
+def save_checkpoint(path , last_entry_id) :
+    """
+    Durably store the ID of the last processed entry.
+
+    Parameters:
+    - path (str): Checkpoint file.
+    - last_entry_id (int): Last processed entry ID.
+    """
+    tmp_path=f"{path}.tmp"
+    with open(tmp_path , 'w') as file :
+        json.dump({ 'last_entry_id' : last_entry_id , 'saved_at' : time.time() } , file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path , path)
+
+
+def get_dead_letter_path(checkpoint_path) :
+    """
+    Return the file holding the entries of a checkpoint that need manual handling.
+
+    Parameters:
+    - checkpoint_path (str): Checkpoint file.
+
+    Returns:
+    - str: Dead-letter file, next to the checkpoint.
+    """
+    return f"{os.path.splitext(checkpoint_path)[0]}.dead_letter.jsonl"
+
+
+def save_dead_letter(path , entry , reason , detail=None) :
+    """
+    Durably append an entry the poller can't submit, before the checkpoint moves past it.
+
+    An entry may be appended twice if the poller stops between this and saving the checkpoint.
+
+    Parameters:
+    - path (str): Dead-letter file.
+    - entry (dict): Order entry.
+    - reason (str): 'no_customer' or 'invalid'.
+    - detail (dict): Result of the failed submission, if any.
+    """
+    record={ 'entry_id' : entry.get('id') , 'reason' : reason , 'detail' : detail , 'entry' : entry ,
+             'saved_at' : time.time() }
+    with open(path , 'a') as file :
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def build_entries_url(order_endpoint , last_entry_id , page_size) :
+    """
+    Build the URL of the page of entries after the checkpoint, oldest first.
+
+    Parameters:
+    - order_endpoint (str): Gravity Forms entries endpoint.
+    - last_entry_id (int): Last processed entry ID.
+    - page_size (int): Entries per page.
+
+    Returns:
+    - str: Entries URL.
+    """
+    query=urlencode({
+        'search' : json.dumps({ 'field_filters' : [{ 'key' : 'id' , 'value' : str(last_entry_id) , 'operator' : '>' }] }) ,
+        'sorting[key]' : 'id' ,
+        'sorting[direction]' : 'ASC' ,
+        'sorting[is_numeric]' : 'true' ,
+        'paging[page_size]' : page_size
+    })
+    return f"{order_endpoint}{'&' if '?' in order_endpoint else '?'}{query}"
+
+
+def find_customer_number(entry , access_token) :
+    """
+    Determine the customer of an entry that came in without a webhook.
+
+    Without a customer field, the entry is only assigned to a customer that is the single
+    match of its VAT number and phone. An email domain or name match, or several
+    customers, is left for manual handling.
+
+    Parameters:
+    - entry (dict): Order entry.
+    - access_token (str): Access token for authentication.
+
+    Returns:
+    - str: Customer number from the entry's customer field or the unambiguous match, otherwise None.
+    """
+    customer_field=os.getenv('POLLER_CUSTOMER_FIELD')
+    if customer_field and entry.get(customer_field) :
+        return entry[customer_field]
+
+    try :
+        customers_found=get_customer_snapshot().get_index(access_token).match_identity(entry['138'] , entry['307'])
+    except KeyError :
+        return None
+    return customers_found[0]['value'] if len(customers_found) == 1 else None
+
+
+def poll_once(checkpoint_path , page_size=50 , workers=4) :
+    """
+    Process every entry created since the checkpoint, as orders of the current tenant.
+
+    The checkpoint only moves past an entry once it and all older entries of its page
+    succeeded, so a failed entry is picked up again by the next poll. Entries that did
+    succeed are not submitted twice, the idempotency store replays them. Entries a retry
+    can't fix, without a customer or rejected by the mapping, are saved to the dead-letter
+    file for manual handling and skipped.
+
+    Parameters:
+    - checkpoint_path (str): Checkpoint file.
+    - page_size (int): Entries fetched per page.
+    - workers (int): Orders submitted in parallel.
+
+    Returns:
+    - dict: Number of processed, failed and skipped entries.
+
+    Raises:
+    - EntriesUnavailableError: If a page of entries can't be fetched, the checkpoint keeps the pages before it.
+    """
+    ck=os.getenv('CK')
+    cs , order_endpoint , _=get_credentials()
+    tenant=get_current_tenant()
+    access_token=get_access_token(tenant.bc_id)
+    last_entry_id=load_checkpoint(checkpoint_path)
+    dead_letter_path=get_dead_letter_path(checkpoint_path)
+    summary={ 'processed' : 0 , 'failed' : 0 , 'skipped' : 0 }
+
+    while True :
+        batch=extract_order_batch(ck , cs , build_entries_url(order_endpoint , last_entry_id , page_size))
+        # A failed request is not an empty page, the poll must not report success
+        if batch is None :
+            raise EntriesUnavailableError(f"Entries after {last_entry_id} could not be fetched")
+        entries=batch.get('entries' , [])
+        if not entries :
+            return summary
+
+        orders=[]
+        succeeded=set()
+        for index , entry in enumerate(entries) :
+            customer_number=find_customer_number(entry , access_token)
+            if customer_number is None :
+                # Retrying can't resolve a missing customer, the entry needs manual handling
+                save_dead_letter(dead_letter_path , entry , 'no_customer')
+                logger.warning("Entry %s skipped, no unambiguous customer, saved to %s" , entry.get('id') ,
+                               dead_letter_path)
+                summary['skipped']+=1
+                succeeded.add(index)
+            else :
+                orders.append((index , { 'entry' : entry , 'customer_no' : customer_number }))
+
+        results=process_bulk([order for _ , order in orders] , access_token , concurrency=workers)
+        for result in results :
+            if result['status'] in ('created' , 'replayed') :
+                succeeded.add(orders[result['index']][0])
+                summary['processed']+=1
+            elif result['status'] == 'invalid' :
+                # Like a missing customer, an entry the mapping rejects won't map on a retry
+                save_dead_letter(dead_letter_path , orders[result['index']][1]['entry'] , 'invalid' , result)
+                logger.warning("Entry %s skipped, invalid %s: %s, saved to %s" , result.get('entry_id') ,
+                               result.get('field') , result.get('error') , dead_letter_path)
+                summary['skipped']+=1
+                succeeded.add(orders[result['index']][0])
+            else :
+                summary['failed']+=1
+                logger.error("Entry %s failed, retried by the next poll: %s %s" , result.get('entry_id') ,
+                             result['status'] , result.get('error'))
+
+        # Advance over the leading run of succeeded entries only
+        for index , entry in enumerate(entries) :
+            if index not in succeeded :
+                break
+            last_entry_id=int(entry['id'])
+        save_checkpoint(checkpoint_path , last_entry_id)
+
+        if len(succeeded) < len(entries) or len(entries) < page_size :
+            return summary
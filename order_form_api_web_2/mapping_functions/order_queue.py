@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from mapping_functions.circuit_breaker import CircuitOpenError
+from mapping_functions.idempotency import submit_once , OrderInProgressError
+from mapping_functions.instrumentation import logger
+from mapping_functions.mapping_pencils import read_order_record
+from mapping_functions.order_batch import submit_order_batch
+from mapping_functions.tenants import tenants , get_tenant , use_tenant
+
+
+class OrderQueue :
+    """
+    Local SQLite queue of mapped orders waiting to be submitted to Business Central.
+
+    An order is stored with its header and line requests, so it is submitted later
+    as one $batch without mapping the entry again. Orders are keyed by their
+    idempotency key, queuing the same order twice returns the first ticket. An
+    order that was given up is queued again under its ticket when it is resubmitted. The
+    database is shared by all workers on the host, a claimed order is held by one
+    submitter until it finishes or 'claim_timeout' seconds pass.
+    """
+
+    def __init__(self , path , max_attempts=10 , claim_timeout=300) :
+        """
+        Parameters:
+        - path (str): SQLite database file.
+        - max_attempts (int): Failed submissions after which an order is given up.
+        - claim_timeout (int): Seconds after which an unfinished claim may be taken over.
+        """
+        self.path=path
+        self.max_attempts=max_attempts
+        self.claim_timeout=claim_timeout
+        self._local=threading.local()
+
+    def _connection(self) :
+        # SQLite connections can't cross threads or forks, keep one per thread and process
+        connection=getattr(self._local , 'connection' , None)
+        if connection is None or self._local.pid != os.getpid() :
+            connection=sqlite3.connect(self.path , timeout=30 , isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                "ticket TEXT PRIMARY KEY, key TEXT NOT NULL UNIQUE, status TEXT NOT NULL, payload TEXT NOT NULL, "
+                "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS orders_status ON orders (status, next_attempt_at)")
+            self._local.connection=connection
+            self._local.pid=os.getpid()
+        return connection
+
+    def enqueue(self , key , order) :
+        """
+        Queue a mapped order, or queue it again if it was given up.
+
+        Parameters:
+        - key (str): Idempotency key of the order.
+        - order (dict): Mapped order, see map_order in order_batch.
+
+        Returns:
+        - str: Ticket of the order.
+        """
+        now=time.time()
+        connection=self._connection()
+        # A resubmission gets a fresh set of attempts, submit_once replays the order if it was created after all
+        connection.execute(
+            "INSERT INTO orders (ticket, key, status, payload, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET status = 'queued', payload = excluded.payload, attempts = 0, "
+            "error = NULL, next_attempt_at = excluded.next_attempt_at, updated_at = excluded.updated_at "
+            "WHERE status = 'failed'" , (uuid.uuid4().hex , key , json.dumps(order) , now , now , now))
+        return connection.execute("SELECT ticket FROM orders WHERE key = ?" , (key ,)).fetchone()[0]
+
+    def get(self , ticket) :
+        """
+        Look up an order by ticket.
+
+        Parameters:
+        - ticket (str): Ticket of the order.
+
+        Returns:
+        - dict: Status, result, error and attempts, None for an unknown ticket.
+        """
+        row=self._connection().execute(
+            "SELECT status, result, error, attempts, created_at, updated_at FROM orders WHERE ticket = ?" ,
+            (ticket ,)).fetchone()
+        if row is None :
+            return None
+        status , result , error , attempts , created_at , updated_at=row
+        return {
+            'ticket' : ticket , 'status' : status , 'result' : json.loads(result) if result else None ,
+            'error' : error , 'attempts' : attempts , 'created_at' : created_at , 'updated_at' : updated_at
+        }
+
+    def claim(self , limit=10) :
+        """
+        Claim queued orders that are due for submission.
+
+        Parameters:
+        - limit (int): Maximum number of orders.
+
+        Returns:
+        - List[tuple]: (ticket, key, order, attempts) of the claimed orders.
+        """
+        now=time.time()
+        connection=self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try :
+            rows=connection.execute(
+                "SELECT ticket, key, payload, attempts FROM orders "
+                "WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'submitting' AND updated_at < ?) "
+                "ORDER BY next_attempt_at LIMIT ?" , (now , now - self.claim_timeout , limit)).fetchall()
+            connection.executemany("UPDATE orders SET status = 'submitting', updated_at = ? WHERE ticket = ?" ,
+                                   [(now , row[0]) for row in rows])
+            connection.execute("COMMIT")
+        except Exception :
+            connection.execute("ROLLBACK")
+            raise
+        return [(ticket , key , json.loads(payload) , attempts) for ticket , key , payload , attempts in rows]
+
+    def complete(self , ticket , result) :
+        """
+        Store the result of a submitted order.
+
+        Parameters:
+        - ticket (str): Ticket of the order.
+        - result (dict): Submission result.
+        """
+        self._connection().execute(
+            "UPDATE orders SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE ticket = ?" ,
+            (json.dumps(result) , time.time() , ticket))
+
+    def retry(self , ticket , error , delay , count_attempt=True) :
+        """
+        Put a claimed order back in the queue after a failed submission.
+
+        Parameters:
+        - ticket (str): Ticket of the order.
+        - error (str): Failure message.
+        - delay (float): Seconds until the next attempt.
+        - count_attempt (bool): Count the failure against max_attempts.
+        """
+        now=time.time()
+        connection=self._connection()
+        connection.execute(
+            "UPDATE orders SET status = CASE WHEN attempts + ? >= ? THEN 'failed' ELSE 'queued' END, "
+            "attempts = attempts + ?, error = ?, next_attempt_at = ?, updated_at = ? WHERE ticket = ?" ,
+            (int(count_attempt) , self.max_attempts , int(count_attempt) , error , now + delay , now , ticket))
+
+    def count(self , status) :
+        """
+        Count the orders in a status.
+
+        Parameters:
+        - status (str): 'queued', 'submitting', 'done' or 'failed'.
+
+        Returns:
+        - int: Number of orders.
+        """
+        return self._connection().execute("SELECT COUNT(*) FROM orders WHERE status = ?" , (status ,)).fetchone()[0]
+
+
+# Queue shared by the workers on this host
+order_queue=OrderQueue(
+    os.getenv('ORDER_QUEUE_DB' , 'order_queue.sqlite3') ,
+    max_attempts=int(os.getenv('ORDER_QUEUE_MAX_ATTEMPTS' , 10))
+)
+
+
+def submit_queued(queue , access_token=None , limit=10) :
+    """
+    Submit queued orders that are due, as one $batch each.
+
+    Every order is submitted for the tenant it was accepted for. Failed submissions
+    are retried with exponential backoff. While Business Central's circuit is open,
+    orders wait for it without using up their attempts.
+
+    Parameters:
+    - queue (OrderQueue): The queue.
+    - access_token (str): Access token for authentication, the token of each order's tenant if omitted.
+    - limit (int): Maximum number of orders.
+
+    Returns:
+    - dict: Number of submitted and failed orders.
+    """
+    from mapping_functions.validation import get_access_token
+
+    summary={ 'submitted' : 0 , 'failed' : 0 }
+    for ticket , key , order , attempts in queue.claim(limit) :
+        try :
+            # Orders queued before tenants were configured belong to the default tenant
+            with use_tenant(get_tenant(order.get('tenant'))) as tenant :
+                token=access_token or get_access_token(tenant.bc_id)
+                result=read_order_record(
+                    submit_once(key , lambda : submit_order_batch(order['header'] , order['lines'] , token)))
+        except CircuitOpenError as e :
+            queue.retry(ticket , str(e) , e.retry_after , count_attempt=False)
+            summary['failed']+=1
+            continue
+        except OrderInProgressError as e :
+            queue.retry(ticket , str(e) , 30 , count_attempt=False)
+            summary['failed']+=1
+            continue
+        except Exception as e :
+            logger.exception("Queued order %s failed" , ticket)
+            queue.retry(ticket , str(e) , min(600 , 5 * 2 ** attempts))
+            summary['failed']+=1
+            continue
+
+        queue.complete(ticket , {
+            "order" : order['order'] ,
+            "customer_number" : order['customer_number'] ,
+            "document_no" : result['document_no'] ,
+            "lines" : result['lines']
+        })
+        summary['submitted']+=1
+    return summary
+
+
+class OrderSubmitter :
+    """
+    Pool of background threads draining the order queue to Business Central.
+
+    Every worker process runs its own pool, the queue hands each order to one of them.
+    Access tokens are taken from the token cache of each order's tenant.
+    """
+
+    def __init__(self , queue , threads=2 , interval=1.0 , batch_size=10) :
+        """
+        Parameters:
+        - queue (OrderQueue): The queue.
+        - threads (int): Submitter threads per process.
+        - interval (float): Seconds a thread waits when the queue has nothing due.
+        - batch_size (int): Orders claimed at a time.
+        """
+        self.queue=queue
+        self.threads=threads
+        self.interval=interval
+        self.batch_size=batch_size
+        self._pid=None
+        self._lock=threading.Lock()
+        self._stop=threading.Event()
+
+    def start(self) :
+        """
+        Start the pool in this process, threads don't survive a fork so a forked worker starts its own.
+        """
+        with self._lock :
+            if self._pid == os.getpid() :
+                return
+            self._pid=os.getpid()
+            for _ in range(self.threads) :
+                threading.Thread(target=self._run , daemon=True).start()
+
+    def stop(self) :
+        self._stop.set()
+
+    def _run(self) :
+        while not self._stop.is_set() :
+            try :
+                summary=submit_queued(self.queue , limit=self.batch_size)
+            except Exception :
+                logger.exception("Order submitter failed")
+                summary={ 'submitted' : 0 , 'failed' : 0 }
+            if summary['submitted'] + summary['failed'] == 0 :
+                self._stop.wait(self.interval)
+
+
+# Submitters of this worker, started by start_order_submitter
+order_submitter=OrderSubmitter(
+    order_queue ,
+    threads=int(os.getenv('ORDER_SUBMITTERS' , 2)) ,
+    interval=float(os.getenv('ORDER_SUBMIT_INTERVAL' , 1))
+)
+
+
+def start_order_submitter() :
+    """
+    Start this worker's order submitters if a tenant has its business center configured.
+
+    Returns:
+    - bool: True if the submitters run.
+    """
+    if not any(tenant.bc_id for tenant in tenants) :
+        return False
+    order_submitter.start()
+    return True
+
+
+if __name__ == '__main__' :
+    # Replay orders spooled while Business Central was unavailable:
+    #   python -m mapping_functions.order_queue [--bc-id <business center id>]
+    from mapping_functions.validation import get_access_token
+
+    parser=argparse.ArgumentParser(description="Submit queued orders to Business Central")
+    parser.add_argument('--bc-id' , help="Submit every order with this business center's token")
+    parser.add_argument('--limit' , type=int , default=100)
+    args=parser.parse_args()
+
+    access_token=get_access_token(args.bc_id) if args.bc_id else None
+    print('Replay finished:' , submit_queued(order_queue , access_token , args.limit))
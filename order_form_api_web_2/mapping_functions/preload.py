@@ -0,0 +1,74 @@
+import gc
+import os
+from mapping_functions import product_catalog
+from mapping_functions.customer_snapshot import get_customer_snapshot
+from mapping_functions.instrumentation import logger , metrics
+from mapping_functions.order_queue import start_order_submitter
+from mapping_functions.tenants import tenants , use_tenant
+from mapping_functions.validation import get_access_token
+
+
+def warm_caches() :
+    """
+    Fill the token caches and the customer snapshots of every tenant ahead of the first request.
+
+    Importing the app already compiled the catalog, the order plans and the /catalog
+    bundle. A tenant's token and customers are loaded when its business center ID is
+    set, the customers only while PRELOAD_CUSTOMERS is not 0. Failures are logged,
+    the caches then fill on first use.
+
+    Returns:
+    - List[CustomerSnapshot]: The customer snapshots that are loaded.
+    """
+    snapshots=[]
+    for tenant in tenants :
+        if not tenant.bc_id :
+            continue
+        with use_tenant(tenant) :
+            try :
+                access_token=get_access_token(tenant.bc_id)
+                if os.getenv('PRELOAD_CUSTOMERS' , '1') == '1' :
+                    snapshot=get_customer_snapshot()
+                    snapshot.get_index(access_token)
+                    if os.getenv('CUSTOMER_MATCH_MODE') == 'fuzzy' :
+                        snapshot.get_fuzzy_index(access_token)
+                    snapshots.append(snapshot)
+            except Exception :
+                logger.exception("cache warm-up of tenant %s failed, the caches fill on first use" , tenant.name)
+    return snapshots
+
+
+def warm_master() :
+    """
+    Build the shared structures in a preloaded gunicorn master before the workers are forked.
+
+    After warming the caches the customer indexes are packed and every object is frozen
+    into the permanent GC generation, so the collectors in the workers don't write to
+    the pages they share with the master.
+    """
+    for snapshot in warm_caches() :
+        snapshot.index.compact()
+        logger.info("preloaded %d customers" , len(snapshot.customers))
+
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork_worker() :
+    """
+    Set up the per-process state of a worker forked from a preloaded master.
+    """
+    # Observations of the master's warm-up would otherwise be reported by every worker
+    metrics.reset()
+    product_catalog.after_fork()
+
+
+def warm_worker() :
+    """
+    Warm the caches of a worker before it accepts connections and start its order submitters.
+
+    A worker forked from a preloaded master finds the caches warm already. The
+    submitters start on every worker, so orders queued before a restart are sent.
+    """
+    warm_caches()
+    start_order_submitter()
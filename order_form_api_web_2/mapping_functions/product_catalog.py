@@ -0,0 +1,354 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from Product_Catalog.VarianCodes import ProductHierarchy , variants
+from mapping_functions.instrumentation import logger
+from mapping_functions.json_fast import dumps
+
+HIERARCHY_TABLES=(
+    'initial_choice' , 'packaging_options' , 'state_of_pencils' , 'personalized_vs_standard' , 'graphite_seeds' ,
+    'color_seeds' , 'multi_color_seeds' , 'packaging_types' , 'packaging' , 'languages' , 'country_codes'
+)
+VARIANT_TABLES=('item_dict' , 'packaging_items')
+CATALOG_TABLES=HIERARCHY_TABLES + VARIANT_TABLES
+
+# Tables order mapping can't work without, the others may be left out of a catalog file
+REQUIRED_TABLES=(
+    'state_of_pencils' , 'personalized_vs_standard' , 'graphite_seeds' , 'color_seeds' , 'multi_color_seeds' ,
+    'packaging_types' , 'packaging' , 'languages' , 'item_dict' , 'packaging_items'
+)
+
+# Tables keyed by True/False, stored as "true"/"false" in catalog files
+BOOL_KEY_TABLES=frozenset(['personalized_vs_standard' , 'packaging'])
+
+# Pencil families: (product key, seed table, fixed state, fixed language), as in order_plan.PENCIL_FAMILIES
+PENCIL_FAMILIES=(
+    ("Pencil_ID_gh" , 'graphite_seeds' , None , None) ,
+    ("Pencil_ID_cl" , 'color_seeds' , "sp" , None) ,
+    ("Pencil_ID_ml" , 'multi_color_seeds' , "sp" , "Other")
+)
+SIZES=("normal" , "mini")
+
+
+class CatalogError(Exception) :
+    """
+    Raised when a catalog file can't be read or fails validation.
+    """
+
+
+class ProductCatalog :
+    """
+    Catalog tables with lookup tables compiled from them.
+
+    item_dict and packaging_items are keyed by formatted composite strings. The
+    compiled tables resolve every combination the order form can produce to tuple
+    keys once, so mapping an order doesn't format and look up strings per line.
+    """
+
+    def __init__(self , tables , source='modules') :
+        """
+        Parameters:
+        - tables (dict): Catalog tables by name.
+        - source (str): Where the tables were loaded from.
+        """
+        self.tables=tables
+        self.source=source
+        self.version=hashlib.sha256(dumps(tables)).hexdigest()[:16]
+        self.family_items={ }
+        self.packaging_index={ }
+        self.missing=[]
+        self._compile()
+
+    def _compile(self) :
+        item_dict=self.tables['item_dict']
+        for product_key , seed_table , fixed_state , fixed_lang in PENCIL_FAMILIES :
+            seeds=self.tables[seed_table]
+            for size in SIZES :
+                for product_id in self._product_ids(size , fixed_state , fixed_lang) :
+                    items={ }
+                    for key , seed in seeds.items() :
+                        catalog_key=f"{product_id} {seed} {size}"
+                        if catalog_key in item_dict :
+                            items[key]=item_dict[catalog_key]
+                        else :
+                            self.missing.append(f"item_dict: {catalog_key}")
+                    self.family_items[(product_id , product_key , size)]=items
+
+        packaging_items=self.tables['packaging_items']
+        packaging=self.tables['packaging']
+        self.missing.extend(f"packaging: {str(customized).lower()}" for customized in (False , True)
+                            if customized not in packaging)
+        for packaging_type , type_code in self.tables['packaging_types'].items() :
+            for customized in (False , True) :
+                if customized not in packaging and packaging_type != 'Hanger Tag' :
+                    continue
+                for lang in self._languages() :
+                    packaging_id=f"{type_code} " \
+                                 f"{(packaging[customized] if packaging_type != 'Hanger Tag' else 's')} {lang}"
+                    if packaging_id in packaging_items :
+                        self.packaging_index[(packaging_type , customized , lang)]=packaging_items[packaging_id]
+                    else :
+                        self.missing.append(f"packaging_items: {packaging_id}")
+
+    def _languages(self) :
+        return list(self.tables['languages']) + ([] if 'Other' in self.tables['languages'] else ['Other'])
+
+    def _product_ids(self , size , fixed_state , fixed_lang) :
+        # The product IDs OrderPlan.pencil_ids() produces for one family and size
+        product_ids=[]
+        for personalized , prefix in self.tables['personalized_vs_standard'].items() :
+            if size == "mini" :
+                states , langs=["up"] , ["Other"]
+            else :
+                states=sorted(set(self.tables['state_of_pencils'].values()) | { "sp" })
+                langs=["Other"] if personalized else self._languages()
+            for state in [fixed_state] if fixed_state else states :
+                for lang in [fixed_lang] if fixed_lang else langs :
+                    product_ids.append(f"{prefix} {state} {lang}")
+        return product_ids
+
+    def validate(self) :
+        """
+        Check the catalog for combinations the order form can produce but the catalog lacks.
+
+        Returns:
+        - List[str]: Problems found, empty if the catalog is complete.
+        """
+        return list(self.missing)
+
+
+def catalog_from_modules() :
+    """
+    Build the catalog from the Product_Catalog modules shipped with the code.
+
+    Returns:
+    - ProductCatalog: The catalog.
+    """
+    tables={ name : getattr(ProductHierarchy , name) for name in HIERARCHY_TABLES }
+    tables.update({ name : getattr(variants , name) for name in VARIANT_TABLES })
+    return ProductCatalog(tables)
+
+
+def decode_key(table , key) :
+    if table in BOOL_KEY_TABLES :
+        if key not in ('true' , 'false') :
+            raise CatalogError(f"{table}: key {key!r} must be true or false")
+        return key == 'true'
+    return key
+
+
+def load_catalog_file(path) :
+    """
+    Load a catalog file.
+
+    Supported formats, chosen by extension:
+    - .json: {"tables": {"<table>": {"<key>": <value>, ...}, ...}}
+    - .csv: rows of table,key,value with a header row
+    - .sqlite, .sqlite3, .db: a catalog table with the columns table_name, key, value
+
+    Parameters:
+    - path (str): Catalog file.
+
+    Returns:
+    - ProductCatalog: The compiled catalog.
+    """
+    extension=os.path.splitext(path)[1].lower()
+    tables={ }
+    try :
+        if extension == '.json' :
+            with open(path , 'r' , encoding='utf-8') as file :
+                document=json.load(file)
+            for table , rows in document['tables'].items() :
+                tables[table]={ decode_key(table , key) : value for key , value in rows.items() }
+        elif extension == '.csv' :
+            with open(path , 'r' , encoding='utf-8' , newline='') as file :
+                for row in csv.DictReader(file) :
+                    tables.setdefault(row['table'] , { })[decode_key(row['table'] , row['key'])]=row['value']
+        elif extension in ('.sqlite' , '.sqlite3' , '.db') :
+            connection=sqlite3.connect(f"file:{path}?mode=ro" , uri=True)
+            try :
+                for table , key , value in connection.execute("SELECT table_name, key, value FROM catalog") :
+                    tables.setdefault(table , { })[decode_key(table , key)]=value
+            finally :
+                connection.close()
+        else :
+            raise CatalogError(f"Unsupported catalog format: {path}")
+    except (OSError , ValueError , KeyError , AttributeError , sqlite3.Error) as error :
+        raise CatalogError(f"Can't read catalog {path}: {error}") from error
+
+    missing_tables=[name for name in REQUIRED_TABLES if name not in tables]
+    if missing_tables :
+        raise CatalogError(f"Catalog {path} lacks the tables {', '.join(missing_tables)}")
+    for name in CATALOG_TABLES :
+        tables.setdefault(name , { })
+    return ProductCatalog(tables , source=path)
+
+
+_catalog=catalog_from_modules()
+_swap_lock=threading.Lock()
+_swap_listeners=[]
+
+
+def get_catalog() :
+    """
+    Return the active catalog.
+
+    Returns:
+    - ProductCatalog: The active catalog.
+    """
+    return _catalog
+
+
+def add_swap_listener(listener) :
+    """
+    Register a function called with the new catalog after every swap.
+
+    Parameters:
+    - listener (callable): Called as listener(catalog).
+    """
+    _swap_listeners.append(listener)
+
+
+def swap_catalog(catalog) :
+    """
+    Make a catalog the active one.
+
+    Requests that already hold the previous catalog finish with it.
+
+    Parameters:
+    - catalog (ProductCatalog): The new catalog.
+    """
+    global _catalog
+    with _swap_lock :
+        for listener in _swap_listeners :
+            listener(catalog)
+        _catalog=catalog
+    logger.info("catalog %s from %s is active" , catalog.version , catalog.source)
+
+
+def load_and_swap(path) :
+    """
+    Load, validate and activate a catalog file. An invalid catalog is rejected.
+
+    Parameters:
+    - path (str): Catalog file.
+
+    Returns:
+    - ProductCatalog: The new active catalog.
+    """
+    catalog=load_catalog_file(path)
+    problems=catalog.validate()
+    if problems :
+        raise CatalogError(f"Catalog {path} has {len(problems)} problems, first: {problems[:5]}")
+    swap_catalog(catalog)
+    return catalog
+
+
+class CatalogWatcher :
+    """
+    Reloads the catalog file in the background when its modification time changes.
+    """
+
+    def __init__(self , path , interval=30) :
+        """
+        Parameters:
+        - path (str): Catalog file.
+        - interval (float): Seconds between checks.
+        """
+        self.path=path
+        self.interval=interval
+        self.mtime=None
+        self._stop=threading.Event()
+        self._thread=None
+        self._pid=None
+
+    def check(self) :
+        """
+        Reload the catalog if the file changed since the last check.
+
+        Returns:
+        - bool: True if a new catalog was activated.
+        """
+        try :
+            mtime=os.stat(self.path).st_mtime_ns
+        except OSError :
+            logger.warning("catalog file %s is not readable" , self.path)
+            return False
+        if mtime == self.mtime :
+            return False
+
+        self.mtime=mtime
+        try :
+            load_and_swap(self.path)
+        except CatalogError :
+            logger.exception("catalog reload rejected, keeping catalog %s" , get_catalog().version)
+            return False
+        return True
+
+    def start(self) :
+        """
+        Start the watcher thread in this process, threads don't survive a fork so a forked worker starts its own.
+        """
+        if self._pid == os.getpid() :
+            return
+        self._pid=os.getpid()
+        self._thread=threading.Thread(target=self._run , daemon=True)
+        self._thread.start()
+
+    def stop(self) :
+        self._stop.set()
+
+    def _run(self) :
+        while not self._stop.wait(self.interval) :
+            self.check()
+
+
+def start_catalog_watcher() :
+    """
+    Load CATALOG_FILE and watch it for changes, if it is set.
+
+    Returns:
+    - CatalogWatcher: The running watcher, None without CATALOG_FILE.
+    """
+    path=os.getenv('CATALOG_FILE')
+    if not path :
+        return None
+
+    watcher=CatalogWatcher(path , float(os.getenv('CATALOG_RELOAD_INTERVAL' , 30)))
+    watcher.mtime=os.stat(path).st_mtime_ns
+    # A bad catalog at startup stops the worker instead of serving stale data
+    load_and_swap(path)
+    watcher.start()
+    _watchers.append(watcher)
+    return watcher
+
+
+_watchers=[]
+
+
+def after_fork() :
+    """
+    Restart the catalog watchers in a worker forked from a preloaded master.
+    """
+    global _swap_lock
+    _swap_lock=threading.Lock()
+    for watcher in _watchers :
+        watcher.start()
+
+
+if __name__ == '__main__' :
+    # Validate a catalog file before deploying it:
+    #   python -m mapping_functions.product_catalog catalog.json
+    try :
+        problems=load_catalog_file(sys.argv[1]).validate()
+    except CatalogError as error :
+        print(error)
+        sys.exit(2)
+    for problem in problems :
+        print(problem)
+    print(f"{len(problems)} problems found")
+    sys.exit(1 if problems else 0)
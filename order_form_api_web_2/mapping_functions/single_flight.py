@@ -0,0 +1,46 @@
+import threading
+
+
+class SingleFlight :
+    """
+    Coalesces identical concurrent calls: the first caller runs the call and every
+    caller that arrives while it runs gets the same result or exception.
+    """
+
+    def __init__(self) :
+        self._calls={ }
+        self._lock=threading.Lock()
+
+    def do(self , key , function) :
+        """
+        Run a call once per key at a time.
+
+        Parameters:
+        - key: Hashable identity of the call.
+        - function (callable): The call, without arguments.
+
+        Returns:
+        - The result of the call. Callers share it and must not mutate it.
+        """
+        with self._lock :
+            call=self._calls.get(key)
+            leader=call is None
+            if leader :
+                call=self._calls[key]={ 'done' : threading.Event() , 'result' : None , 'error' : None }
+
+        if not leader :
+            call['done'].wait()
+            if call['error'] is not None :
+                raise call['error']
+            return call['result']
+
+        try :
+            call['result']=function()
+            return call['result']
+        except Exception as error :
+            call['error']=error
+            raise
+        finally :
+            with self._lock :
+                del self._calls[key]
+            call['done'].set()
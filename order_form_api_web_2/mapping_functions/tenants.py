@@ -0,0 +1,269 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+
+# Tenant settings and the environment variables they default to. TENANTS_FILE only lists what differs.
+TENANT_SETTINGS={
+    'base_url' : 'BASEURL' ,
+    'tenant_id' : 'TENANTID' ,
+    'orders_environment' : 'TESTENVIRONMENT' ,
+    'customers_environment' : 'PRODENVIRNMENT' ,
+    'company' : 'COMPANYEU' ,
+    'customer_endpoint' : 'CUSTOMERENDPOINT' ,
+    'bc_id' : 'BCID' ,
+    'scope' : 'SCOPE' ,
+    'token_url' : 'TOKEN_URL' ,
+    'client_secret' : 'CLIENT_SECRET' ,
+    'grant_type' : 'GRANT_TYPE'
+}
+
+# Name of the tenant configured by the environment alone
+DEFAULT_TENANT='default'
+
+
+class UnknownTenantError(KeyError) :
+    """
+    Raised when a request selects a tenant the registry doesn't know.
+    """
+
+    def __init__(self , name) :
+        super().__init__(name)
+        self.name=name
+
+    def __str__(self) :
+        return f"Unknown tenant {self.name}"
+
+
+class TenantBusyError(Exception) :
+    """
+    Raised instead of serving a request when its tenant already has 'max_concurrency' requests in flight.
+    """
+
+    def __init__(self , name , retry_after) :
+        super().__init__(f"Tenant {name} is busy, retry in {retry_after} seconds")
+        self.name=name
+        self.retry_after=retry_after
+
+
+class Tenant :
+    """
+    One Business Central company served by this deployment.
+
+    Holds the connection settings of the company and caps its requests in flight, so
+    one slow company can't take every worker thread. The HTTP pool, token cache,
+    order plan and customer snapshot of a tenant are kept by their modules, keyed by
+    the tenant's name.
+    """
+
+    def __init__(self , name , settings , max_concurrency=8 , queue_timeout=1.0 , pool_size=10) :
+        """
+        Parameters:
+        - name (str): Tenant name used to select it.
+        - settings (dict): Values of TENANT_SETTINGS.
+        - max_concurrency (int): Requests of the tenant served at the same time by a worker.
+        - queue_timeout (float): Seconds a request waits for a free slot before it is turned away.
+        - pool_size (int): HTTP connections kept open to the tenant's hosts.
+        """
+        self.name=name
+        for setting in TENANT_SETTINGS :
+            setattr(self , setting , settings.get(setting))
+        self.max_concurrency=max_concurrency
+        self.queue_timeout=queue_timeout
+        self.pool_size=pool_size
+        self._slots=threading.BoundedSemaphore(max_concurrency)
+
+    def get_order_config(self) :
+        """
+        Return the environment configuration sales orders are created with.
+
+        Returns:
+        - dict: base_url, tenant_id, environment and company.
+        """
+        return {
+            "base_url" : self.base_url ,
+            "tenant_id" : self.tenant_id ,
+            "environment" : self.orders_environment ,
+            "company" : self.company
+        }
+
+    def acquire(self) :
+        """
+        Take one of the tenant's request slots, release() gives it back.
+
+        Raises:
+        - TenantBusyError: If no slot frees up within 'queue_timeout' seconds.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout) :
+            raise TenantBusyError(self.name , max(1 , round(self.queue_timeout)))
+
+    def release(self) :
+        self._slots.release()
+
+    @contextlib.contextmanager
+    def slot(self) :
+        """
+        Hold one of the tenant's request slots for the code in the block.
+        """
+        self.acquire()
+        try :
+            yield self
+        finally :
+            self.release()
+
+    def get_status(self) :
+        """
+        Return the tenant's settings without secrets.
+
+        Returns:
+        - dict: Company, environments and limits.
+        """
+        return {
+            'company' : self.company , 'tenant_id' : self.tenant_id , 'orders_environment' : self.orders_environment ,
+            'customers_environment' : self.customers_environment , 'max_concurrency' : self.max_concurrency ,
+            'pool_size' : self.pool_size
+        }
+
+
+def resolve_setting(value) :
+    # "env:NAME" reads the value from the environment, so secrets stay out of TENANTS_FILE
+    if isinstance(value , str) and value.startswith('env:') :
+        return os.getenv(value[4 :])
+    return value
+
+
+def create_tenant(name , overrides=None) :
+    """
+    Create a tenant from the environment and its overrides.
+
+    Parameters:
+    - name (str): Tenant name.
+    - overrides (dict): Settings and limits that differ from the environment.
+
+    Returns:
+    - Tenant: The tenant.
+    """
+    overrides={ key : resolve_setting(value) for key , value in (overrides or { }).items() }
+    unknown=set(overrides) - set(TENANT_SETTINGS) - { 'max_concurrency' , 'queue_timeout' , 'pool_size' }
+    if unknown :
+        raise ValueError(f"Tenant {name} has unknown settings: {', '.join(sorted(unknown))}")
+
+    settings={ setting : overrides.get(setting , os.getenv(variable))
+               for setting , variable in TENANT_SETTINGS.items() }
+    return Tenant(
+        name ,
+        settings ,
+        max_concurrency=int(overrides.get('max_concurrency' , os.getenv('TENANT_MAX_CONCURRENCY' , 8))) ,
+        queue_timeout=float(overrides.get('queue_timeout' , os.getenv('TENANT_QUEUE_TIMEOUT' , 1))) ,
+        pool_size=int(overrides.get('pool_size' , os.getenv('HTTP_POOL_SIZE' , 10)))
+    )
+
+
+class TenantRegistry :
+    """
+    The tenants of this deployment, loaded once at startup.
+    """
+
+    def __init__(self , tenants , default) :
+        """
+        Parameters:
+        - tenants (List[Tenant]): The tenants.
+        - default (str): Name of the tenant serving requests that don't select one.
+        """
+        self.tenants={ tenant.name : tenant for tenant in tenants }
+        if default not in self.tenants :
+            raise ValueError(f"Default tenant {default} is not configured")
+        self.default=self.tenants[default]
+
+    def get(self , name=None) :
+        """
+        Look up a tenant.
+
+        Parameters:
+        - name (str): Tenant name, the default tenant if empty.
+
+        Returns:
+        - Tenant: The tenant.
+
+        Raises:
+        - UnknownTenantError: If no tenant has the name.
+        """
+        if not name :
+            return self.default
+        tenant=self.tenants.get(name)
+        if tenant is None :
+            raise UnknownTenantError(name)
+        return tenant
+
+    def __iter__(self) :
+        return iter(self.tenants.values())
+
+
+def load_tenants(path=None) :
+    """
+    Load the tenant registry.
+
+    TENANTS_FILE is a JSON document {"default": "EU", "tenants": {"EU": {...}, "UK": {...}}}
+    whose tenants override the settings in TENANT_SETTINGS, e.g. "company". Without a
+    file the registry holds the single tenant 'default' configured by the environment.
+
+    Parameters:
+    - path (str): Registry file, TENANTS_FILE if omitted.
+
+    Returns:
+    - TenantRegistry: The registry.
+    """
+    path=path or os.getenv('TENANTS_FILE')
+    if not path :
+        return TenantRegistry([create_tenant(DEFAULT_TENANT)] , DEFAULT_TENANT)
+
+    with open(path) as file :
+        document=json.load(file)
+    tenants=[create_tenant(name , overrides) for name , overrides in document['tenants'].items()]
+    return TenantRegistry(tenants , document.get('default' , next(iter(document['tenants']))))
+
+
+# Registry of this deployment
+tenants=load_tenants()
+
+# Tenant the current request is served for, set by use_tenant
+current_tenant_var=contextvars.ContextVar('tenant' , default=None)
+
+
+def get_tenant(name=None) :
+    """
+    Look up a tenant of the registry.
+
+    Parameters:
+    - name (str): Tenant name, the default tenant if empty.
+
+    Returns:
+    - Tenant: The tenant.
+    """
+    return tenants.get(name)
+
+
+def get_current_tenant() :
+    """
+    Return the tenant the current request is served for.
+
+    Returns:
+    - Tenant: The selected tenant, the default tenant outside of use_tenant.
+    """
+    return current_tenant_var.get() or tenants.default
+
+
+@contextlib.contextmanager
+def use_tenant(tenant) :
+    """
+    Serve the code in the block for a tenant.
+
+    Parameters:
+    - tenant (Tenant): The tenant.
+    """
+    token=current_tenant_var.set(tenant)
+    try :
+        yield tenant
+    finally :
+        current_tenant_var.reset(token)
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from mapping_functions.instrumentation import logger
+
+try :
+    import fcntl
+except ImportError :  # Windows has no fcntl, the shared store is then disabled
+    fcntl=None
+
+
+class FileTokenStore :
+    """
+    Share access tokens between gunicorn workers through a local JSON file.
+
+    The file is guarded by an exclusive lock on a sidecar lock file, so only one
+    worker at a time fetches a token from the identity provider. The others wait
+    for the lock and then read the token it stored.
+    """
+
+    def __init__(self , path) :
+        self.path=path
+        self.lock_path=f"{path}.lock"
+
+    def _read_all(self) :
+        try :
+            with open(self.path , 'r') as file :
+                return json.load(file)
+        except (OSError , ValueError) :
+            return { }
+
+    def read(self , key) :
+        """
+        Read a stored token.
+
+        Parameters:
+        - key (str): Store key of the token.
+
+        Returns:
+        - dict: Token with 'access_token' and 'expires_at', or None if not stored.
+        """
+        return self._read_all().get(key)
+
+    def write(self , key , token) :
+        """
+        Store a token, replacing the file atomically.
+
+        Parameters:
+        - key (str): Store key of the token.
+        - token (dict): Token with 'access_token' and 'expires_at'.
+        """
+        tokens=self._read_all()
+        now=time.time()
+        tokens={ k : v for k , v in tokens.items() if v.get('expires_at' , 0) > now }
+        tokens[key]=token
+
+        tmp_path=f"{self.path}.{os.getpid()}.tmp"
+        fd=os.open(tmp_path , os.O_WRONLY | os.O_CREAT | os.O_TRUNC , 0o600)
+        with os.fdopen(fd , 'w') as file :
+            json.dump(tokens , file)
+        os.replace(tmp_path , self.path)
+
+    def acquire(self) :
+        """
+        Take the cross-worker fetch lock.
+
+        Returns:
+        - file: Open lock file, pass it to release().
+        """
+        lock_file=open(self.lock_path , 'a')
+        fcntl.flock(lock_file , fcntl.LOCK_EX)
+        return lock_file
+
+    def release(self , lock_file) :
+        """
+        Release the cross-worker fetch lock.
+
+        Parameters:
+        - lock_file (file): Lock file returned by acquire().
+        """
+        fcntl.flock(lock_file , fcntl.LOCK_UN)
+        lock_file.close()
+
+
+class TokenCache :
+    """
+    Per-worker cache of OAuth access tokens keyed by business center ID and scope.
+
+    Tokens are kept until their 'expires_in' runs out and are refreshed in a
+    background thread once they are within 'refresh_margin' seconds of expiry.
+    Concurrent misses for the same key wait for a single fetch, at most 'wait_timeout'
+    seconds, so a hung identity provider call doesn't hold up every request for the key.
+    """
+
+    def __init__(self , fetcher , refresh_margin=60 , store_path=None , wait_timeout=30) :
+        """
+        Parameters:
+        - fetcher (callable): fetcher(bc_id, scope) returning (access_token, expires_in) or None.
+        - refresh_margin (int): Seconds before expiry at which a background refresh starts.
+        - store_path (str): Optional file used to share tokens across workers.
+        - wait_timeout (float): Seconds a caller waits for the fetch of another caller before giving up.
+        """
+        self.fetcher=fetcher
+        self.refresh_margin=refresh_margin
+        self.wait_timeout=wait_timeout
+        self.store=FileTokenStore(store_path) if store_path and fcntl is not None else None
+        self.stats={ 'hits' : 0 , 'misses' : 0 , 'refreshes' : 0 , 'wait_timeouts' : 0 }
+        self._tokens={ }
+        self._inflight={ }
+        self._refreshing=set()
+        self._lock=threading.Lock()
+
+    def get(self , bc_id , scope) :
+        """
+        Return a valid access token, fetching one only when none is cached.
+
+        Parameters:
+        - bc_id (str): Business center ID.
+        - scope (str): OAuth scope.
+
+        Returns:
+        - str: Access token if successful, otherwise None.
+        """
+        key=(bc_id , scope)
+        now=time.time()
+
+        with self._lock :
+            token=self._tokens.get(key)
+            if token is not None and token['expires_at'] > now :
+                self.stats['hits']+=1
+                if token['expires_at'] - now <= self.refresh_margin and key not in self._refreshing :
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh , args=(key ,) , daemon=True).start()
+                return token['access_token']
+
+            self.stats['misses']+=1
+            waiter=self._inflight.get(key)
+            leader=waiter is None
+            if leader :
+                waiter=self._inflight[key]=threading.Event()
+
+        # Only the first caller fetches, everybody else waits for its result
+        if not leader :
+            if not waiter.wait(self.wait_timeout) :
+                logger.warning("Token fetch for %s still running after %s seconds, giving up" , bc_id ,
+                               self.wait_timeout)
+                with self._lock :
+                    self.stats['wait_timeouts']+=1
+            with self._lock :
+                token=self._tokens.get(key)
+            return token['access_token'] if token is not None and token['expires_at'] > time.time() else None
+
+        try :
+            token=self._load(key)
+        finally :
+            with self._lock :
+                del self._inflight[key]
+            waiter.set()
+
+        return token['access_token'] if token is not None else None
+
+    def get_stats(self) :
+        """
+        Return the cache counters.
+
+        Returns:
+        - dict: Hit, miss, refresh and wait timeout counts plus the number of cached tokens.
+        """
+        with self._lock :
+            return { **self.stats , 'cached' : len(self._tokens) }
+
+    def clear(self) :
+        """
+        Drop all tokens cached in this worker.
+        """
+        with self._lock :
+            self._tokens.clear()
+
+    def _refresh(self , key) :
+        try :
+            with self._lock :
+                self.stats['refreshes']+=1
+            self._load(key , force=True)
+        except Exception :
+            logger.exception("Token refresh failed")
+        finally :
+            with self._lock :
+                self._refreshing.discard(key)
+
+    def _load(self , key , force=False) :
+        if self.store is None :
+            return self._fetch(key)
+
+        store_key=f"{key[0]}|{key[1]}"
+        lock_file=self.store.acquire()
+        try :
+            # Another worker may have fetched the token while we waited for the lock
+            token=self.store.read(store_key)
+            if token is not None and token['expires_at'] - time.time() > (self.refresh_margin if force else 0) :
+                with self._lock :
+                    self._tokens[key]=token
+                return token
+
+            token=self._fetch(key)
+            if token is not None :
+                self.store.write(store_key , token)
+            return token
+        finally :
+            self.store.release(lock_file)
+
+    def _fetch(self , key) :
+        result=self.fetcher(*key)
+        if result is None :
+            return None
+
+        access_token , expires_in=result
+        token={ 'access_token' : access_token , 'expires_at' : time.time() + expires_in }
+        with self._lock :
+            self._tokens[key]=token
+        return token
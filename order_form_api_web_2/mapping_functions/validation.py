@@ -1,48 +1,112 @@
 import os
-import requests
+import threading
+from mapping_functions import http_client
+from mapping_functions.tenants import get_current_tenant, get_tenant, use_tenant
+from mapping_functions.token_cache import TokenCache
 
 def get_environment_config():
     """
     Retrieve environment configuration variables.
 
+    The token settings are those of the tenant, see tenants.TENANT_SETTINGS.
+
     Returns:
     - dict: Dictionary containing the environment configuration.
     """
+    tenant = get_current_tenant()
     return {
-        "client_secret": os.getenv("CLIENT_SECRET"),
-        "grant_type": os.getenv("GRANT_TYPE"),
-        "scope": os.getenv("SCOPE"),
-        "token_url": os.getenv('TOKEN_URL'),
+        "client_secret": tenant.client_secret,
+        "grant_type": tenant.grant_type,
+        "scope": tenant.scope,
+        "token_url": tenant.token_url,
         "cs": os.getenv('CS'),
         "order_endpoint": os.getenv('ORDERENDPOINT'),
         "delete_endpoint": os.getenv('DELETEENDPOINT')
     }
 
-def get_access_token(bc_id):
+def fetch_access_token(bc_id, scope, tenant=None):
     """
-    Retrieve access token using the provided business center ID.
+    Request a new access token from the identity provider.
 
     Parameters:
     - bc_id (str): Business center ID.
+    - scope (str): OAuth scope.
+    - tenant (Tenant): Tenant whose credentials are used, the current one if omitted.
 
     Returns:
-    - str: Access token if successful, otherwise None.
+    - tuple: Access token and its lifetime in seconds if successful, otherwise None.
     """
-    config = get_environment_config()
+    tenant = tenant or get_current_tenant()
     data = {
         "client_id": bc_id,
-        "scope": config["scope"],
-        "client_secret": config["client_secret"],
-        "grant_type": config["grant_type"],
+        "scope": scope,
+        "client_secret": tenant.client_secret,
+        "grant_type": tenant.grant_type,
     }
 
-    response = requests.post(config["token_url"], data=data)
+    # Background refreshes have no current tenant, the call goes through the tenant's pool all the same
+    with use_tenant(tenant):
+        response = http_client.post(tenant.token_url, data=data)
     if response.status_code == 200:
-        return response.json()["access_token"]
+        body = response.json()
+        return body["access_token"], int(body.get("expires_in", 3599))
     else:
         print('Error:', response.text)
         return None
 
+_token_caches = {}
+_token_caches_lock = threading.Lock()
+
+def get_token_cache(tenant=None):
+    """
+    Return the token cache of a tenant, creating it on first use.
+
+    Tokens of different tenants never share a cache, and the tokens of a tenant
+    other than the default one are shared across workers in their own file.
+
+    Parameters:
+    - tenant (Tenant): The tenant, the current one if omitted.
+
+    Returns:
+    - TokenCache: The tenant's token cache.
+    """
+    tenant = tenant or get_current_tenant()
+    cache = _token_caches.get(tenant.name)
+    if cache is None:
+        with _token_caches_lock:
+            cache = _token_caches.get(tenant.name)
+            if cache is None:
+                store_path = os.getenv('TOKEN_CACHE_FILE')
+                if store_path and tenant is not get_tenant():
+                    store_path = f"{store_path}.{tenant.name}"
+                # Background refreshes run outside of any request, the fetcher keeps its tenant
+                cache = _token_caches[tenant.name] = TokenCache(
+                    lambda bc_id, scope: fetch_access_token(bc_id, scope, tenant),
+                    refresh_margin=int(os.getenv('TOKEN_REFRESH_MARGIN', 60)),
+                    store_path=store_path,
+                    wait_timeout=float(os.getenv('TOKEN_WAIT_TIMEOUT', 30))
+                )
+    return cache
+
+# Token cache of the default tenant
+token_cache = get_token_cache(get_tenant())
+
+def get_access_token(bc_id):
+    """
+    Retrieve access token using the provided business center ID.
+
+    The token is served from the current tenant's token cache and is only requested
+    from the tenant's token URL when it is missing or expired.
+
+    Parameters:
+    - bc_id (str): Business center ID.
+
+    Returns:
+    - str: Access token if successful, otherwise None.
+    """
+    tenant = get_current_tenant()
+    return get_token_cache(tenant).get(bc_id, tenant.scope)
+
 def get_credentials():
     """
     Retrieve credentials and endpoints from environment configuration.
@@ -65,9 +129,7 @@ def extract_order_batch(ck, cs, url_get_orders):
     Returns:
     - dict: Extracted order data if successful, otherwise None.
     """
-    session = requests.Session()
-    session.auth = (ck, cs)
-    response = session.get(url_get_orders)
+    response = http_client.get(url_get_orders, auth=(ck, cs))
     if response.status_code == 200:
         data = response.json()
         print(response.status_code, "Accessed", sep=" ")
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import time
+from mapping_functions.instrumentation import configure_logging , logger
+from mapping_functions.order_poller import poll_once
+from mapping_functions.product_catalog import start_catalog_watcher
+from mapping_functions.tenants import get_tenant , use_tenant
+
+# Pull-mode order intake: picks up the entries the webhooks missed.
+#   python poller.py --once
+#   python poller.py --interval 60 --workers 4
+#   python poller.py --tenant UK --checkpoint poller_checkpoint_uk.json
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Poll Gravity Forms for new entries and submit them as orders")
+    parser.add_argument('--checkpoint' , default=os.getenv('POLLER_CHECKPOINT' , 'poller_checkpoint.json'))
+    parser.add_argument('--interval' , type=float , default=60 , help="Seconds between polls")
+    parser.add_argument('--page-size' , type=int , default=50)
+    parser.add_argument('--workers' , type=int , default=4)
+    parser.add_argument('--once' , action='store_true' , help="Poll once and exit")
+    parser.add_argument('--tenant' , help="Tenant the orders are created for, the default tenant if omitted")
+    args=parser.parse_args()
+    configure_logging()
+    tenant=get_tenant(args.tenant)
+    start_catalog_watcher()
+
+    while True :
+        try :
+            with use_tenant(tenant) :
+                summary=poll_once(args.checkpoint , page_size=args.page_size , workers=args.workers)
+            logger.info("Poll finished: %s" , summary)
+        except Exception :
+            logger.exception("Poll failed")
+            if args.once :
+                sys.exit(1)
+        if args.once :
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,101 @@
+import argparse
+import gc
+import os
+import sys
+
+# Single entry point for running the service. gunicorn_config.py holds the settings,
+# the options below override them through the same environment variables.
+#   python serve.py                              gunicorn, production settings
+#   python serve.py --worker-class sync --workers 4
+#   python serve.py --asgi                       ASGI entry point under uvicorn
+#   python serve.py --dev                        Flask development server
+#   python serve.py --print-config
+
+APP_DIR=os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH=os.path.join(APP_DIR , 'gunicorn_config.py')
+
+OVERRIDES={
+    'bind' : 'GUNICORN_BIND' ,
+    'workers' : 'GUNICORN_WORKERS' ,
+    'threads' : 'GUNICORN_THREADS' ,
+    'worker_class' : 'GUNICORN_WORKER_CLASS' ,
+    'timeout' : 'GUNICORN_TIMEOUT' ,
+    'max_requests' : 'GUNICORN_MAX_REQUESTS'
+}
+
+SETTINGS=('bind' , 'backlog' , 'worker_class' , 'workers' , 'threads' , 'worker_connections' , 'timeout' ,
+          'graceful_timeout' , 'keepalive' , 'max_requests' , 'max_requests_jitter' , 'preload_app')
+
+
+def load_settings() :
+    """
+    Evaluate gunicorn_config.py with the current environment.
+
+    Returns:
+    - dict: Settings by name.
+    """
+    settings={ '__file__' : CONFIG_PATH , '__name__' : 'gunicorn_config' }
+    gc_enabled=gc.isenabled()
+    with open(CONFIG_PATH , 'r') as file :
+        exec(compile(file.read() , CONFIG_PATH , 'exec') , settings)
+    # The config disables GC for gunicorn's preloading master, not for this process
+    if gc_enabled :
+        gc.enable()
+    return settings
+
+
+def run_gunicorn() :
+    from gunicorn.app.wsgiapp import WSGIApplication
+
+    sys.argv=['gunicorn' , '-c' , CONFIG_PATH , '--chdir' , APP_DIR , 'app:app']
+    WSGIApplication("%(prog)s [OPTIONS] [APP_MODULE]").run()
+
+
+def run_uvicorn(settings) :
+    import uvicorn
+
+    host , _ , port=settings['bind'].rpartition(':')
+    uvicorn.run('asgi:app' , host=host , port=int(port) , workers=settings['workers'] ,
+                backlog=settings['backlog'] , timeout_keep_alive=settings['keepalive'] , app_dir=APP_DIR)
+
+
+def run_dev_server(settings) :
+    sys.path.insert(0 , APP_DIR)
+    from app import app
+
+    host , _ , port=settings['bind'].rpartition(':')
+    app.run(debug=True , host=host , port=int(port))
+
+
+if __name__ == '__main__' :
+    parser=argparse.ArgumentParser(description="Run the order form API")
+    mode=parser.add_mutually_exclusive_group()
+    mode.add_argument('--asgi' , action='store_true' , help="Run the ASGI entry point under uvicorn")
+    mode.add_argument('--dev' , action='store_true' , help="Run the Flask development server")
+    mode.add_argument('--print-config' , action='store_true' , help="Print the effective settings and exit")
+    parser.add_argument('--bind')
+    parser.add_argument('--workers' , type=int)
+    parser.add_argument('--threads' , type=int)
+    parser.add_argument('--worker-class' , choices=['sync' , 'gthread' , 'gevent'])
+    parser.add_argument('--timeout' , type=int)
+    parser.add_argument('--max-requests' , type=int)
+    parser.add_argument('--no-preload' , action='store_true' , help="Import the app in every worker")
+    args=parser.parse_args()
+
+    for option , variable in OVERRIDES.items() :
+        value=getattr(args , option)
+        if value is not None :
+            os.environ[variable]=str(value)
+    if args.no_preload :
+        os.environ['GUNICORN_PRELOAD']='0'
+
+    if args.print_config :
+        settings=load_settings()
+        for name in SETTINGS :
+            print(f"{name} = {settings[name]!r}")
+    elif args.asgi :
+        run_uvicorn(load_settings())
+    elif args.dev :
+        run_dev_server(load_settings())
+    else :
+        run_gunicorn()
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0 , os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The stores are created when their modules are imported, keep them out of the working directory
+state_dir=tempfile.mkdtemp(prefix='order_form_tests_')
+os.environ.setdefault('IDEMPOTENCY_DB' , os.path.join(state_dir , 'order_state.sqlite3'))
+os.environ.setdefault('ORDER_QUEUE_DB' , os.path.join(state_dir , 'order_queue.sqlite3'))
+
+
+@pytest.fixture
+def idempotency_store(tmp_path , monkeypatch) :
+    """
+    A fresh idempotency store in place of the shared one, in every module that imported it.
+    """
+    from mapping_functions.idempotency import IdempotencyStore
+
+    store=IdempotencyStore(str(tmp_path / 'idempotency.sqlite3'))
+    for name , module in list(sys.modules.items()) :
+        if name.startswith('mapping_functions') and hasattr(module , 'idempotency_store') :
+            monkeypatch.setattr(module , 'idempotency_store' , store)
+    return store
+
+
+@pytest.fixture
+def order_queue(tmp_path , monkeypatch) :
+    """
+    A fresh order queue in place of the shared one, in every module that imported it.
+    """
+    from mapping_functions.order_queue import OrderQueue
+
+    queue=OrderQueue(str(tmp_path / 'order_queue.sqlite3'))
+    for name , module in list(sys.modules.items()) :
+        if name.startswith('mapping_functions') and hasattr(module , 'order_queue') and \
+                not isinstance(getattr(module , 'order_queue') , type(sys)) :
+            monkeypatch.setattr(module , 'order_queue' , queue)
+    return queue
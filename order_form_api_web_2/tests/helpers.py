@@ -0,0 +1,38 @@
+def make_entry(entry_id=1 , **fields) :
+    """
+    Build an order entry of the form that maps without the production product catalog.
+
+    Parameters:
+    - entry_id (int): Gravity Forms entry ID.
+    - fields: Form fields to override, by field ID.
+
+    Returns:
+    - dict: Order entry.
+    """
+    entry={
+        'id' : str(entry_id) ,
+        '7' : "Customized laser engraved" ,
+        '23' : "" , '24' : "" , '152' : "" ,
+        '25' : "250" ,
+        '28' : "" ,
+        '30' : "Other" ,
+        '86' : f"Company {entry_id} ApS" ,
+        '87.1' : "Main Street 1" , '87.2' : "" , '87.3' : "Copenhagen" , '87.5' : "2100" , '87.6' : "Denmark" ,
+        '88' : f"buyer{entry_id}@company{entry_id}.dk" ,
+        '89.3' : "Jane" , '89.6' : "Doe" ,
+        '94' : "" , '95.1' : "" , '95.2' : "" , '95.3' : "" , '95.5' : "" , '95.6' : "" ,
+        '96.3' : "" , '96.6' : "" , '97' : "" ,
+        '111' : "" ,
+        '119' : "Pencils only" ,
+        '121' : "Mini Single Card" ,
+        '125' : f"PO-{entry_id}" ,
+        '138' : f"DK{10000000 + entry_id}" ,
+        '139.1' : "" ,
+        '153' : "" ,
+        '233' : "No thanks not this time" ,
+        '238' : "" ,
+        '248' : "Danish" ,
+        '307' : f"+45 {20000000 + entry_id}"
+    }
+    entry.update(fields)
+    return entry
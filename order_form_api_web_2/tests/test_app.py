@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip('flask')
+import app as app_module
+from helpers import make_entry
+from mapping_functions.idempotency import OrderInProgressError
+
+
+@pytest.fixture
+def client() :
+    return app_module.app.test_client()
+
+
+def test_a_retry_of_an_order_in_flight_gets_409(client , monkeypatch) :
+    def map_items(entry , order_data , access_token , quantity) :
+        raise OrderInProgressError('sales_order:default:C00001:PO-1' , retry_after=7)
+
+    monkeypatch.setattr(app_module , 'map_items' , map_items)
+    response=client.post('/newOrders' , json={ 'entry' : make_entry() , 'customer_no' : 'C00001' , 'ac' : 'token' })
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '7'
+    assert 'already being submitted' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('bc_id , submitters , status' , [('bc' , True , 202) , ('' , True , 503) , ('bc' , False , 503)])
+def test_orders_are_spooled_only_with_submitters(bc_id , submitters , status , client , order_queue , monkeypatch) :
+    from mapping_functions.circuit_breaker import CircuitOpenError
+    from mapping_functions.tenants import get_tenant
+
+    def map_items(entry , order_data , access_token , quantity) :
+        raise CircuitOpenError('business_central' , 12)
+
+    monkeypatch.setattr(app_module , 'map_items' , map_items)
+    monkeypatch.setattr(app_module , 'order_queue' , order_queue)
+    monkeypatch.setattr(app_module , 'start_order_submitter' , lambda : submitters)
+    monkeypatch.setattr(get_tenant() , 'bc_id' , bc_id)
+    response=client.post('/newOrders' , json={ 'entry' : make_entry() , 'customer_no' : 'C00001' , 'ac' : 'token' ,
+                                               'spool' : True })
+    assert response.status_code == status
+    assert order_queue.count('queued') == (1 if status == 202 else 0)
+
+
+def test_preview_maps_the_lines_without_creating_the_order(client , monkeypatch) :
+    from mapping_functions import http_client
+    from mapping_functions.mapping_pencils import PREVIEW_DOCUMENT_NO
+
+    def post(url , **kwargs) :
+        raise AssertionError("posted to Business Central")
+
+    monkeypatch.setattr(http_client , 'post' , post)
+    response=client.post('/newOrders/preview' , json={ 'entry' : make_entry() , 'customer_no' : 'C00001' })
+    assert response.status_code == 200
+    lines=response.get_json()['lines']['requests']
+    assert lines
+    assert { line['body']['Document_No'] for line in lines } == { PREVIEW_DOCUMENT_NO }
+
+
+def test_preview_rejects_an_invalid_entry(client) :
+    response=client.post('/newOrders/preview' , json={ 'entry' : make_entry(**{ '25' : "many" }) })
+    assert response.status_code == 400
+    assert response.get_json()['field'] == '25'
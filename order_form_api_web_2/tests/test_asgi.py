@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('flask')
+import asgi
+from helpers import make_entry
+
+
+def call_new_orders(payload) :
+    body=json.dumps(payload).encode()
+    received=[{ 'type' : 'http.request' , 'body' : body , 'more_body' : False }]
+    sent=[]
+
+    async def receive() :
+        return received.pop(0)
+
+    async def send(message) :
+        sent.append(message)
+
+    scope={ 'type' : 'http' , 'path' : '/newOrders' , 'method' : 'POST' , 'headers' : [] }
+    asyncio.run(asgi.new_orders(scope , receive , send))
+    return body , sent
+
+
+@pytest.mark.parametrize('options' , [{ 'submit_batch' : True } , { 'accept' : 'async' } , { 'spool' : True }])
+def test_orders_needing_the_flask_route_are_handed_to_it(options , monkeypatch) :
+    handed=[]
+
+    async def wsgi_app(scope , receive , send) :
+        handed.append(await asgi.read_body(receive))
+
+    monkeypatch.setattr(asgi , 'wsgi_app' , wsgi_app)
+    body , sent=call_new_orders({ 'entry' : { } , **options })
+    assert handed == [body]
+    assert sent == []
+
+
+def test_plain_orders_stay_on_the_event_loop(monkeypatch) :
+    async def wsgi_app(scope , receive , send) :
+        raise AssertionError("handed to the Flask app")
+
+    monkeypatch.setattr(asgi , 'wsgi_app' , wsgi_app)
+    _ , sent=call_new_orders({ 'entry' : { } })
+    # The empty entry is rejected by the native route
+    assert sent[0]['status'] == 400
+
+
+def test_plain_orders_hold_a_tenant_slot(monkeypatch) :
+    from mapping_functions.tenants import get_tenant
+
+    tenant=get_tenant()
+    monkeypatch.setattr(tenant , 'queue_timeout' , 0.05)
+    for _ in range(tenant.max_concurrency) :
+        tenant.acquire()
+    try :
+        _ , sent=call_new_orders({ 'entry' : make_entry() , 'customer_no' : 'C00001' , 'ac' : 'token' })
+    finally :
+        for _ in range(tenant.max_concurrency) :
+            tenant.release()
+
+    assert sent[0]['status'] == 503
+    assert (b'retry-after' , b'1') in sent[0]['headers']
+
+
+def test_an_open_circuit_gets_503(monkeypatch) :
+    from mapping_functions.circuit_breaker import CircuitOpenError
+
+    async def map_items_async(client , entry , order_data , access_token , quantity) :
+        raise CircuitOpenError('business_central' , 12)
+
+    monkeypatch.setattr(asgi , 'map_items_async' , map_items_async)
+    _ , sent=call_new_orders({ 'entry' : make_entry() , 'customer_no' : 'C00001' , 'ac' : 'token' })
+    assert sent[0]['status'] == 503
+    assert (b'retry-after' , b'12') in sent[0]['headers']
+
+
+def test_a_retry_of_an_order_in_flight_gets_409(monkeypatch) :
+    from mapping_functions.idempotency import OrderInProgressError
+
+    async def map_items_async(client , entry , order_data , access_token , quantity) :
+        raise OrderInProgressError('sales_order:default:C00001:PO-1' , retry_after=7)
+
+    monkeypatch.setattr(asgi , 'map_items_async' , map_items_async)
+    _ , sent=call_new_orders({ 'entry' : make_entry() , 'customer_no' : 'C00001' , 'ac' : 'token' })
+    assert sent[0]['status'] == 409
+    assert (b'retry-after' , b'7') in sent[0]['headers']
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from mapping_functions import async_orders
+from mapping_functions.async_orders import map_items_async
+from mapping_functions.mapping_pencils import create_order_data
+from mapping_functions.order_entry import parse_order_entry
+from mapping_functions.tenants import Tenant
+from helpers import make_entry
+
+
+class Response :
+    status_code=201
+
+    def json(self) :
+        return { 'No' : "SO000001" }
+
+
+class Client :
+    async def post(self , url , headers=None , content=None) :
+        return Response()
+
+
+def test_store_calls_run_off_the_event_loop(idempotency_store , monkeypatch) :
+    threads=[]
+    for method in ('claim' , 'complete') :
+        original=getattr(idempotency_store , method)
+
+        def record(*args , original=original , method=method) :
+            threads.append((method , threading.get_ident()))
+            return original(*args)
+
+        monkeypatch.setattr(idempotency_store , method , record)
+
+    async def submit() :
+        entry=parse_order_entry(make_entry())
+        data , quantity=create_order_data(entry , 'C0001')
+        return threading.get_ident() , await map_items_async(Client() , entry , data , 'token' , quantity)
+
+    loop_thread , data=asyncio.run(submit())
+    assert [method for method , _ in threads] == ['claim' , 'complete']
+    assert all(thread != loop_thread for _ , thread in threads)
+    assert { line['body']['Document_No'] for line in data['lines']['requests'] } == { "SO000001" }
+
+
+def test_every_tenant_has_its_own_client(monkeypatch) :
+    closed=[]
+
+    class TenantClient :
+        def __init__(self , tenant) :
+            self.tenant=tenant.name
+
+        async def aclose(self) :
+            closed.append(self.tenant)
+
+    monkeypatch.setattr(async_orders , 'create_async_client' , TenantClient)
+    monkeypatch.setattr(async_orders , '_async_clients' , { })
+    dk , uk=Tenant('DK' , { }) , Tenant('UK' , { })
+
+    assert async_orders.get_async_client(dk) is async_orders.get_async_client(dk)
+    assert async_orders.get_async_client(uk).tenant == 'UK'
+    asyncio.run(async_orders.close_async_clients())
+    assert sorted(closed) == ['DK' , 'UK']
+    assert async_orders._async_clients == { }
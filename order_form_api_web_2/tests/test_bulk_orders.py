@@ -0,0 +1,72 @@
+import json
+from helpers import make_entry
+from mapping_functions import http_client
+from mapping_functions.bulk_orders import process_bulk , RateLimiter
+from mapping_functions.mapping_pencils import map_items , create_order_data
+from mapping_functions.order_entry import parse_order_entry
+from mapping_functions.tenants import get_current_tenant
+
+
+class FakeResponse :
+    def __init__(self , payload) :
+        self.payload=payload
+
+    def json(self) :
+        return self.payload
+
+
+def fake_post(monkeypatch) :
+    posted=[]
+
+    def post(url , headers=None , data=None , **kwargs) :
+        posted.append(json.loads(data))
+        return FakeResponse({ 'No' : f"SO{len(posted):06d}" })
+
+    monkeypatch.setattr(http_client , 'post' , post)
+    return posted
+
+
+def test_bulk_replays_an_order_created_by_new_orders(idempotency_store , monkeypatch) :
+    posted=fake_post(monkeypatch)
+    entry=parse_order_entry(make_entry(1))
+    order_data , quantity=create_order_data(entry , 'C00001')
+    single=map_items(entry , order_data , 'token' , quantity)
+
+    results=list(process_bulk([{ 'entry' : make_entry(1) , 'customer_no' : 'C00001' } ,
+                               { 'entry' : make_entry(2) , 'customer_no' : 'C00002' }] , 'token' , concurrency=2))
+    results.sort(key=lambda result : result['index'])
+
+    assert [result['status'] for result in results] == ['replayed' , 'created']
+    assert results[0]['result'] == single
+    assert len(posted) == 2
+
+
+def test_bulk_reports_invalid_entries(idempotency_store , monkeypatch) :
+    posted=fake_post(monkeypatch)
+    results=list(process_bulk([{ 'entry' : make_entry(1 , **{ '25' : "many" }) , 'customer_no' : 'C00001' }] , 'token'))
+
+    assert results[0]['status'] == 'invalid'
+    assert posted == []
+
+
+def test_orders_wait_for_a_tenant_slot(idempotency_store , monkeypatch) :
+    posted=fake_post(monkeypatch)
+    tenant=get_current_tenant()
+    monkeypatch.setattr(tenant , 'queue_timeout' , 0.05)
+    for _ in range(tenant.max_concurrency) :
+        tenant.acquire()
+    try :
+        results=list(process_bulk([{ 'entry' : make_entry(1) , 'customer_no' : 'C00001' }] , 'token'))
+    finally :
+        for _ in range(tenant.max_concurrency) :
+            tenant.release()
+
+    assert results[0]['status'] == 'busy' and results[0]['retry_after'] >= 1
+    assert posted == []
+
+
+def test_a_rate_of_zero_or_less_is_no_limit() :
+    for rate in (0 , -1) :
+        rate_limiter=RateLimiter(rate)
+        for _ in range(100) :
+            rate_limiter.acquire()
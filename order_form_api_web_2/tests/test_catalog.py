@@ -0,0 +1,24 @@
+import pytest
+from mapping_functions.catalog import CatalogBundle
+
+
+@pytest.fixture
+def bundle() :
+    return CatalogBundle({ 'countries' : { 'Denmark' : 'DK' } })
+
+
+@pytest.mark.parametrize('encoding' , ['identity' , 'gzip'])
+def test_the_matching_etag_is_echoed(bundle , encoding) :
+    etag=bundle.etag(encoding)
+    assert bundle.matching_etag(etag) == etag
+    assert bundle.matching_etag(f'"stale", W/{etag}') == etag
+
+
+def test_other_versions_do_not_match(bundle) :
+    assert bundle.matching_etag(None) is None
+    assert bundle.matching_etag('"0123456789abcdef-gzip"') is None
+
+
+def test_a_wildcard_is_answered_with_the_negotiated_etag(bundle) :
+    assert bundle.matching_etag('*' , 'gzip') == bundle.etag('gzip')
+    assert bundle.matching_etag('*') == bundle.etag('identity')
@@ -0,0 +1,98 @@
+import pytest
+from mapping_functions import circuit_breaker , http_client
+from mapping_functions.circuit_breaker import CircuitBreaker , CircuitOpenError , CLOSED , OPEN , HALF_OPEN
+
+
+class Clock :
+    # Stands in for the time module of circuit_breaker
+    def __init__(self) :
+        self.now=1000.0
+
+    def time(self) :
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) :
+    clock=Clock()
+    monkeypatch.setattr(circuit_breaker , 'time' , clock)
+    return clock
+
+
+def test_open_half_open_closed(clock) :
+    breaker=CircuitBreaker('bc/Sales_Order_Excel' , failure_threshold=2 , recovery_timeout=30)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    # Open: calls fail at once until the recovery timeout passed
+    clock.now+=10
+    with pytest.raises(CircuitOpenError) as error :
+        breaker.before_call()
+    assert error.value.retry_after == 20
+
+    # Half-open: one trial call passes, the next one waits for its outcome
+    clock.now+=20
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError) :
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.get_status() == { 'state' : CLOSED , 'failures' : 0 }
+    breaker.before_call()
+
+
+def test_a_failed_trial_call_opens_the_circuit_again(clock) :
+    breaker=CircuitBreaker('bc/Sales_Order_Excel' , failure_threshold=1 , recovery_timeout=30)
+    breaker.record_failure()
+
+    clock.now+=30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error :
+        breaker.before_call()
+    assert error.value.retry_after == 30
+
+
+def test_a_success_resets_the_consecutive_failures(clock) :
+    breaker=CircuitBreaker('bc/Sales_Order_Excel' , failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_failing_responses_open_the_circuit_of_their_endpoint(clock , monkeypatch) :
+    class Response :
+        def __init__(self , status_code) :
+            self.status_code=status_code
+
+    class Session :
+        def __init__(self) :
+            self.sent=[]
+
+        def request(self , method , url , **kwargs) :
+            self.sent.append(url)
+            return Response(503 if url.endswith('Sales_Order_Excel') else 200)
+
+    session=Session()
+    monkeypatch.setattr(http_client , 'get_session' , lambda tenant : session)
+    monkeypatch.setattr(http_client , 'observe_upstream' , lambda *args : None)
+    monkeypatch.setenv('CIRCUIT_FAILURE_THRESHOLD' , '3')
+    orders_url='https://breaker.test/ODataV4/Sales_Order_Excel'
+    customers_url='https://breaker.test/ODataV4/Customer_Card_Excel'
+
+    for _ in range(3) :
+        assert http_client.post(orders_url).status_code == 503
+    with pytest.raises(CircuitOpenError) :
+        http_client.post(orders_url)
+    assert len(session.sent) == 3
+
+    # Other endpoints keep their own circuit
+    assert http_client.get(customers_url).status_code == 200
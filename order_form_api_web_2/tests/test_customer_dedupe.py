@@ -0,0 +1,72 @@
+import pytest
+
+pd=pytest.importorskip('pandas')
+from mapping_functions.customer_dedupe import candidate_pairs , find_duplicates , normalize_customers , \
+    CUSTOMER_FIELDS
+from mapping_functions.fuzzy_matching import normalize_company_name , normalize_phone
+
+
+def make_customers(*rows) :
+    return pd.DataFrame([dict(zip(CUSTOMER_FIELDS , (*row , ''))) for row in rows])
+
+
+CUSTOMERS=make_customers(
+    ('C1' , "Nordisk Blyant ApS" , "DK10000001" , "+45 20000001" , "anna@blyant.dk") ,
+    ('C2' , "Nordisk Blyant A/S" , "" , "20 00 00 01" , "bo@blyant.dk") ,
+    ('C3' , "Blyant Nordisk" , "10000001" , "" , "") ,
+    ('C4' , "Papirhuset IVS" , "" , "" , "info@gmail.com") ,
+    ('C5' , "Papirhuset Nord" , "" , "" , "shop@gmail.com") ,
+    ('C6' , "Svensk Penna AB" , "SE556000000101" , "+46 8 123 456 78" , "info@penna.se")
+)
+
+
+def as_pairs(pairs) :
+    return sorted(zip(pairs['left'].tolist() , pairs['right'].tolist()))
+
+
+def test_keys_match_the_single_customer_normalization() :
+    keys=normalize_customers(CUSTOMERS)
+
+    assert keys['name'].tolist() == [normalize_company_name(name) for name in CUSTOMERS['Name']]
+    assert keys['phone'].tolist() == [normalize_phone(phone) for phone in CUSTOMERS['Phone_No']]
+    # Free mail domains don't tell customers apart
+    assert keys['domain'].tolist() == ['blyant.dk' , 'blyant.dk' , '' , '' , '' , 'penna.se']
+
+
+def test_only_customers_sharing_a_key_are_paired() :
+    keys=normalize_customers(CUSTOMERS)
+
+    # C1-C2 by phone, domain and name, C1-C3 by VAT, C4-C5 by the first name token
+    assert as_pairs(candidate_pairs(keys)) == [(0 , 1) , (0 , 2) , (3 , 4)]
+
+
+def test_oversized_blocks_are_skipped() :
+    customers=make_customers(*[(f"C{number}" , f"Nordisk Company {number}" , "" , "" , "") for number in range(4)])
+    keys=normalize_customers(customers)
+
+    assert len(candidate_pairs(keys , max_block_size=4)) == 6
+    assert len(candidate_pairs(keys , max_block_size=3)) == 0
+
+
+def test_a_duplicate_cluster_is_found() :
+    duplicates , summary=find_duplicates(CUSTOMERS)
+
+    assert duplicates['No'].tolist() == ['C1' , 'C2' , 'C3']
+    assert duplicates['cluster'].tolist() == [1 , 1 , 1]
+    assert duplicates['cluster_size'].tolist() == [3 , 3 , 3]
+    assert duplicates['score'].tolist() == [1.0 , 1.0 , 1.0]
+    assert summary == { 'customers' : 6 , 'candidate_pairs' : 3 , 'matching_pairs' : 2 , 'clusters' : 1 ,
+                        'duplicate_customers' : 3 }
+
+
+def test_a_higher_threshold_splits_weaker_matches() :
+    customers=make_customers(
+        ('C1' , "Nordisk Blyant ApS" , "" , "+45 20000001" , "") ,
+        ('C2' , "Nordisk Blyant A/S" , "" , "" , "") ,
+        ('C3' , "Papirhuset IVS" , "" , "" , "")
+    )
+
+    assert find_duplicates(customers , threshold=0.6)[0]['No'].tolist() == ['C1' , 'C2']
+    duplicates , summary=find_duplicates(customers , threshold=0.7)
+    assert duplicates.empty
+    assert summary['clusters'] == 0
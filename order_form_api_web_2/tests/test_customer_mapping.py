@@ -0,0 +1,84 @@
+import random
+import re
+import threading
+from mapping_functions.customer_mapping import CustomerIndex , check_if_customer_exists
+
+
+def linear_scan(vat_no , email , phone , name , customers) :
+    # check_if_customer_exists before the index, the reference the index must agree with
+    pattern=re.compile(r'\D')
+    matching_customers=[]
+    encountered_customer_ids=set()
+    for customer in customers :
+        vat=pattern.sub('' , customer['VAT_Registration_No'])
+        vat_match=vat == pattern.sub('' , vat_no) and vat != ""
+        email_domain_match='gmail.com' not in customer['E_Mail'].lower() and \
+                           customer['E_Mail'].split('@' , 1)[-1].upper() == email.split('@' , 1)[-1].upper()
+        phone_match=customer['Phone_No'] == phone and phone != ""
+        name_match=customer['Name'].upper() == name.upper() and name != ""
+        if vat_match or email_domain_match or phone_match or name_match :
+            if customer['No'] not in encountered_customer_ids :
+                matching_customers.append({ 'title' : f"{customer['No']} - {customer['Name']}" , 'value' : customer['No'] })
+                encountered_customer_ids.add(customer['No'])
+    return matching_customers
+
+
+def make_customers(rng , count , prefix='C') :
+    # Few distinct values per field, so entries match several customers and customer numbers repeat
+    return [{
+        'No' : f"{prefix}{rng.randint(0 , count // 2):05d}" ,
+        'Blocked' : "" ,
+        'VAT_Registration_No' : rng.choice(["" , "DK 1234-5678" , "DK12345678" , "SE 55667788" , "NO-998877"]) ,
+        'Phone_No' : rng.choice(["" , "+45 20000001" , "20000001" , "+46 701234567"]) ,
+        'Name' : rng.choice(["Acme ApS" , "ACME APS" , "Nordic Print" , "Pencil & Co" , ""]) ,
+        'E_Mail' : rng.choice(["" , "a@acme.dk" , "b@ACME.dk" , "x@gmail.com" , "y@print.se" , "no-at-sign"])
+    } for _ in range(count)]
+
+
+def make_queries(rng , count) :
+    return [(
+        rng.choice(["" , "12345678" , "DK-1234 5678" , "55667788" , "0"]) ,
+        rng.choice(["" , "c@acme.dk" , "someone@gmail.com" , "z@print.se" , "no-at-sign"]) ,
+        rng.choice(["" , "+45 20000001" , "20000001"]) ,
+        rng.choice(["" , "acme aps" , "Nordic Print" , "unknown"])
+    ) for _ in range(count)]
+
+
+def test_index_matches_the_linear_scan() :
+    rng=random.Random(7)
+    customers=make_customers(rng , 300)
+    index=CustomerIndex(customers)
+    for query in make_queries(rng , 200) :
+        assert index.match(*query) == linear_scan(*query , customers)
+
+
+def test_check_if_customer_exists_matches_the_linear_scan_after_changes() :
+    rng=random.Random(11)
+    customers=make_customers(rng , 200)
+    for _ in range(10) :
+        # Change, drop and add customers between calls, the shared index refreshes incrementally
+        customers=[customer if rng.random() < 0.8 else make_customers(rng , 1)[0] for customer in customers]
+        customers=customers[:rng.randint(150 , 200)] + make_customers(rng , rng.randint(0 , 50))
+        for query in make_queries(rng , 20) :
+            assert check_if_customer_exists(*query , customers) == linear_scan(*query , customers)
+
+
+def test_concurrent_callers_only_match_their_own_customers() :
+    rng=random.Random(3)
+    # Every caller has the same customers under its own customer numbers
+    lists={ prefix : make_customers(random.Random(5) , 100 , prefix) for prefix in ('A' , 'B' , 'C' , 'D') }
+    queries=make_queries(rng , 50)
+    errors=[]
+
+    def call(prefix) :
+        for query in queries :
+            found=check_if_customer_exists(*query , lists[prefix])
+            if found != linear_scan(*query , lists[prefix]) :
+                errors.append((prefix , query , found))
+
+    threads=[threading.Thread(target=call , args=(prefix ,)) for prefix in lists for _ in range(2)]
+    for thread in threads :
+        thread.start()
+    for thread in threads :
+        thread.join()
+    assert errors == []
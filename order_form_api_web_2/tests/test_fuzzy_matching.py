@@ -0,0 +1,75 @@
+import pytest
+from mapping_functions.fuzzy_matching import FuzzyCustomerIndex , FuzzyIndexCache , normalize_company_name , \
+    normalize_phone , merge_matches
+
+
+def customer(number , name , vat="" , phone="") :
+    return { 'No' : number , 'Name' : name , 'VAT_Registration_No' : vat , 'Phone_No' : phone , 'E_Mail' : "" }
+
+
+CUSTOMERS=[
+    customer('C1' , "Nordisk Blyant ApS" , "DK10000001" , "+45 20000001") ,
+    customer('C2' , "Nordisk Blyanter A/S") ,
+    customer('C3' , "Svensk Penna AB" , "SE556000000101" , "+46 8 123 456 78") ,
+    customer('C4' , "Papirhuset IVS") ,
+    customer('C5' , "Nordic Pencil Ltd")
+]
+
+
+@pytest.mark.parametrize('name , normalized' , [
+    ("ACME ApS" , "acme") , ("Acme Aps." , "acme") , ("Ærø Træ A/S" , "aeroe trae") , ("Smith & Co" , "smith and") ,
+    ("ApS" , "aps")
+])
+def test_company_names_are_normalized(name , normalized) :
+    assert normalize_company_name(name) == normalized
+
+
+@pytest.mark.parametrize('phone , normalized' , [
+    ("+45 20 00 00 01" , "20000001") , ("0045 20000001" , "20000001") , ("20000001" , "20000001") ,
+    ("030 1234567" , "301234567") , ("12 34" , "")
+])
+def test_phone_numbers_are_normalized(phone , normalized) :
+    assert normalize_phone(phone) == normalized
+
+
+def test_a_misspelt_name_ranks_the_closest_customers_first() :
+    index=FuzzyCustomerIndex(CUSTOMERS)
+    matches=index.match("" , "" , "Nordisk Blyant A/S")
+
+    assert [match['value'] for match in matches[:2]] == ['C1' , 'C2']
+    assert matches[0]['score'] == 1.0
+    assert 0.5 <= matches[1]['score'] < 1.0
+    assert 'C4' not in [match['value'] for match in matches]
+
+
+def test_vat_and_phone_match_exactly_whatever_the_name() :
+    index=FuzzyCustomerIndex(CUSTOMERS)
+
+    assert index.match("SE 556000000101" , "" , "Unrelated name") == \
+           [{ 'title' : "C3 - Svensk Penna AB" , 'value' : 'C3' , 'score' : 1.0 }]
+    assert [match['value'] for match in index.match("" , "0045 2000 0001" , "")] == ['C1']
+
+
+def test_limit_and_threshold_are_applied() :
+    index=FuzzyCustomerIndex(CUSTOMERS)
+
+    assert len(index.match("" , "" , "Nordisk Blyant" , limit=1)) == 1
+    assert index.match("" , "" , "Nordisk Blyant" , threshold=1.01) == []
+
+
+def test_merged_matches_list_exact_matches_first_without_duplicates() :
+    exact=[{ 'title' : "C1 - Nordisk Blyant ApS" , 'value' : 'C1' }]
+    fuzzy=[{ 'title' : "C2 - Nordisk Blyanter A/S" , 'value' : 'C2' , 'score' : 0.8 } ,
+           { 'title' : "C1 - Nordisk Blyant ApS" , 'value' : 'C1' , 'score' : 0.9 }]
+
+    assert [(match['value'] , match['score']) for match in merge_matches(exact , fuzzy)] == [('C1' , 1.0) ,
+                                                                                            ('C2' , 0.8)]
+
+
+def test_the_index_is_rebuilt_only_for_a_new_customer_list() :
+    cache=FuzzyIndexCache()
+    customers=list(CUSTOMERS)
+
+    index=cache.get(customers)
+    assert cache.get(customers) is index
+    assert cache.get(list(CUSTOMERS)) is not index
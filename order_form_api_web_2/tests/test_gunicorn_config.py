@@ -0,0 +1,16 @@
+import pytest
+import serve
+
+
+@pytest.mark.parametrize('worker_class , preload_app' , [('gthread' , True) , ('sync' , True) , ('gevent' , False)])
+def test_the_app_is_preloaded_except_for_gevent_workers(worker_class , preload_app , monkeypatch) :
+    monkeypatch.setenv('GUNICORN_WORKER_CLASS' , worker_class)
+    monkeypatch.delenv('GUNICORN_PRELOAD' , raising=False)
+    assert serve.load_settings()['preload_app'] is preload_app
+
+
+def test_preloading_gevent_workers_is_rejected(monkeypatch) :
+    monkeypatch.setenv('GUNICORN_WORKER_CLASS' , 'gevent')
+    monkeypatch.setenv('GUNICORN_PRELOAD' , '1')
+    with pytest.raises(ValueError , match="gevent") :
+        serve.load_settings()
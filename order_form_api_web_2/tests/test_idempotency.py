@@ -0,0 +1,166 @@
+import json
+import threading
+import pytest
+from helpers import make_entry
+from mapping_functions import http_client
+from mapping_functions.idempotency import IdempotencyStore , submit_once , OrderInProgressError
+from mapping_functions.mapping_pencils import map_items , create_order_data , build_order_header , get_order_key
+from mapping_functions.order_batch import map_and_submit_items , map_order
+from mapping_functions.order_entry import parse_order_entry
+from mapping_functions.order_queue import submit_queued
+from mapping_functions.tenants import Tenant , use_tenant
+
+
+class FakeResponse :
+    def __init__(self , payload , status_code=200) :
+        self.payload=payload
+        self.status_code=status_code
+        self.text=json.dumps(payload)
+
+    def json(self) :
+        return self.payload
+
+
+def fake_business_central(monkeypatch) :
+    # Sales orders created by a plain POST or a $batch, numbered in creation order
+    created=[]
+
+    def post(url , headers=None , data=None , **kwargs) :
+        body=json.loads(data)
+        if url.endswith('/$batch') :
+            created.append(('batch' , body['requests'][0]['body']['External_Document_No']))
+            document_no=f"SO{len(created):06d}"
+            return FakeResponse({ 'responses' : [
+                { 'id' : request['id'] , 'status' : 201 ,
+                  'body' : { 'No' : document_no } if request['id'] == 'header' else { 'Line_No' : 10000 * index } }
+                for index , request in enumerate(body['requests'])
+            ] })
+        created.append(('single' , body['External_Document_No']))
+        return FakeResponse({ 'No' : f"SO{len(created):06d}" })
+
+    monkeypatch.setattr(http_client , 'post' , post)
+    return created
+
+
+def prepare(entry_id) :
+    entry=parse_order_entry(make_entry(entry_id))
+    order_data , quantity=create_order_data(entry , 'C00001')
+    return entry , order_data , quantity
+
+
+def test_claim_complete_and_replay(tmp_path) :
+    store=IdempotencyStore(str(tmp_path / 'store.sqlite3'))
+    assert store.claim('key') == (True , None)
+    assert store.claim('key') == (False , { 'status' : 'pending' , 'result' : None })
+    assert store.lookup('key') is None
+
+    store.complete('key' , { 'document_no' : 'SO000001' , 'lines' : None })
+    assert store.claim('key') == (False , { 'status' : 'done' , 'result' : { 'document_no' : 'SO000001' , 'lines' : None } })
+
+    # Another worker on the host reads the record from the database
+    other=IdempotencyStore(str(tmp_path / 'store.sqlite3'))
+    assert other.lookup('key') == { 'document_no' : 'SO000001' , 'lines' : None }
+    assert other.claim('key')[1]['status'] == 'done'
+
+
+def test_released_and_stale_claims_can_be_taken_over(tmp_path) :
+    store=IdempotencyStore(str(tmp_path / 'store.sqlite3') , pending_timeout=0)
+    assert store.claim('stale')[0]
+    assert store.claim('stale')[0]
+
+    store=IdempotencyStore(str(tmp_path / 'store.sqlite3'))
+    assert store.claim('released')[0]
+    store.release('released')
+    assert store.claim('released')[0]
+
+
+def test_submit_once_runs_a_submission_once(idempotency_store) :
+    calls=[]
+    assert submit_once('key' , lambda : calls.append(1) or "first") == "first"
+    assert submit_once('key' , lambda : calls.append(2) or "second") == "first"
+    assert calls == [1]
+
+
+def test_submit_once_releases_a_failed_submission(idempotency_store) :
+    def fail() :
+        raise RuntimeError("Business Central down")
+
+    with pytest.raises(RuntimeError) :
+        submit_once('key' , fail)
+    assert submit_once('key' , lambda : "retried") == "retried"
+
+
+def test_submit_once_rejects_a_concurrent_submission(idempotency_store) :
+    started=threading.Event()
+    release=threading.Event()
+
+    def slow() :
+        started.set()
+        release.wait(5)
+        return "first"
+
+    thread=threading.Thread(target=submit_once , args=('key' , slow))
+    thread.start()
+    started.wait(5)
+    with pytest.raises(OrderInProgressError) :
+        submit_once('key' , lambda : "second")
+    release.set()
+    thread.join()
+
+
+def test_batch_replays_an_order_created_by_a_single_post(idempotency_store , monkeypatch) :
+    created=fake_business_central(monkeypatch)
+    entry , order_data , quantity=prepare(1)
+    mapped=map_items(entry , order_data , 'token' , quantity)
+    document_no=mapped['lines']['requests'][0]['body']['Document_No']
+
+    entry , order_data , quantity=prepare(1)
+    result=map_and_submit_items(entry , order_data , 'token' , quantity)
+
+    assert result['document_no'] == document_no
+    # The lines were returned to the caller of the single POST, not created here
+    assert result['lines'] is None
+    assert created == [('single' , 'PO-1')]
+
+
+def test_single_post_and_queue_replay_an_order_created_by_a_batch(idempotency_store , order_queue , monkeypatch) :
+    created=fake_business_central(monkeypatch)
+    entry , order_data , quantity=prepare(1)
+    result=map_and_submit_items(entry , order_data , 'token' , quantity)
+
+    entry , order_data , quantity=prepare(1)
+    mapped=map_items(entry , order_data , 'token' , quantity)
+    assert { line['body']['Document_No'] for line in mapped['lines']['requests'] } == { result['document_no'] }
+
+    entry , order_data , quantity=prepare(1)
+    order=map_order(entry , order_data , quantity)
+    ticket=order_queue.enqueue(get_order_key(order['header']) , order)
+    assert submit_queued(order_queue , access_token='token') == { 'submitted' : 1 , 'failed' : 0 }
+    queued=order_queue.get(ticket)['result']
+    assert (queued['document_no'] , queued['lines']) == (result['document_no'] , result['lines'])
+
+    assert created == [('batch' , 'PO-1')]
+
+
+def test_plain_document_numbers_stored_before_the_order_record_replay(idempotency_store , monkeypatch) :
+    created=fake_business_central(monkeypatch)
+    entry , order_data , quantity=prepare(1)
+    key=get_order_key(build_order_header(quantity , 'C00001' , entry))
+    idempotency_store.claim(key)
+    idempotency_store.complete(key , "SO000042")
+
+    assert map_and_submit_items(entry , order_data , 'token' , quantity)['document_no'] == "SO000042"
+    entry , order_data , quantity=prepare(1)
+    mapped=map_items(entry , order_data , 'token' , quantity)
+    assert mapped['lines']['requests'][0]['body']['Document_No'] == "SO000042"
+    assert created == []
+
+
+def test_tenants_do_not_share_order_keys() :
+    entry , order_data , quantity=prepare(1)
+    header=build_order_header(quantity , 'C00001' , entry)
+
+    with use_tenant(Tenant('DK' , { })) :
+        key=get_order_key(header)
+    with use_tenant(Tenant('UK' , { })) :
+        assert get_order_key(header) != key
@@ -0,0 +1,15 @@
+import pytest
+from mapping_functions.instrumentation import get_request_id
+
+
+@pytest.mark.parametrize('header' , ["abc-123" , "A" * 64 , "0f8fad5b-d9cb-469f-a165-70867728950e"])
+def test_well_formed_request_ids_are_kept(header) :
+    assert get_request_id(header) == header
+
+
+@pytest.mark.parametrize('header' , [None , "" , "../../etc/passwd" , "id\nINFO forged log line" , "A" * 65 ,
+                                     "id with spaces" , "id/..\\x"])
+def test_other_request_ids_are_replaced(header) :
+    request_id=get_request_id(header)
+    assert request_id != header
+    assert len(request_id) == 32 and request_id.isalnum()
@@ -0,0 +1,57 @@
+import pytest
+from helpers import make_entry
+from mapping_functions import mapping_pencils
+from mapping_functions.mapping_cache import MappingCache
+from mapping_functions.mapping_pencils import map_lines , create_order_data , get_order_plan
+from mapping_functions.order_entry import parse_order_entry
+
+
+def test_hits_misses_and_least_recently_used_eviction() :
+    cache=MappingCache(max_size=2)
+    cache.put('a' , ['line a'])
+    cache.put('b' , ['line b'])
+    assert cache.get('a') == ['line a']
+    # 'b' is now the least recently used entry
+    cache.put('c' , ['line c'])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == ['line a']
+    assert cache.get('c') == ['line c']
+    assert cache.get_stats() == { 'hits' : 3 , 'misses' : 1 , 'evictions' : 1 , 'cached' : 2 }
+
+
+def test_a_size_of_zero_caches_nothing() :
+    cache=MappingCache(max_size=0)
+    cache.put('a' , ['line a'])
+    assert cache.get('a') is None
+    assert cache.get_stats()['cached'] == 0
+
+
+@pytest.fixture
+def cache(monkeypatch) :
+    cache=MappingCache(max_size=8)
+    monkeypatch.setattr(mapping_pencils , 'mapping_cache' , cache)
+    return cache
+
+
+def map_entry(entry , customer_number='C00001') :
+    entry=parse_order_entry(entry)
+    _ , quantity=create_order_data(entry , customer_number)
+    return map_lines(get_order_plan() , entry , quantity)
+
+
+def test_entries_differing_only_in_the_customer_share_lines(cache) :
+    lines=map_entry(make_entry(1))
+    assert map_entry(make_entry(2 , **{ '86' : "Other Company ApS" }) , 'C00002') == lines
+    assert cache.get_stats() == { 'hits' : 1 , 'misses' : 1 , 'evictions' : 0 , 'cached' : 1 }
+
+    map_entry(make_entry(1 , **{ '25' : "500" }))
+    assert cache.get_stats()['misses'] == 2
+
+
+def test_callers_can_not_change_the_cached_lines(cache) :
+    lines=map_entry(make_entry())
+    for line in lines :
+        line['body']['Document_No']="SO000001"
+
+    assert all('SO000001' != line['body'].get('Document_No') for line in map_entry(make_entry()))
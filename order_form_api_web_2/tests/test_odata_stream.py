@@ -0,0 +1,89 @@
+import json
+import random
+import pytest
+from mapping_functions.odata_stream import ODataPageReader , iter_odata_pages
+
+CUSTOMERS=[
+    { 'No' : "C00001" , 'Name' : "Acme ApS" , 'Balance' : 2.5e3 , 'Credit' : -12 , 'Blocked' : "" , 'Tags' : [] } ,
+    { 'No' : "C00002" , 'Name' : "Ærø Blyanter — Ølstykke" , 'Balance' : 0.125 , 'Credit' : 1000000 , 'Blocked' : "Ship" ,
+      'Tags' : ["a" , { 'nested' : [1 , 2.0 , None , True , False] }] } ,
+    { 'No' : "C00003" , 'Name' : "Quote \" and \\ backslash ☃ \U0001F58D" , 'Balance' : 7 , 'Credit' : 1e-7 ,
+      'Blocked' : "" , 'Tags' : None }
+]
+PAGE={ '@odata.context' : "https://bc.test/$metadata#Customers" , 'value' : CUSTOMERS ,
+       '@odata.nextLink' : "https://bc.test/Customers?$skiptoken=C00003" }
+
+
+def split(body , rng) :
+    # Cut the body at random byte offsets, also inside multibyte characters, numbers and escapes
+    cuts=sorted(rng.sample(range(1 , len(body)) , min(len(body) - 1 , rng.randint(1 , 40))))
+    return [body[start :end] for start , end in zip([0] + cuts , cuts + [len(body)])]
+
+
+@pytest.mark.parametrize('indent' , [None , 2])
+def test_items_survive_every_chunk_boundary(indent) :
+    body=json.dumps(PAGE , indent=indent , ensure_ascii=False).encode()
+    rng=random.Random(24)
+    for _ in range(300) :
+        reader=ODataPageReader(split(body , rng))
+        assert list(reader) == CUSTOMERS
+        assert reader.members == { key : value for key , value in PAGE.items() if key != 'value' }
+
+
+def test_one_byte_chunks() :
+    body=json.dumps(PAGE , ensure_ascii=False).encode()
+    reader=ODataPageReader([body[index :index + 1] for index in range(len(body))])
+    assert list(reader) == CUSTOMERS
+    assert reader.members['@odata.nextLink'] == PAGE['@odata.nextLink']
+
+
+def test_a_number_split_at_the_end_of_a_chunk_is_read_whole() :
+    reader=ODataPageReader([b'{"value": [12' , b'34, 2.5' , b'e' , b'3, -' , b'1]}'])
+    assert list(reader) == [1234 , 2.5e3 , -1]
+
+
+@pytest.mark.parametrize('body' , [b'{}' , b'{"value": []}' , b' { "value" : [ ] } '])
+def test_empty_pages(body) :
+    assert list(ODataPageReader([body])) == []
+
+
+@pytest.mark.parametrize('body' , [b'' , b'[]' , b'{"value": [1, 2' , b'{"value": [1 2]}' , b'{1: 2}' ,
+                                   b'{"value": [{"No": "C1"}' , b'{"value": [tru]}'])
+def test_malformed_pages_raise(body) :
+    with pytest.raises(json.JSONDecodeError) :
+        list(ODataPageReader([body[:3] , body[3 :]]))
+
+
+class StreamedResponse :
+    def __init__(self , page) :
+        self.body=json.dumps(page).encode()
+        self.closed=False
+
+    def raise_for_status(self) :
+        pass
+
+    def iter_content(self , chunk_size) :
+        for start in range(0 , len(self.body) , 7) :
+            yield self.body[start :start + 7]
+
+    def close(self) :
+        self.closed=True
+
+
+def test_next_links_are_followed_to_the_last_page() :
+    pages={
+        'page1' : { 'value' : CUSTOMERS[:2] , '@odata.nextLink' : 'page2' } ,
+        'page2' : { '@odata.nextLink' : 'page3' , 'value' : [] } ,
+        'page3' : { 'value' : CUSTOMERS[2 :] }
+    }
+    requested=[]
+    responses=[]
+
+    def get_page(url) :
+        requested.append(url)
+        responses.append(StreamedResponse(pages[url]))
+        return responses[-1]
+
+    assert list(iter_odata_pages(get_page , 'page1')) == CUSTOMERS
+    assert requested == ['page1' , 'page2' , 'page3']
+    assert all(response.closed for response in responses)
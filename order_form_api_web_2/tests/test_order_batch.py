@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+import pytest
+from mapping_functions import http_client , order_batch
+from mapping_functions.order_batch import build_order_batch , submit_order_batch , get_batch_url , BatchSubmissionError
+
+CONFIG={ 'base_url' : 'https://bc.test/v2.0' , 'tenant_id' : 'tid' , 'environment' : 'Production' , 'company' : 'Company' }
+HEADER={ 'Sell_to_Customer_No' : 'C00001' , 'External_Document_No' : 'PO-1' }
+
+
+def make_lines(count) :
+    return [{
+        'id' : f"line-{index}" ,
+        'headers' : { 'Content-Type' : 'application/json' , 'If-Match' : '*' } ,
+        'body' : { 'Document_No' : 'placeholder' , 'No' : f"ITEM{index}" , 'Quantity' : index + 1 }
+    } for index in range(count)]
+
+
+class FakeResponse :
+    def __init__(self , payload , status_code=200) :
+        self.payload=payload
+        self.status_code=status_code
+        self.text=json.dumps(payload)
+
+    def json(self) :
+        return self.payload
+
+
+def reply(monkeypatch , payload , status_code=200) :
+    sent=[]
+
+    def post(url , headers=None , data=None , **kwargs) :
+        sent.append((url , headers , json.loads(data)))
+        return FakeResponse(payload , status_code)
+
+    monkeypatch.setattr(http_client , 'post' , post)
+    monkeypatch.setattr(order_batch , 'get_order_plan' , lambda : SimpleNamespace(config=CONFIG))
+    return sent
+
+
+def test_the_header_and_lines_form_one_changeset() :
+    body=build_order_batch(CONFIG , HEADER , make_lines(2))
+    header , *lines=body['requests']
+
+    assert header == { 'method' : 'POST' , 'id' : 'header' , 'atomicityGroup' : 'order' ,
+                       'url' : 'Company/Sales_Order_Excel' , 'headers' : { 'Content-Type' : 'application/json' } ,
+                       'body' : HEADER }
+    assert [line['id'] for line in lines] == ['line0' , 'line1']
+    for index , line in enumerate(lines) :
+        assert line['atomicityGroup'] == 'order' and line['dependsOn'] == ['header']
+        assert line['url'] == '$header/Sales_Order_ExcelSalesLines'
+        assert line['headers'] == make_lines(2)[index]['headers']
+        # The document number is only known once the header is inserted
+        assert line['body'] == { 'No' : f"ITEM{index}" , 'Quantity' : index + 1 }
+
+
+def test_an_order_without_lines_posts_only_the_header() :
+    assert [request['id'] for request in build_order_batch(CONFIG , HEADER , [])['requests']] == ['header']
+
+
+def test_the_response_maps_line_numbers_to_line_ids(monkeypatch) :
+    # Business Central may answer the changeset in any order
+    sent=reply(monkeypatch , { 'responses' : [
+        { 'id' : 'line1' , 'status' : 201 , 'body' : { 'Line_No' : 20000 } } ,
+        { 'id' : 'header' , 'status' : 201 , 'body' : { 'No' : 'SO000001' } } ,
+        { 'id' : 'line0' , 'status' : 201 , 'body' : { 'Line_No' : 10000 } }
+    ] })
+
+    result=submit_order_batch(HEADER , make_lines(2) , 'token')
+
+    assert result == { 'document_no' : 'SO000001' ,
+                       'lines' : [{ 'id' : 'line-0' , 'line_no' : 10000 } , { 'id' : 'line-1' , 'line_no' : 20000 }] }
+    url , headers , body=sent[0]
+    assert url == get_batch_url(CONFIG) == 'https://bc.test/v2.0/tid/Production/ODataV4/$batch'
+    assert headers['Authorization'] == 'Bearer token' and headers['Isolation'] == 'snapshot'
+    assert body == build_order_batch(CONFIG , HEADER , make_lines(2))
+
+
+def test_a_rejected_batch_raises(monkeypatch) :
+    reply(monkeypatch , { 'error' : { 'message' : 'Malformed' } } , status_code=400)
+    with pytest.raises(BatchSubmissionError , match='status code 400') :
+        submit_order_batch(HEADER , make_lines(1) , 'token')
+
+
+def test_a_failed_line_raises_with_its_message(monkeypatch) :
+    reply(monkeypatch , { 'responses' : [
+        { 'id' : 'header' , 'status' : 201 , 'body' : { 'No' : 'SO000001' } } ,
+        { 'id' : 'line0' , 'status' : 400 , 'body' : { 'error' : { 'message' : 'Item ITEM0 is blocked' } } }
+    ] })
+    with pytest.raises(BatchSubmissionError , match='line0 failed with status code 400: Item ITEM0 is blocked') :
+        submit_order_batch(HEADER , make_lines(1) , 'token')
@@ -0,0 +1,123 @@
+import random
+import re
+import pytest
+from helpers import make_entry
+from Product_Catalog.VarianCodes.ProductHierarchy import country_codes
+from mapping_functions.mapping_pencils import build_order_header
+from mapping_functions.order_entry import parse_order_entry , OrderEntryError , DIFFERENT_DELIVERY_ADDRESS
+from mapping_functions.order_plan import PENCIL_FAMILIES
+from mapping_functions.product_catalog import get_catalog
+
+
+def baseline_header(quantity , customer , entry) :
+    # The sales order header as create_new_order built it from the raw entry before parse_order_entry
+    order_data={
+        "PTE_Total_Quantity" : int(quantity) ,
+        "PTE_Status_Code" : "19-APPROVAL" ,
+        "Sell_to_Customer_No" : customer ,
+        "Sell_to_Contact" : entry['89.3'] ,
+        "External_Document_No" : (entry['125'])[:35] if entry['125'] != '' else entry['id'] ,
+        "Sell_to_Address" : (entry["87.1"])[:99] ,
+        "Sell_to_Address_2" : (entry["87.2"])[:49] ,
+        "Sell_to_City" : (entry["87.3"])[:29] ,
+        "Sell_to_Post_Code" : (entry["87.5"])[:19] ,
+        "Sell_to_Country_Region_Code" : (country_codes[entry["87.6"]])[:9] if entry["87.6"] in country_codes else "" ,
+        "Sell_to_Phone_No" : re.sub(r'\D' , '' , entry["307"]) ,
+        "Sell_to_E_Mail" : entry["88"] ,
+        "ShippingOptions" : "Custom Address" ,
+        "PTE_Ship_to_Email" : entry["88"]
+    }
+
+    if entry['139.1'] == "Delivery address is different from invoice" :
+        ship_keys={
+            'add_1' : '95.1' , 'add_2' : '95.2' , 'city' : '95.3' , 'post_code' : '95.5' , 'region' : '95.6' ,
+            'contact_first' : '96.3' , 'contact_last' : '96.6' , 'phone' : '97' , 'company' : '94'
+        }
+    else :
+        ship_keys={
+            'add_1' : '87.1' , 'add_2' : '87.2' , 'city' : '87.3' , 'post_code' : '87.5' , 'region' : '87.6' ,
+            'contact_first' : '89.3' , 'contact_last' : '89.6' , 'phone' : '307' , 'company' : '86'
+        }
+
+    order_data.update({
+        "Ship_to_Address" : (entry[ship_keys['add_1']])[:99] ,
+        "Ship_to_Address_2" : (entry[ship_keys['add_2']])[:49] ,
+        "Ship_to_City" : (entry[ship_keys['city']])[:20] ,
+        "Ship_to_Post_Code" : (entry[ship_keys['post_code']])[:19] ,
+        "Ship_to_Country_Region_Code" : (country_codes[entry[ship_keys['region']]])[:9] if entry[ship_keys[
+            'region']] in country_codes else "" ,
+        "Ship_to_Contact" : f"{entry[ship_keys['contact_first']]} {entry[ship_keys['contact_last']]}" ,
+        "PTE_Ship_to_Phone_No" : re.sub(r'\D' , '' , entry[ship_keys['phone']]) ,
+        "Ship_to_Name" : entry[ship_keys['company']]
+    })
+    return order_data
+
+
+def random_text(rng , longest) :
+    return "".join(rng.choice("abcæøå ÄÖ-.,/#1234567890") for _ in range(rng.randint(0 , longest)))
+
+
+def random_entry(rng , entry_id) :
+    tables=get_catalog().tables
+    countries=list(country_codes)[:5] + ["Atlantis" , ""]
+    entry=make_entry(entry_id ,
+                     **{ field : random_text(rng , 120) for field in ('86' , '87.1' , '87.2' , '87.3' , '87.5' , '89.3' ,
+                                                                      '89.6' , '94' , '95.1' , '95.2' , '95.3' , '95.5' ,
+                                                                      '96.3' , '96.6') })
+    entry.update({
+        '125' : rng.choice(["" , f"PO-{entry_id}" , "X" * 60]) ,
+        '87.6' : rng.choice(countries) , '95.6' : rng.choice(countries) ,
+        '307' : rng.choice(["" , "+45 20 00 00 01" , "(0045) 2000-0001"]) , '97' : rng.choice(["" , "+46 70-123 45 67"]) ,
+        '139.1' : rng.choice(["" , DIFFERENT_DELIVERY_ADDRESS])
+    })
+    for quantity_field , _ , seed_table , _ , _ in PENCIL_FAMILIES :
+        entry[quantity_field]=rng.choice(["" , str(rng.randint(0 , 5000))])
+        for key in tables[seed_table] :
+            entry[key]=rng.choice(["" , "" , str(rng.randint(0 , 500))])
+    return entry
+
+
+def test_header_matches_the_baseline_field_handling() :
+    rng=random.Random(21)
+    for entry_id in range(1 , 301) :
+        entry=random_entry(rng , entry_id)
+        quantity=rng.randint(1 , 5000)
+        assert build_order_header(quantity , 'C00001' , parse_order_entry(entry)) == \
+               baseline_header(quantity , 'C00001' , entry)
+
+
+def test_quantities_match_the_baseline_field_handling() :
+    rng=random.Random(12)
+    tables=get_catalog().tables
+    for entry_id in range(1 , 301) :
+        entry=random_entry(rng , entry_id)
+        parsed=parse_order_entry(entry)
+
+        # The baseline read a family's seeds when its quantity field was filled, and skipped empty seeds
+        families=[family for family in PENCIL_FAMILIES if entry[family[0]] != ""]
+        assert parsed.pencil_quantities == { product_key : int(entry[field]) for field , product_key , _ , _ , _ in families }
+        assert parsed.seed_quantities == { key : int(entry[key]) for _ , _ , seed_table , _ , _ in families
+                                           for key in tables[seed_table] if entry[key] != "" }
+        assert parsed.quantity == int(entry['25'])
+
+
+@pytest.mark.parametrize('fields , field' , [
+    ({ '25' : "many" } , '25') ,
+    ({ '23' : "-1" } , '23') ,
+    ({ '30' : "Klingon" } , '30') ,
+    ({ '121' : "Gift Box" , '28' : "melted" } , '28') ,
+    ({ '233' : "Standard ( plain )" , '238' : "" } , '238') ,
+    ({ '88' : None } , '88')
+])
+def test_malformed_fields_are_rejected(fields , field) :
+    with pytest.raises(OrderEntryError) as error :
+        parse_order_entry(make_entry(1 , **fields))
+    assert error.value.field == field
+
+
+def test_missing_fields_are_rejected() :
+    entry=make_entry(1)
+    del entry['87.3']
+    with pytest.raises(OrderEntryError) as error :
+        parse_order_entry(entry)
+    assert error.value.field == '87.3'
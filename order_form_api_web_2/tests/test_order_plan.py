@@ -0,0 +1,82 @@
+import random
+import pytest
+from helpers import make_entry
+from benchmarks import baseline_mapping
+from benchmarks.entries import make_catalog_entry
+from mapping_functions.mapping_pencils import create_order_data , map_lines
+from mapping_functions.order_entry import parse_order_entry
+from mapping_functions.order_plan import compile_order_plan
+from mapping_functions.product_catalog import ProductCatalog
+
+
+@pytest.fixture
+def catalog() :
+    catalog=ProductCatalog(baseline_mapping.make_catalog_tables() , source='fixture')
+    assert catalog.validate() == []
+    return catalog
+
+
+@pytest.fixture
+def plan(catalog , monkeypatch) :
+    for name , value in (('BASEURL' , 'https://bc.test/v2.0') , ('TENANTID' , 'tid') , ('TESTENVIRONMENT' , 'Sandbox') ,
+                         ('COMPANYEU' , 'Company')) :
+        monkeypatch.setenv(name , value)
+    return compile_order_plan(baseline_mapping.get_environment_config() , catalog)
+
+
+def map_both(plan , raw_entry) :
+    entry=parse_order_entry(raw_entry , plan.catalog)
+    data , quantity=create_order_data(entry , 'C00001')
+    baseline=baseline_mapping.map_items(raw_entry , { 'lines' : { 'requests' : [] } } , quantity , plan.catalog.tables ,
+                                        "SO000001")
+    product_dict , size=plan.pencil_ids(entry)
+    planned=plan.add_lines(entry , product_dict , size , data , "SO000001" , quantity)
+    return baseline['lines']['requests'] , planned['lines']['requests'] , entry , quantity
+
+
+REPRESENTATIVE_ENTRIES=[
+    # Standard graphite pencils with sharpened state and a language
+    { '7' : "" , '23' : "500" , '40' : "300" , '42' : "200" , '28' : "Sharpened" , '30' : "Danish" , '121' : "Gift Box" } ,
+    # Personalized pencils of every family in gift boxes with customized packaging and a sharpener
+    { '7' : "Customized laser engraved" , '23' : "100" , '41' : "100" , '24' : "50" , '50' : "25" , '51' : "25" ,
+      '152' : "10" , '60' : "10" , '119' : "Gift packaging" , '121' : "Gift Box" , '111' : "Customized packaging (Your own design)" ,
+      '153' : "English" , '233' : "Standard ( plain )" , '238' : "20" } ,
+    # Color print in a 3-pack, the packaging quantity is divided by the pack size
+    { '7' : "Standard color print" , '24' : "300" , '50' : "300" , '30' : "English" , '119' : "Gift packaging" ,
+      '121' : "3-Pack" , '25' : "300" } ,
+    # Mini pencils on hanger tags, the state and language are fixed
+    { '7' : "Customized color print" , '23' : "250" , '40' : "250" , '28' : "Unsharpened" , '30' : "Danish" ,
+      '119' : "Gift packaging" , '121' : "Hanger Tag" , '233' : "Customized with color print" , '238' : "5" } ,
+    # Unsharpened pencils in a 5-pack with customized packaging
+    { '23' : "1000" , '41' : "1000" , '28' : "Unsharpened" , '30' : "Other" , '248' : "Klingon" , '119' : "Gift packaging" ,
+      '121' : "5-Pack" , '111' : "Customized packaging (Your own design)" , '25' : "1000" } ,
+    # No pencils and no packaging, only language and fee lines
+    { '7' : "Customized laser engraved" , '30' : "" , '248' : "" , '121' : "Gift Box" }
+]
+
+
+@pytest.mark.parametrize('fields' , REPRESENTATIVE_ENTRIES)
+def test_representative_entries_map_to_the_baseline_lines(plan , fields) :
+    raw_entry=make_entry(1 , **{ **dict.fromkeys(('40' , '41' , '42' , '50' , '51' , '60') , "") , **fields })
+    baseline , planned , _ , _=map_both(plan , raw_entry)
+    assert len(planned) > 2
+    assert planned == baseline
+
+
+def test_random_entries_map_to_the_baseline_lines(plan) :
+    rng=random.Random(7)
+    for entry_id in range(500) :
+        raw_entry=make_catalog_entry(entry_id , plan.catalog.tables , rng)
+        baseline , planned , _ , _=map_both(plan , raw_entry)
+        assert planned == baseline , raw_entry
+
+
+def test_cached_lines_match_the_baseline_lines(plan) :
+    rng=random.Random(11)
+    for entry_id in range(200) :
+        raw_entry=make_catalog_entry(entry_id % 50 , plan.catalog.tables , rng)
+        baseline , _ , entry , quantity=map_both(plan , raw_entry)
+        lines=map_lines(plan , entry , quantity)
+        for line in lines :
+            line['body']['Document_No']="SO000001"
+        assert lines == baseline
@@ -0,0 +1,127 @@
+import json
+import pytest
+from urllib.parse import urlparse , parse_qs
+from helpers import make_entry
+from mapping_functions import order_poller
+from mapping_functions.customer_mapping import CustomerIndex
+from mapping_functions.order_poller import poll_once , load_checkpoint , get_dead_letter_path , find_customer_number , \
+    EntriesUnavailableError
+
+
+def fake_gravity_forms(monkeypatch , entries , statuses) :
+    # Entries after the checkpoint in the URL, and a bulk result per entry ID
+    monkeypatch.setattr(order_poller , 'get_credentials' , lambda : ('cs' , 'https://forms.test/entries' , None))
+    monkeypatch.setattr(order_poller , 'get_access_token' , lambda bc_id : 'token')
+
+    def extract_order_batch(ck , cs , url) :
+        search=json.loads(parse_qs(urlparse(url).query)['search'][0])
+        last_entry_id=int(search['field_filters'][0]['value'])
+        return { 'entries' : [entry for entry in entries if int(entry['id']) > last_entry_id] }
+
+    def process_bulk(orders , access_token , concurrency=None) :
+        for index , order in enumerate(orders) :
+            status=statuses.get(order['entry']['id'] , 'created')
+            yield { 'index' : index , 'entry_id' : order['entry']['id'] , 'status' : status }
+
+    monkeypatch.setattr(order_poller , 'extract_order_batch' , extract_order_batch)
+    monkeypatch.setattr(order_poller , 'process_bulk' , process_bulk)
+    monkeypatch.setattr(order_poller , 'find_customer_number' ,
+                        lambda entry , access_token : None if entry['id'] == '2' else f"C{entry['id']}")
+
+
+def read_dead_letters(checkpoint_path) :
+    with open(get_dead_letter_path(checkpoint_path)) as file :
+        return [json.loads(line) for line in file]
+
+
+def test_checkpoint_stops_at_the_first_failed_entry(tmp_path , monkeypatch) :
+    checkpoint_path=str(tmp_path / 'checkpoint.json')
+    entries=[make_entry(entry_id) for entry_id in range(1 , 7)]
+    statuses={ '3' : 'invalid' , '5' : 'error' }
+    fake_gravity_forms(monkeypatch , entries , statuses)
+
+    summary=poll_once(checkpoint_path , page_size=10)
+
+    assert summary == { 'processed' : 3 , 'failed' : 1 , 'skipped' : 2 }
+    assert load_checkpoint(checkpoint_path) == 4
+    assert [(record['entry_id'] , record['reason']) for record in read_dead_letters(checkpoint_path)] == \
+           [('2' , 'no_customer') , ('3' , 'invalid')]
+
+    # The failed entry and everything after it are polled again
+    statuses.clear()
+    summary=poll_once(checkpoint_path , page_size=10)
+    assert summary == { 'processed' : 2 , 'failed' : 0 , 'skipped' : 0 }
+    assert load_checkpoint(checkpoint_path) == 6
+
+
+def test_checkpoint_advances_page_by_page(tmp_path , monkeypatch) :
+    checkpoint_path=str(tmp_path / 'checkpoint.json')
+    entries=[make_entry(entry_id) for entry_id in (1 , 3 , 4 , 7 , 8)]
+    fake_gravity_forms(monkeypatch , entries , { })
+
+    pages=[]
+    original=order_poller.extract_order_batch
+
+    def extract_page(ck , cs , url) :
+        batch=original(ck , cs , url)
+        batch['entries']=batch['entries'][:2]
+        pages.append([entry['id'] for entry in batch['entries']])
+        return batch
+
+    monkeypatch.setattr(order_poller , 'extract_order_batch' , extract_page)
+    summary=poll_once(checkpoint_path , page_size=2)
+
+    assert pages == [['1' , '3'] , ['4' , '7'] , ['8']]
+    assert summary == { 'processed' : 5 , 'failed' : 0 , 'skipped' : 0 }
+    assert load_checkpoint(checkpoint_path) == 8
+
+
+def test_a_failed_fetch_is_reported(tmp_path , monkeypatch) :
+    checkpoint_path=str(tmp_path / 'checkpoint.json')
+    fake_gravity_forms(monkeypatch , [make_entry(entry_id) for entry_id in (1 , 2 , 3)] , { })
+    monkeypatch.setattr(order_poller , 'find_customer_number' , lambda entry , access_token : 'C1')
+
+    # The second page fails, the first one stays processed
+    pages=[]
+    original=order_poller.extract_order_batch
+
+    def extract_page(ck , cs , url) :
+        pages.append(url)
+        if len(pages) > 1 :
+            return None
+        batch=original(ck , cs , url)
+        batch['entries']=batch['entries'][:2]
+        return batch
+
+    monkeypatch.setattr(order_poller , 'extract_order_batch' , extract_page)
+    with pytest.raises(EntriesUnavailableError) :
+        poll_once(checkpoint_path , page_size=2)
+    assert load_checkpoint(checkpoint_path) == 2
+
+
+def test_customer_is_only_assigned_on_a_single_vat_or_phone_match(monkeypatch) :
+    customers=[
+        { 'No' : 'C1' , 'Name' : "Acme ApS" , 'VAT_Registration_No' : "DK10000001" , 'Phone_No' : "+45 20000001" ,
+          'E_Mail' : "a@acme.dk" } ,
+        { 'No' : 'C2' , 'Name' : "Acme ApS" , 'VAT_Registration_No' : "DK10000002" , 'Phone_No' : "+45 20000099" ,
+          'E_Mail' : "b@acme.dk" } ,
+        { 'No' : 'C3' , 'Name' : "Other" , 'VAT_Registration_No' : "" , 'Phone_No' : "+45 20000099" ,
+          'E_Mail' : "c@other.dk" }
+    ]
+    index=CustomerIndex(customers)
+
+    class Snapshot :
+        def get_index(self , access_token) :
+            return index
+
+    monkeypatch.setattr(order_poller , 'get_customer_snapshot' , lambda : Snapshot())
+    monkeypatch.delenv('POLLER_CUSTOMER_FIELD' , raising=False)
+
+    # VAT and phone of the same customer
+    assert find_customer_number(make_entry(1 , **{ '86' : "Acme ApS" , '88' : "x@acme.dk" }) , 'token') == 'C1'
+    # Only name and email domain match, two customers each
+    assert find_customer_number(make_entry(5 , **{ '86' : "Acme ApS" , '88' : "x@acme.dk" }) , 'token') is None
+    # The phone is shared by two customers
+    assert find_customer_number(make_entry(99 , **{ '138' : "" }) , 'token') is None
+    # VAT and phone point at different customers
+    assert find_customer_number(make_entry(2 , **{ '307' : "+45 20000001" }) , 'token') is None
@@ -0,0 +1,112 @@
+import pytest
+from mapping_functions import order_queue as order_queue_module
+from mapping_functions.circuit_breaker import CircuitOpenError
+from mapping_functions.mapping_pencils import order_record
+from mapping_functions.order_queue import OrderQueue , submit_queued
+
+
+def make_order(number=1) :
+    header={ 'Sell_to_Customer_No' : 'C00001' , 'External_Document_No' : f"PO-{number}" }
+    return { 'order' : number , 'customer_number' : 'C00001' , 'tenant' : None , 'header' : header ,
+             'lines' : [{ 'No' : "5240" , 'Quantity' : 250 }] }
+
+
+@pytest.fixture
+def queue(tmp_path , idempotency_store) :
+    return OrderQueue(str(tmp_path / 'order_queue.sqlite3') , max_attempts=3)
+
+
+def fake_submit(monkeypatch , *outcomes) :
+    # Each submission raises or returns the next outcome
+    submitted=[]
+
+    def submit_order_batch(header , lines , access_token) :
+        submitted.append(header['External_Document_No'])
+        outcome=outcomes[len(submitted) - 1]
+        if isinstance(outcome , Exception) :
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(order_queue_module , 'submit_order_batch' , submit_order_batch)
+    return submitted
+
+
+def make_due(queue) :
+    queue._connection().execute("UPDATE orders SET next_attempt_at = 0")
+
+
+def test_queuing_an_order_twice_returns_the_first_ticket(order_queue) :
+    ticket=order_queue.enqueue('sales_order:default:C00001:PO-1' , { 'order' : 1 })
+    assert order_queue.enqueue('sales_order:default:C00001:PO-1' , { 'order' : 2 }) == ticket
+    assert order_queue.claim()[0][2] == { 'order' : 1 }
+
+
+def test_a_given_up_order_is_queued_again(tmp_path) :
+    queue=OrderQueue(str(tmp_path / 'order_queue.sqlite3') , max_attempts=1)
+    ticket=queue.enqueue('sales_order:default:C00001:PO-1' , { 'order' : 1 })
+    queue.claim()
+    queue.retry(ticket , "Bad Request" , 0)
+    assert queue.get(ticket)['status'] == 'failed'
+
+    assert queue.enqueue('sales_order:default:C00001:PO-1' , { 'order' : 2 }) == ticket
+    order=queue.get(ticket)
+    assert (order['status'] , order['attempts'] , order['error']) == ('queued' , 0 , None)
+    assert queue.claim() == [(ticket , 'sales_order:default:C00001:PO-1' , { 'order' : 2 } , 0)]
+
+
+def test_a_submitted_order_is_done(queue , monkeypatch) :
+    fake_submit(monkeypatch , order_record("SO000001" , [{ 'id' : "l1" , 'line_no' : 10000 }]))
+    ticket=queue.enqueue('sales_order:default:C00001:PO-1' , make_order())
+
+    assert submit_queued(queue , 'token') == { 'submitted' : 1 , 'failed' : 0 }
+    order=queue.get(ticket)
+    assert order['status'] == 'done'
+    assert order['result'] == { 'order' : 1 , 'customer_number' : 'C00001' , 'document_no' : "SO000001" ,
+                                'lines' : [{ 'id' : "l1" , 'line_no' : 10000 }] }
+
+
+def test_failed_submissions_back_off_and_end_in_failed(queue , monkeypatch) :
+    submitted=fake_submit(monkeypatch , *[RuntimeError("Bad Request")] * 3)
+    ticket=queue.enqueue('sales_order:default:C00001:PO-1' , make_order())
+
+    assert submit_queued(queue , 'token') == { 'submitted' : 0 , 'failed' : 1 }
+    order=queue.get(ticket)
+    assert (order['status'] , order['attempts'] , order['error']) == ('queued' , 1 , "Bad Request")
+    # The retry waits for its backoff
+    assert submit_queued(queue , 'token') == { 'submitted' : 0 , 'failed' : 0 }
+
+    for _ in range(2) :
+        make_due(queue)
+        submit_queued(queue , 'token')
+    assert len(submitted) == 3
+    assert queue.get(ticket)['status'] == 'failed'
+    assert queue.count('failed') == 1
+
+    # A given-up order is not claimed again
+    make_due(queue)
+    assert submit_queued(queue , 'token') == { 'submitted' : 0 , 'failed' : 0 }
+
+
+def test_an_open_circuit_does_not_use_up_attempts(queue , monkeypatch) :
+    fake_submit(monkeypatch , *[CircuitOpenError('business_central' , 30)] * 5 , order_record("SO000001" , []))
+    ticket=queue.enqueue('sales_order:default:C00001:PO-1' , make_order())
+
+    for _ in range(5) :
+        make_due(queue)
+        submit_queued(queue , 'token')
+    assert (queue.get(ticket)['status'] , queue.get(ticket)['attempts']) == ('queued' , 0)
+
+    make_due(queue)
+    assert submit_queued(queue , 'token') == { 'submitted' : 1 , 'failed' : 0 }
+    assert queue.get(ticket)['status'] == 'done'
+
+
+def test_an_order_created_before_its_submission_failed_is_replayed(queue , idempotency_store , monkeypatch) :
+    submitted=fake_submit(monkeypatch , order_record("SO000001" , []))
+    idempotency_store.claim('sales_order:default:C00001:PO-1')
+    idempotency_store.complete('sales_order:default:C00001:PO-1' , order_record("SO000001" , []))
+    ticket=queue.enqueue('sales_order:default:C00001:PO-1' , make_order())
+
+    assert submit_queued(queue , 'token') == { 'submitted' : 1 , 'failed' : 0 }
+    assert submitted == []
+    assert queue.get(ticket)['result']['document_no'] == "SO000001"
@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import pytest
+from benchmarks import baseline_mapping
+from mapping_functions import mapping_pencils , product_catalog
+from mapping_functions.product_catalog import CatalogError , CatalogWatcher , BOOL_KEY_TABLES , load_catalog_file , \
+    load_and_swap , get_catalog , swap_catalog
+
+
+def encode_key(table , key) :
+    return str(key).lower() if table in BOOL_KEY_TABLES else key
+
+
+def write_json_catalog(path , tables) :
+    with open(path , 'w' , encoding='utf-8') as file :
+        json.dump({ 'tables' : { table : { encode_key(table , key) : value for key , value in rows.items() }
+                                 for table , rows in tables.items() } } , file)
+    return str(path)
+
+
+@pytest.fixture
+def tables() :
+    return baseline_mapping.make_catalog_tables()
+
+
+@pytest.fixture(autouse=True)
+def restore_catalog() :
+    # Swapping runs the listeners, swap the original catalog back so later tests map with it
+    catalog=get_catalog()
+    yield
+    swap_catalog(catalog)
+
+
+def test_json_and_csv_catalogs_load_the_same_tables(tables , tmp_path) :
+    json_catalog=load_catalog_file(write_json_catalog(tmp_path / 'catalog.json' , tables))
+
+    with open(tmp_path / 'catalog.csv' , 'w' , encoding='utf-8' , newline='') as file :
+        writer=csv.writer(file)
+        writer.writerow(('table' , 'key' , 'value'))
+        for table , rows in tables.items() :
+            writer.writerows((table , encode_key(table , key) , value) for key , value in rows.items())
+    csv_catalog=load_catalog_file(str(tmp_path / 'catalog.csv'))
+
+    assert json_catalog.validate() == []
+    assert json_catalog.tables == csv_catalog.tables
+    assert json_catalog.version == csv_catalog.version
+    assert json_catalog.tables['packaging'] == tables['packaging']
+
+
+@pytest.mark.parametrize('change , message' , [
+    (lambda tables : tables.pop('item_dict') , "lacks the tables item_dict") ,
+    (lambda tables : tables['packaging'].update({ 'maybe' : "m" }) , "must be true or false")
+])
+def test_broken_catalog_files_are_rejected(change , message , tables , tmp_path) :
+    change(tables)
+    with open(tmp_path / 'catalog.json' , 'w' , encoding='utf-8') as file :
+        json.dump({ 'tables' : tables } , file , default=str)
+    with pytest.raises(CatalogError , match=message) :
+        load_catalog_file(str(tmp_path / 'catalog.json'))
+
+
+def test_unsupported_formats_are_rejected(tmp_path) :
+    with pytest.raises(CatalogError , match="Unsupported catalog format") :
+        load_catalog_file(str(tmp_path / 'catalog.xml'))
+
+
+def test_a_swap_recompiles_the_order_plan(tables , tmp_path) :
+    catalog=load_and_swap(write_json_catalog(tmp_path / 'catalog.json' , tables))
+
+    assert get_catalog() is catalog
+    assert mapping_pencils.get_order_plan().catalog is catalog
+
+
+def test_an_incomplete_catalog_is_not_activated(tables , tmp_path) :
+    active=get_catalog()
+    # A language without items of its own
+    tables['languages']['Swedish']="613"
+
+    with pytest.raises(CatalogError , match="problems") :
+        load_and_swap(write_json_catalog(tmp_path / 'catalog.json' , tables))
+    assert get_catalog() is active
+
+
+def test_the_watcher_reloads_a_changed_file_and_keeps_the_catalog_on_errors(tables , tmp_path) :
+    path=write_json_catalog(tmp_path / 'catalog.json' , tables)
+    watcher=CatalogWatcher(path)
+
+    assert watcher.check() is True
+    loaded=get_catalog()
+    assert watcher.check() is False
+
+    # A broken edit is rejected, the loaded catalog stays active
+    with open(path , 'w' , encoding='utf-8') as file :
+        file.write("{")
+    os.utime(path , ns=(0 , os.stat(path).st_mtime_ns + 1))
+    assert watcher.check() is False
+    assert get_catalog() is loaded
+
+    item=next(iter(tables['item_dict']))
+    tables['item_dict'][item]="9999"
+    write_json_catalog(path , tables)
+    os.utime(path , ns=(0 , os.stat(path).st_mtime_ns + 2))
+    assert watcher.check() is True
+    assert get_catalog().tables['item_dict'][item] == "9999"
+    assert product_catalog.get_catalog().version != loaded.version
@@ -0,0 +1,62 @@
+import threading
+import time
+from mapping_functions.token_cache import TokenCache
+
+
+def test_concurrent_misses_share_one_fetch() :
+    calls=[]
+    release=threading.Event()
+
+    def fetcher(bc_id , scope) :
+        calls.append((bc_id , scope))
+        release.wait(5)
+        return "token" , 3600
+
+    cache=TokenCache(fetcher)
+    results=[]
+    threads=[threading.Thread(target=lambda : results.append(cache.get('bc' , 'scope'))) for _ in range(5)]
+    for thread in threads :
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads :
+        thread.join()
+
+    assert results == ["token"] * 5
+    assert calls == [('bc' , 'scope')]
+
+
+def test_followers_stop_waiting_for_a_hung_fetch() :
+    started=threading.Event()
+    release=threading.Event()
+
+    def fetcher(bc_id , scope) :
+        started.set()
+        release.wait(5)
+        return "token" , 3600
+
+    cache=TokenCache(fetcher , wait_timeout=0.1)
+    leader=threading.Thread(target=cache.get , args=('bc' , 'scope'))
+    leader.start()
+    started.wait(5)
+
+    began=time.monotonic()
+    assert cache.get('bc' , 'scope') is None
+    assert time.monotonic() - began < 2
+    assert cache.get_stats()['wait_timeouts'] == 1
+
+    release.set()
+    leader.join()
+    assert cache.get('bc' , 'scope') == "token"
+
+
+def test_failed_background_refresh_is_logged(caplog) :
+    def fetcher(bc_id , scope) :
+        raise RuntimeError("identity provider down")
+
+    cache=TokenCache(fetcher)
+    cache._refreshing.add(('bc' , 'scope'))
+    cache._refresh(('bc' , 'scope'))
+
+    assert "Token refresh failed" in caplog.text
+    assert ('bc' , 'scope') not in cache._refreshing